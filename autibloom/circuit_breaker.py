@@ -0,0 +1,61 @@
+"""
+Consecutive-failure circuit breaker shared by the outbound clients
+(wellbeing.services.narrative for Gemini, chatbot.rag_client for the RAG
+service).
+
+closed     calls go through; failure_threshold failures in a row open it.
+open       calls are refused until cooldown_seconds have passed.
+half-open  after the cooldown exactly one caller gets a trial call while
+           the others are still refused. Its success closes the breaker,
+           its failure re-opens it for another cooldown.
+
+A trial whose caller never reports back (e.g. it was cut short) stops
+blocking after one more cooldown, so the breaker cannot stay stuck.
+"""
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Thread-safe breaker; one instance per guarded dependency."""
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.failures < self.failure_threshold:
+                return "closed"
+            return "open" if time.monotonic() < self.open_until else "half-open"
+
+    def allow(self) -> bool:
+        """True if the caller may make the call; it must then record the outcome."""
+        with self._lock:
+            if self.failures < self.failure_threshold:
+                return True
+            now = time.monotonic()
+            if now < self.open_until:
+                return False
+            if self.trial_started is not None and now - self.trial_started < self.cooldown_seconds:
+                return False
+            self.trial_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.open_until = 0.0
+            self.trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_started = None
+            if self.failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown_seconds
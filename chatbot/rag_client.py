@@ -0,0 +1,126 @@
+"""
+Shared HTTP client for calls from Django to the RAG service.
+
+One requests.Session per process keeps a bounded pool of keep-alive
+connections to RAG_SERVICE_URL, so a chat turn does not pay for new TCP
+handshakes. Every call gets a connect and a read deadline. GETs are
+retried with full jitter on connection failures and 5xx replies; POSTs
+(a chat turn is not idempotent) only when the request never left this
+process. Consecutive failed calls open a circuit breaker, and while it is
+open calls fail at once instead of waiting out the timeouts against a
+dead service.
+"""
+import os
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from autibloom.circuit_breaker import CircuitBreaker
+
+CONNECT_TIMEOUT_SECONDS = float(os.environ.get("RAG_CONNECT_TIMEOUT_SECONDS", "3"))
+READ_TIMEOUT_SECONDS = float(os.environ.get("RAG_READ_TIMEOUT_SECONDS", "30"))
+
+# Keep-alive connections per process; one per gunicorn thread (gunicorn.conf.py).
+# Requests beyond this still go through, on a connection that is not kept.
+POOL_SIZE = int(os.environ.get("RAG_POOL_SIZE", os.environ.get("GUNICORN_THREADS", "16")))
+
+# Extra attempts after a retryable failure, with sleeps drawn from
+# [0, RETRY_BACKOFF_SECONDS * 2**attempt].
+RETRIES = 2
+RETRY_BACKOFF_SECONDS = 0.2
+
+# This many failed calls in a row open the breaker for the cooldown; then
+# a single trial call is let through while concurrent calls still fail
+# fast (a failure re-opens it straight away).
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOLDOWN_SECONDS = 30
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+class RAGServiceUnavailable(requests.exceptions.ConnectionError):
+    """Raised without touching the network while the circuit breaker is open."""
+
+
+_breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN_SECONDS)
+
+
+def _get_session() -> requests.Session:
+    """Process-wide Session; rebuilt after a fork so workers never share sockets."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+            _session_pid = os.getpid()
+        return _session
+
+
+def _never_sent(exc: requests.exceptions.ConnectionError) -> bool:
+    """True if the connection failed before any of the request was sent."""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    # Refused connections and failed DNS lookups; a reset or a dropped
+    # keep-alive connection may have hit the service already.
+    return isinstance(reason, NewConnectionError)
+
+
+def request(method: str, path: str, read_timeout: float = None, **kwargs) -> requests.Response:
+    """
+    Send one request to RAG_SERVICE_URL + path.
+
+    GET is retried on connection errors and 5xx replies. Other methods are
+    retried only when the connection could not be made, so the service
+    never sees a request twice.
+
+    Returns the response (the last 5xx one if every attempt failed, so
+    callers still use raise_for_status). Raises RAGServiceUnavailable while
+    the breaker is open, and the requests exception of the last attempt
+    otherwise. A read timeout is not retried: the service is up but slow.
+    """
+    if not _breaker.allow():
+        raise RAGServiceUnavailable("RAG service circuit breaker is open")
+
+    base_url = getattr(settings, "RAG_SERVICE_URL", "http://127.0.0.1:8001")
+    url = f"{base_url}{path}"
+    timeout = (CONNECT_TIMEOUT_SECONDS, read_timeout or READ_TIMEOUT_SECONDS)
+    idempotent = method.upper() == "GET"
+
+    for attempt in range(RETRIES + 1):
+        try:
+            resp = _get_session().request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            if attempt == RETRIES or not (idempotent or _never_sent(e)):
+                _breaker.record_failure()
+                raise
+        except requests.exceptions.RequestException:
+            _breaker.record_failure()
+            raise
+        else:
+            if resp.status_code < 500:
+                _breaker.record_success()
+                return resp
+            if attempt == RETRIES or not idempotent:
+                _breaker.record_failure()
+                return resp
+            resp.close()
+        time.sleep(random.uniform(0, RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+
+def get(path: str, **kwargs) -> requests.Response:
+    return request("GET", path, **kwargs)
+
+
+def post(path: str, **kwargs) -> requests.Response:
+    return request("POST", path, **kwargs)
@@ -5,17 +5,9 @@ document.addEventListener('DOMContentLoaded', () => {
     const sendBtn = document.getElementById('chat-send-btn');
     const messagesBox = document.getElementById('chat-messages-box');
     const typingInd = document.getElementById('chat-typing-indicator');
-    const skipWrapper = document.getElementById('chat-skip-wrapper');
-    const skipBtn = document.getElementById('chat-skip-btn');
     const charCount = document.getElementById('chat-char-count');
     const errorMsg = document.getElementById('chat-error-msg');
     
-    // Typewriter state
-    let typeInterval = null;
-    let isTyping = false;
-    let fullTypingText = '';
-    let currentTypingElement = null;
-    
     // Config
     const MAX_CHARS = 800;
     
@@ -130,11 +122,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const div = document.createElement('div');
         div.className = 'chat-message assistant';
         div.innerHTML = `<div class="chat-bubble chat-bubble-content">${isStreaming ? '' : formatResponseBlock(text)}</div>`;
-        if (skipWrapper.parentNode === messagesBox) {
-            messagesBox.insertBefore(div, typingInd);
-        } else {
-            messagesBox.appendChild(div);
-        }
+        messagesBox.insertBefore(div, typingInd);
         scrollToBottom();
         return div;
     }
@@ -145,36 +133,40 @@ document.addEventListener('DOMContentLoaded', () => {
 
     function setSendingState(sending) {
         input.disabled = sending;
-        sendBtn.disabled = sending;
+        sendBtn.disabled = sending || input.value.trim().length === 0;
         typingInd.style.display = sending ? 'block' : 'none';
         errorMsg.style.display = 'none';
         if (sending) {
-            skipWrapper.style.display = 'none';
             scrollToBottom();
         } else {
-            if (!isTyping) {
-                input.focus();
-            }
+            input.focus();
         }
     }
-    
-    // Skip Button Handler
-    skipBtn.addEventListener('click', () => {
-        if (isTyping && currentTypingElement) {
-            clearInterval(typeInterval);
-            isTyping = false;
-            skipWrapper.style.display = 'none';
-            
-            const contentDiv = currentTypingElement.querySelector('.chat-bubble-content');
-            if (contentDiv) {
-                contentDiv.innerHTML = formatResponseBlock(fullTypingText);
+
+    // Read the text/event-stream body of /chat/api/ask/ and call
+    // onEvent(name, data) for each event as soon as it arrives.
+    async function readEvents(res, onEvent) {
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+                let name = 'message';
+                let data = '';
+                for (const line of block.split('\n')) {
+                    if (line.startsWith('event:')) name = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+                if (data) onEvent(name, JSON.parse(data));
             }
-            input.disabled = false;
-            sendBtn.disabled = input.value.trim().length === 0;
-            input.focus();
-            scrollToBottom();
         }
-    });
+    }
 
     async function sendMessage() {
         const text = input.value.trim();
@@ -188,6 +180,7 @@ document.addEventListener('DOMContentLoaded', () => {
         
         setSendingState(true);
 
+        let bubble = null;
         try {
             const res = await fetch('/chat/api/ask/', {
                 method: 'POST',
@@ -201,71 +194,51 @@ document.addEventListener('DOMContentLoaded', () => {
                 })
             });
 
-            const data = await res.json();
-            
-            if (!res.ok) {
+            // Failures before the answer starts come back as JSON.
+            if (!res.ok || !(res.headers.get('Content-Type') || '').includes('text/event-stream')) {
+                const data = await res.json().catch(() => ({}));
                 throw new Error(data.error || 'Failed to get answer');
             }
 
-            if (data.session_id) {
-                sessionId = data.session_id;
-                localStorage.setItem('autibloom_chat_session', sessionId);
-            }
-
-            if (data.error) {
-                throw new Error(data.error);
-            }
-
-            // Start typing effect
-            typingInd.style.display = 'none';
-            skipWrapper.style.display = 'block';
-            isTyping = true;
-            fullTypingText = data.answer;
-            
-            currentTypingElement = appendAssistantMessage('', data.sources, true);
-            const contentDiv = currentTypingElement.querySelector('.chat-bubble-content');
-            
-            const words = fullTypingText.split(' ');
-            let wordIndex = 0;
-            let currentText = '';
-            
-            typeInterval = setInterval(() => {
-                if (!isTyping) return; // In case it was skipped
-                
-                // Append 1-3 words randomly for a more natural feel
-                const wordsToAppend = Math.floor(Math.random() * 2) + 1;
-                for (let i = 0; i < wordsToAppend; i++) {
-                    if (wordIndex < words.length) {
-                        currentText += (wordIndex > 0 ? ' ' : '') + words[wordIndex];
-                        wordIndex++;
-                    }
+            let answer = '';
+            let finished = false;
+            let failure = null;
+            const render = () => {
+                if (!bubble) {
+                    typingInd.style.display = 'none';
+                    bubble = appendAssistantMessage('', null, true).querySelector('.chat-bubble-content');
                 }
-                
-                contentDiv.innerHTML = formatResponseBlock(currentText);
+                bubble.innerHTML = formatResponseBlock(answer);
                 scrollToBottom();
-                
-                if (wordIndex >= words.length) {
-                    clearInterval(typeInterval);
-                    isTyping = false;
-                    skipWrapper.style.display = 'none';
-                    
-                    // Show sources button if it exists
-                    const sourcesBtn = currentTypingElement.querySelector('.chat-sources-btn');
-                    if (sourcesBtn) {
-                        sourcesBtn.style.display = 'flex';
-                    }
-                    
-                    input.disabled = false;
-                    sendBtn.disabled = input.value.trim().length === 0;
-                    input.focus();
-                    scrollToBottom();
+            };
+
+            await readEvents(res, (name, data) => {
+                if (name === 'session' && data.session_id) {
+                    sessionId = data.session_id;
+                    localStorage.setItem('autibloom_chat_session', sessionId);
+                } else if (name === 'token') {
+                    answer += data.text || '';
+                    render();
+                } else if (name === 'done') {
+                    // The final, fully scrubbed answer replaces the streamed text.
+                    finished = true;
+                    answer = data.answer || answer || '(no response)';
+                    render();
+                } else if (name === 'error') {
+                    failure = data.message;
                 }
-            }, 45); // ~45ms per 1-2 words means roughly ~10-20 words per second
+            });
+
+            if (!finished) {
+                throw new Error(failure || 'The answer was interrupted. Please try again.');
+            }
+            setSendingState(false);
 
         } catch (err) {
+            if (bubble) bubble.closest('.chat-message').remove();
+            typingInd.style.display = 'none';
             errorMsg.innerText = err.message || 'An error occurred. Please try again.';
             errorMsg.style.display = 'block';
-            skipWrapper.style.display = 'none';
             
             // Put text back so user doesn't lose it
             input.value = text;
@@ -1,9 +1,23 @@
 import json
 from unittest.mock import patch, MagicMock
+
+import requests
 from django.test import TestCase, Client
 from django.urls import reverse
 from accounts.models import User
 from chatbot.models import ChatSession, ChatMessage
+from chatbot import rag_client
+from chatbot.views import IncrementalScrubber
+
+
+def read_events(response):
+    """(event, data) pairs of a streamed chat_ask response."""
+    body = b"".join(response.streaming_content).decode()
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
 
 
 class ChatbotAccessTests(TestCase):
@@ -56,20 +70,17 @@ class ChatbotApiTests(TestCase):
         # 403 Forbidden due to CSRF missing
         self.assertEqual(response.status_code, 403)
 
-    @patch("chatbot.views.requests.get")
-    @patch("chatbot.views.requests.post")
-    def test_chat_ask_success(self, mock_post, mock_get):
+    @patch("chatbot.views.rag_client.post")
+    def test_chat_ask_success(self, mock_post):
         self.client.force_login(self.caregiver)
         
-        # Mock POST to Fastapi
-        mock_post_resp = MagicMock()
-        mock_post_resp.json.return_value = {"request_id": "req-123", "session_id": "sess-456"}
-        mock_post.return_value = mock_post_resp
-        
-        # Mock GET SSE Stream
-        mock_get_resp = MagicMock()
+        # Mock the SSE answer of POST /api/chat/stream
+        mock_stream_resp = MagicMock()
         # Create an iterator that yields line strings (decoded content)
-        mock_get_resp.iter_lines.return_value = [
+        mock_stream_resp.iter_lines.return_value = [
+            'event: sources',
+            'data: {"mode_used": "both", "sources": [{"id": 1, "title": "Test Source"}]}',
+            '',
             'event: token',
             'data: {"text": "Hello "}',
             '',
@@ -77,10 +88,10 @@ class ChatbotApiTests(TestCase):
             'data: {"text": "World"}',
             '',
             'event: done',
-            'data: {"ok": true, "sources": [{"id": 1, "title": "Test Source"}]}',
+            'data: {"ok": true}',
             ''
         ]
-        mock_get.return_value = mock_get_resp
+        mock_post.return_value = mock_stream_resp
 
         # Create a client that doesn't enforce CSRF just to test the logic
         client_no_csrf = Client()
@@ -93,11 +104,22 @@ class ChatbotApiTests(TestCase):
         )
         
         self.assertEqual(response.status_code, 200)
-        data = response.json()
-        self.assertEqual(data["answer"], "Hello World")
-        self.assertEqual(data["sources"], [{"id": 1, "title": "Test Source"}])
-        self.assertTrue("session_id" in data)
-        
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        # One round trip: the answer streams back on the POST itself.
+        mock_post.assert_called_once()
+        self.assertEqual(mock_post.call_args.args, ("/api/chat/stream",))
+        self.assertEqual(mock_post.call_args.kwargs["json"]["message"], "Test question")
+        events = read_events(response)
+        self.assertEqual(events[0][0], "session")
+        self.assertEqual(
+            "".join(data["text"] for event, data in events if event == "token"), "Hello World"
+        )
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual(events[-1][1]["answer"], "Hello World")
+        self.assertEqual(events[-1][1]["session_id"], events[0][1]["session_id"])
+        # Sources are kept for the audit trail only.
+        self.assertNotIn("sources", json.dumps(events))
+
         # Verify db models created
         self.assertEqual(ChatSession.objects.count(), 1)
         self.assertEqual(ChatMessage.objects.count(), 2)
@@ -106,23 +128,19 @@ class ChatbotApiTests(TestCase):
         self.assertEqual(messages[0].content, "Test question")
         self.assertEqual(messages[1].role, "assistant")
         self.assertEqual(messages[1].content, "Hello World")
+        self.assertEqual(messages[1].sources, [{"id": 1, "title": "Test Source"}])
 
-    @patch("chatbot.views.requests.get")
-    @patch("chatbot.views.requests.post")
-    def test_chat_ask_rag_error(self, mock_post, mock_get):
+    @patch("chatbot.views.rag_client.post")
+    def test_chat_ask_rag_error(self, mock_post):
         self.client.force_login(self.caregiver)
         
-        mock_post_resp = MagicMock()
-        mock_post_resp.json.return_value = {"request_id": "req-123"}
-        mock_post.return_value = mock_post_resp
-        
-        mock_get_resp = MagicMock()
-        mock_get_resp.iter_lines.return_value = [
+        mock_stream_resp = MagicMock()
+        mock_stream_resp.iter_lines.return_value = [
             'event: error',
             'data: {"message": "Service unavailable"}',
             ''
         ]
-        mock_get.return_value = mock_get_resp
+        mock_post.return_value = mock_stream_resp
 
         client_no_csrf = Client()
         client_no_csrf.force_login(self.caregiver)
@@ -136,3 +154,187 @@ class ChatbotApiTests(TestCase):
         self.assertEqual(response.status_code, 502)
         data = response.json()
         self.assertEqual(data["error"], "Service unavailable")
+
+    @patch("chatbot.views.rag_client.post")
+    def test_chat_ask_http_error_closes_stream(self, mock_post):
+        mock_stream_resp = MagicMock()
+        mock_stream_resp.raise_for_status.side_effect = requests.exceptions.HTTPError("503 Server Error")
+        mock_post.return_value = mock_stream_resp
+
+        client_no_csrf = Client()
+        client_no_csrf.force_login(self.caregiver)
+        response = client_no_csrf.post(
+            reverse("chatbot:chat_ask"),
+            data=json.dumps({"message": "Test error"}),
+            content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 502)
+        mock_stream_resp.close.assert_called_once()
+
+    @patch("chatbot.views.rag_client.post")
+    def test_chat_ask_error_mid_stream(self, mock_post):
+        mock_stream_resp = MagicMock()
+        mock_stream_resp.iter_lines.return_value = [
+            'event: token',
+            'data: {"text": "Partial answer. "}',
+            '',
+            'event: error',
+            'data: {"message": "LLM failed"}',
+            ''
+        ]
+        mock_post.return_value = mock_stream_resp
+
+        client_no_csrf = Client()
+        client_no_csrf.force_login(self.caregiver)
+        response = client_no_csrf.post(
+            reverse("chatbot:chat_ask"),
+            data=json.dumps({"message": "Test error"}),
+            content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        events = read_events(response)
+        self.assertEqual(events[-1], ("error", {"message": "LLM failed"}))
+        # Only the user's message is saved for an answer that never finished.
+        self.assertEqual(ChatMessage.objects.filter(role="assistant").count(), 0)
+        mock_stream_resp.close.assert_called()
+
+
+class IncrementalScrubberTests(TestCase):
+    def stream(self, pieces):
+        scrubber = IncrementalScrubber()
+        released = []
+        for piece in pieces:
+            released.append(scrubber.feed(piece))
+        released.append(scrubber.flush())
+        return scrubber, released
+
+    def test_citation_split_across_tokens_never_released(self):
+        pieces = ["Try a visual ", "schedule (Parent", "'s Guide", ".p", "df). ", "It helps.\n", "Sources", ": Routines", ".pdf\n"]
+        scrubber, released = self.stream(pieces)
+        for i in range(len(released)):
+            self.assertNotIn("pdf", "".join(released[:i + 1]).lower())
+            self.assertNotIn("Sources", "".join(released[:i + 1]))
+        self.assertEqual(scrubber.answer, "Try a visual schedule. It helps.")
+        self.assertEqual("".join(released).split(), scrubber.answer.split())
+
+    def test_text_released_at_clause_boundaries(self):
+        scrubber = IncrementalScrubber()
+        self.assertEqual(scrubber.feed("Routines help"), "")
+        self.assertEqual(scrubber.feed(" a lot. Keep"), "Routines help a lot. ")
+        self.assertEqual(scrubber.feed(" them simple"), "")
+        self.assertEqual(scrubber.flush(), "Keep them simple")
+
+    def test_bare_pdf_mention_holds_its_clause(self):
+        scrubber = IncrementalScrubber()
+        self.assertEqual(scrubber.feed("See the Sleep Guide"), "")
+        self.assertEqual(scrubber.feed(".pdf for tips. Rest well."), "for tips. ")
+        self.assertEqual(scrubber.flush(), "Rest well.")
+
+
+@patch("chatbot.rag_client.time.sleep")
+@patch("chatbot.rag_client._get_session")
+class RagClientTests(TestCase):
+    def setUp(self):
+        rag_client._breaker.record_success()
+
+    def tearDown(self):
+        rag_client._breaker.record_success()
+
+    def response(self, status):
+        resp = MagicMock()
+        resp.status_code = status
+        return resp
+
+    def refused(self):
+        from urllib3.exceptions import MaxRetryError, NewConnectionError
+        reason = NewConnectionError(None, "Connection refused")
+        return requests.exceptions.ConnectionError(MaxRetryError(None, "/", reason=reason))
+
+    def test_get_retries_5xx_then_succeeds(self, mock_session, mock_sleep):
+        session = mock_session.return_value
+        session.request.side_effect = [self.response(503), self.response(200)]
+
+        resp = rag_client.get("/api/stream", read_timeout=10)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(session.request.call_count, 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+        args, kwargs = session.request.call_args
+        self.assertEqual(args, ("GET", "http://127.0.0.1:8001/api/stream"))
+        self.assertEqual(kwargs["timeout"], (rag_client.CONNECT_TIMEOUT_SECONDS, 10))
+
+    def test_post_5xx_not_retried(self, mock_session, mock_sleep):
+        session = mock_session.return_value
+        session.request.side_effect = [self.response(503), self.response(200)]
+
+        resp = rag_client.post("/api/message", json={})
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_post_retries_refused_connection(self, mock_session, mock_sleep):
+        session = mock_session.return_value
+        session.request.side_effect = [self.refused(), requests.exceptions.ConnectTimeout(),
+                                       self.response(200)]
+
+        resp = rag_client.post("/api/message", json={})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(session.request.call_count, 3)
+
+    def test_post_not_retried_once_connection_was_made(self, mock_session, mock_sleep):
+        session = mock_session.return_value
+        # e.g. a keep-alive connection reset after the body was written
+        session.request.side_effect = [requests.exceptions.ConnectionError("reset"),
+                                       self.response(200)]
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            rag_client.post("/api/message", json={})
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_read_timeout_not_retried(self, mock_session, mock_sleep):
+        session = mock_session.return_value
+        session.request.side_effect = requests.exceptions.ReadTimeout()
+
+        with self.assertRaises(requests.exceptions.Timeout):
+            rag_client.get("/api/stream")
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_breaker_fails_fast_when_service_down(self, mock_session, mock_sleep):
+        session = mock_session.return_value
+        session.request.side_effect = requests.exceptions.ConnectionError()
+
+        for _ in range(rag_client.BREAKER_FAILURE_THRESHOLD):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                rag_client.get("/api/stream")
+        calls = session.request.call_count
+        self.assertEqual(calls, rag_client.BREAKER_FAILURE_THRESHOLD * (rag_client.RETRIES + 1))
+
+        with self.assertRaises(rag_client.RAGServiceUnavailable):
+            rag_client.get("/api/stream")
+        self.assertEqual(session.request.call_count, calls)
+
+    @patch("autibloom.circuit_breaker.time.monotonic")
+    def test_breaker_lets_one_trial_call_through_after_cooldown(self, mock_monotonic, mock_session, mock_sleep):
+        mock_monotonic.return_value = 1000.0
+        for _ in range(rag_client.BREAKER_FAILURE_THRESHOLD):
+            rag_client._breaker.record_failure()
+        self.assertFalse(rag_client._breaker.allow())
+
+        mock_monotonic.return_value = 1000.0 + rag_client.BREAKER_COOLDOWN_SECONDS
+        session = mock_session.return_value
+        calls_during_trial = []
+
+        def trial(*args, **kwargs):
+            # A concurrent call while the trial is in flight fails fast.
+            with self.assertRaises(rag_client.RAGServiceUnavailable):
+                rag_client.get("/api/stream")
+            calls_during_trial.append(session.request.call_count)
+            return self.response(200)
+
+        session.request.side_effect = trial
+        self.assertEqual(rag_client.get("/api/stream").status_code, 200)
+        self.assertEqual(calls_during_trial, [1])
+        self.assertEqual(rag_client._breaker.state, "closed")
@@ -1,13 +1,14 @@
+import itertools
 import json
 import re
 import uuid
 import requests
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from accounts.permissions import role_required, clinician_verified_required
+from . import rag_client
 from .models import ChatSession, ChatMessage
 import logging
 
@@ -78,6 +79,80 @@ def scrub_citations(text: str) -> str:
     text = re.sub(r"\n{3,}", "\n\n", text)
     return text.strip()
 
+
+# A streamed answer is released only after one of these followed by whitespace.
+_RELEASE_AFTER = ".,;:!?"
+_CITATION_LINE_START = re.compile(r"(?i)\s*(?:source|reference|references|sources|citations?)\s*:")
+
+
+class IncrementalScrubber:
+    """
+    scrub_citations for text that arrives a few tokens at a time.
+
+    feed() returns the scrubbed text that is safe to show so far. Text is
+    held back until a clause or line ends outside any (...) / [...] group,
+    so a citation that is still being written never reaches the browser:
+    a bare "Some Title.pdf" eats the whole clause before it, a group is
+    dropped only once its '.pdf' shows up, and a "Sources:" line is kept
+    until its newline. The streamed pieces can differ from the final
+    scrub in whitespace only; `answer` is the canonical result.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self._released = 0    # raw[:_released] has been returned
+        self._scanned = 0
+        self._safe = 0        # end of the last complete clause outside a group
+        self._line_start = 0
+        self._depth = {"(": 0, "[": 0}
+
+    def feed(self, text: str) -> str:
+        self.raw += text
+        raw, depth = self.raw, self._depth
+        for i in range(self._scanned, len(raw)):
+            ch = raw[i]
+            if ch in depth:
+                depth[ch] += 1
+            elif ch == ")":
+                depth["("] = max(0, depth["("] - 1)
+            elif ch == "]":
+                depth["["] = max(0, depth["["] - 1)
+            elif ch == "\n":
+                if not depth["("] and not depth["["]:
+                    self._safe = i + 1
+                self._line_start = i + 1
+            elif (ch.isspace() and i and raw[i - 1] in _RELEASE_AFTER
+                  and not depth["("] and not depth["["]
+                  and not _CITATION_LINE_START.match(raw, self._line_start, i)):
+                self._safe = i + 1
+        self._scanned = len(raw)
+        return self._release(self._safe)
+
+    def flush(self) -> str:
+        """Whatever is still held back, once the stream has ended."""
+        return self._release(len(self.raw)).rstrip()
+
+    @property
+    def answer(self) -> str:
+        return scrub_citations(self.raw)
+
+    def _release(self, end: int) -> str:
+        segment = self.raw[self._released:end]
+        self._released = max(self._released, end)
+        if not segment.strip():
+            return "\n" if "\n" in segment else ""
+        body = scrub_citations(segment)
+        if not body:
+            return ""
+        # scrub_citations strips the segment; keep the break to the next one.
+        tail = segment[len(segment.rstrip()):]
+        if tail.count("\n") >= 2:
+            return body + "\n\n"
+        if "\n" in tail:
+            return body + "\n"
+        return body + " " if tail else body
+
+
 logger = logging.getLogger(__name__)
 
 # Combined decorator for chatbot access
@@ -97,6 +172,72 @@ def chat_page(request):
     return render(request, "chatbot/chat_page.html")
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _rag_events(stream_resp):
+    """(event, data) pairs of the RAG service's SSE stream."""
+    current_event = None
+    for line in stream_resp.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        if line.startswith("event:"):
+            current_event = line.split(":", 1)[1].strip()
+        elif line.startswith("data:") and current_event:
+            try:
+                yield current_event, json.loads(line.split(":", 1)[1].strip())
+            except json.JSONDecodeError:
+                pass
+            current_event = None
+
+
+def _relay_answer(events, stream_resp, session_obj, session_id_str):
+    """
+    Body of the streamed chat_ask response: `session`, then the scrubbed
+    answer as `token` events while it is generated, then `done` with the
+    final answer once the assistant ChatMessage is saved. Sources are
+    persisted for the audit trail but never sent to the browser.
+    """
+    scrubber = IncrementalScrubber()
+    sources = None
+    yield _sse("session", {"session_id": session_id_str})
+    try:
+        for event, ev_data in events:
+            if event == "sources":
+                sources = ev_data.get("sources")
+            elif event == "token":
+                text = scrubber.feed(ev_data.get("text", ""))
+                if text:
+                    yield _sse("token", {"text": text})
+            elif event == "done":
+                sources = ev_data.get("sources", sources)
+                break
+            elif event == "error":
+                yield _sse("error", {"message": ev_data.get("message", "Error from RAG service")})
+                return
+    except requests.exceptions.RequestException as e:
+        logger.error(f"RAG stream interrupted: {e}")
+        yield _sse("error", {"message": "The support chatbot stopped responding. Please try again."})
+        return
+    finally:
+        stream_resp.close()
+
+    tail = scrubber.flush()
+    if tail:
+        yield _sse("token", {"text": tail})
+
+    final_answer = scrubber.answer
+    # 4. Save local assistant message.
+    ChatMessage.objects.create(
+        session=session_obj,
+        role=ChatMessage.Role.ASSISTANT,
+        content=final_answer,
+        sources=sources,
+    )
+    yield _sse("done", {"session_id": session_id_str, "answer": final_answer})
+
+
 @chatbot_access_required
 @require_POST
 def chat_ask(request):
@@ -127,75 +268,41 @@ def chat_ask(request):
             content=message
         )
 
-        rag_url = getattr(settings, "RAG_SERVICE_URL", "http://127.0.0.1:8001")
-
-        # 2. Call FastAPI POST /api/message
-        post_url = f"{rag_url}/api/message"
-        post_payload = {
-            "session_id": session_id_str,
-            "message": message,
-            "mode": "auto"
-        }
-        
-        post_resp = requests.post(post_url, json=post_payload, timeout=10)
-        post_resp.raise_for_status()
-        resp_data = post_resp.json()
-        
-        request_id = resp_data.get("request_id")
-        if not request_id:
-            return JsonResponse({"error": "Invalid response from RAG service."}, status=502)
-
-        # 3. Stream SSE from FastAPI GET /api/stream
-        stream_url = f"{rag_url}/api/stream?session_id={session_id_str}&request_id={request_id}"
-        
-        # We consume the SSE on the Django (server) side, to keep the frontend simple
-        # and to enforce exactly the 60 second timeout mentioned in the plan.
-        # But `requests` with stream=True doesn't have an overall streaming timeout natively for sseclient,
-        # so we rely on the internal timeouts and standard usage.
-        
-        stream_resp = requests.get(stream_url, stream=True, timeout=10)
-        stream_resp.raise_for_status()
-        
-        actual_answer = []
-        actual_sources = None
-
-        current_event = None
-        for line in stream_resp.iter_lines(decode_unicode=True):
-            if not line:
-                continue
-            
-            if line.startswith("event:"):
-                current_event = line.split(":", 1)[1].strip()
-            elif line.startswith("data:") and current_event:
-                data_str = line.split(":", 1)[1].strip()
-                try:
-                    ev_data = json.loads(data_str)
-                    if current_event == "token":
-                        actual_answer.append(ev_data.get("text", ""))
-                    elif current_event == "done":
-                        actual_sources = ev_data.get("sources")
-                        break
-                    elif current_event == "error":
-                        return JsonResponse({"error": ev_data.get("message", "Error from RAG service")}, status=502)
-                except json.JSONDecodeError:
-                    pass
-                current_event = None
-
-        final_answer = scrub_citations("".join(actual_answer))
-
-        # 4. Save local assistant message (we still persist the raw sources
-        #    for the audit trail, but the API response never exposes them).
-        ChatMessage.objects.create(
-            session=session_obj,
-            role=ChatMessage.Role.ASSISTANT,
-            content=final_answer,
-            sources=actual_sources,
+        # 2. POST the message to FastAPI /api/chat/stream, which answers as
+        #    SSE on the same connection. Only the start is read here, so a
+        #    RAG failure before the first token still gets a proper status;
+        #    the rest streams from _relay_answer without holding a worker
+        #    process for the whole generation.
+        stream_resp = rag_client.post(
+            "/api/chat/stream",
+            json={"session_id": session_id_str, "message": message, "mode": "auto"},
+            stream=True,
         )
+        try:
+            stream_resp.raise_for_status()
 
-        return JsonResponse({
-            "session_id": session_id_str,
-            "answer": final_answer,
-        })
+            events = _rag_events(stream_resp)
+            head = []
+            for event, ev_data in events:
+                if event == "error":
+                    stream_resp.close()
+                    return JsonResponse({"error": ev_data.get("message", "Error from RAG service")}, status=502)
+                head.append((event, ev_data))
+                if event in ("token", "done"):
+                    break
+        except Exception:
+            # Until _relay_answer owns it, a failure here must release the
+            # streamed connection before the handlers below answer.
+            stream_resp.close()
+            raise
+
+        response = StreamingHttpResponse(
+            _relay_answer(itertools.chain(head, events), stream_resp, session_obj, session_id_str),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"   # nginx: pass events through unbuffered
+        return response
 
     except requests.exceptions.Timeout:
         logger.error("Timeout communicating with RAG service")
@@ -15,11 +15,15 @@ echo "✅ PostgreSQL is ready."
 echo "🔄 Running migrations..."
 python manage.py migrate --noinput
 
+# ml/ is bind-mounted from the host (docker-compose.yml; .dockerignore keeps
+# it out of the image), so the table persists across containers and is only
+# rebuilt when the model changes. A failed build (e.g. no trained model yet)
+# must not keep the site down: the views then run live inference.
+echo "🧮 Building inference lookup table (skipped if current)..."
+python manage.py build_inference_lookup || echo "⚠️  Lookup build failed; serving without the fast path."
+
 echo "📦 Collecting static files..."
 python manage.py collectstatic --noinput
 
 echo "🚀 Starting Gunicorn..."
-exec gunicorn autibloom.wsgi:application \
-    --bind 0.0.0.0:8000 \
-    --workers 3 \
-    --timeout 120
+exec gunicorn autibloom.wsgi:application --config gunicorn.conf.py
@@ -0,0 +1,233 @@
+"""
+Two-tier answer cache in front of RAGPipeline.answer.
+
+    exact     same query text (see cache_query: case and trailing punctuation
+              ignored), mode and version -> one SQLite lookup, no embedding
+    semantic  a cached query of the same mode and version whose embedding has
+              cosine similarity >= `similarity` with this one
+
+get_exact() and get_similar() consult one tier each, so a caller can skip
+embedding the query when the exact tier hits; get() does both.
+
+`version` identifies the corpus (and LLM) an answer came from, so a rebuilt
+index never serves answers retrieved from the old one. Entries live in the
+service's SQLite file (table answer_cache), expire `ttl_seconds` after they
+were written, and the least recently hit are evicted beyond `max_entries`.
+
+The semantic tier scans an in-memory matrix of cached query embeddings per
+(mode, version). Rows written by other server processes are picked up by
+rowid before each scan, and a semantic candidate is re-read from SQLite
+before it is served, so evictions by other processes are respected.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from rag_system.retrieval.context import normalize_query
+
+# Dropped from the end of a query before the exact-tier lookup.
+_TRAILING_PUNCTUATION = " ?!.,;:…？！。"
+
+
+def cache_query(query: str) -> str:
+    """normalize_query, casefolded and without trailing punctuation."""
+    return normalize_query(query).casefold().rstrip(_TRAILING_PUNCTUATION)
+
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS answer_cache (
+  key TEXT PRIMARY KEY,          -- sha256 of mode, version and cache_query(query)
+  query TEXT NOT NULL,           -- cache_query(query)
+  mode TEXT NOT NULL,            -- requested mode
+  version TEXT NOT NULL,         -- corpus / model version the answer belongs to
+  embedding BLOB NOT NULL,       -- float32 unit query vector
+  answer TEXT NOT NULL,
+  retrieved TEXT NOT NULL,       -- JSON list of retrieved chunks
+  mode_used TEXT NOT NULL,
+  created_at REAL NOT NULL,
+  last_hit_at REAL NOT NULL,
+  hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_answer_cache_lru ON answer_cache(last_hit_at);
+"""
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    retrieved: list
+    mode_used: str
+    tier: str            # exact | semantic
+    similarity: float
+
+
+class AnswerCache:
+    """Exact + semantic answer cache persisted in SQLite; safe to share between threads."""
+
+    def __init__(self, db_path: Path, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 5000,
+                 similarity: float = 0.95):
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL;")
+        self._db.execute("PRAGMA synchronous=NORMAL;")
+        self._db.executescript(SCHEMA_SQL)
+        self._db.commit()
+        # (mode, version) -> (keys, unit embeddings); filled from SQLite by rowid.
+        self._index: Dict[tuple, tuple] = {}
+        self._last_rowid = 0
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def key(query: str, mode: str, version: str) -> str:
+        return hashlib.sha256(f"{mode}\0{version}\0{cache_query(query)}".encode("utf-8")).hexdigest()
+
+    # ── Lookups ──────────────────────────────────────────────────────────────
+
+    def get(self, query: str, mode: str, version: str, vector: Optional[np.ndarray] = None) -> Optional[CachedAnswer]:
+        """
+        Cached answer for this query, or None. vector is the query's
+        embedding; without it only the exact tier is consulted.
+        """
+        hit = self.get_exact(query, mode, version)
+        if hit is None:
+            hit = self.get_similar(mode, version, vector)
+        return hit
+
+    def get_exact(self, query: str, mode: str, version: str) -> Optional[CachedAnswer]:
+        """The answer stored under this query's key, or None (not counted as a miss)."""
+        with self._lock:
+            hit = self._fetch(self.key(query, mode, version), time.time())
+            if hit is None:
+                return None
+            self.counters["exact_hits"] += 1
+            return CachedAnswer(*hit, tier="exact", similarity=1.0)
+
+    def get_similar(self, mode: str, version: str, vector: Optional[np.ndarray]) -> Optional[CachedAnswer]:
+        """
+        The answer of the most similar cached query, or None. Call after a
+        get_exact() miss: this is the last tier, so it records the miss.
+        """
+        now = time.time()
+        with self._lock:
+            if vector is not None and self.similarity <= 1.0:
+                self._sync()
+                for key, sim in self._nearest(mode, version, vector):
+                    hit = self._fetch(key, now)
+                    if hit is not None:
+                        self.counters["semantic_hits"] += 1
+                        return CachedAnswer(*hit, tier="semantic", similarity=sim)
+            self.counters["misses"] += 1
+            return None
+
+    def _fetch(self, key: str, now: float):
+        row = self._db.execute(
+            "SELECT answer, retrieved, mode_used, created_at FROM answer_cache WHERE key=?", (key,)
+        ).fetchone()
+        if row is None:
+            self._forget(key)
+            return None
+        if now - row[3] > self.ttl_seconds:
+            self._db.execute("DELETE FROM answer_cache WHERE key=?", (key,))
+            self._db.commit()
+            self._forget(key)
+            return None
+        self._db.execute("UPDATE answer_cache SET last_hit_at=?, hits=hits+1 WHERE key=?", (now, key))
+        self._db.commit()
+        return row[0], json.loads(row[1]), row[2]
+
+    def _nearest(self, mode: str, version: str, vector: np.ndarray):
+        """(key, similarity) of cached queries above the threshold, most similar first."""
+        keys, matrix = self._index.get((mode, version), ([], None))
+        if not keys:
+            return []
+        v = np.asarray(vector, dtype=np.float32).reshape(-1)
+        v = v / (np.linalg.norm(v) or 1.0)
+        sims = matrix @ v
+        order = np.flatnonzero(sims >= self.similarity)
+        order = order[np.argsort(-sims[order])]
+        return [(keys[i], float(sims[i])) for i in order]
+
+    # ── Writes ───────────────────────────────────────────────────────────────
+
+    def put(self, query: str, mode: str, version: str, vector: np.ndarray, answer: str,
+            retrieved: List[dict], mode_used: str) -> None:
+        v = np.asarray(vector, dtype=np.float32).reshape(-1)
+        v = v / (np.linalg.norm(v) or 1.0)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO answer_cache
+                  (key, query, mode, version, embedding, answer, retrieved, mode_used, created_at, last_hit_at, hits)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+                """,
+                (self.key(query, mode, version), cache_query(query), mode, version, v.tobytes(),
+                 answer, json.dumps(retrieved, ensure_ascii=False), mode_used, now, now),
+            )
+            self._db.execute("DELETE FROM answer_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._db.execute(
+                """
+                DELETE FROM answer_cache WHERE key IN (
+                  SELECT key FROM answer_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._db.commit()
+            self.counters["stores"] += 1
+
+    def _sync(self) -> None:
+        """Add rows written since the last sync (by any process) to the in-memory index."""
+        rows = self._db.execute(
+            "SELECT rowid, key, mode, version, embedding FROM answer_cache WHERE rowid > ? ORDER BY rowid",
+            (self._last_rowid,),
+        ).fetchall()
+        if not rows:
+            return
+        added: Dict[tuple, tuple] = {}
+        for rowid, key, mode, version, blob in rows:
+            self._last_rowid = max(self._last_rowid, rowid)
+            keys, vecs = added.setdefault((mode, version), ([], []))
+            keys.append(key)
+            vecs.append(np.frombuffer(blob, dtype=np.float32))
+        for group, (keys, vecs) in added.items():
+            old_keys, old_matrix = self._index.get(group, ([], None))
+            # A replaced row comes back with a new rowid; keep one copy.
+            fresh = set(keys)
+            keep = [i for i, k in enumerate(old_keys) if k not in fresh]
+            parts = [old_matrix[keep]] if keep else []
+            self._index[group] = ([old_keys[i] for i in keep] + keys, np.vstack(parts + [np.stack(vecs)]))
+
+    def _forget(self, key: str) -> None:
+        for group, (keys, matrix) in list(self._index.items()):
+            if key in keys:
+                i = keys.index(key)
+                self._index[group] = (keys[:i] + keys[i + 1:], np.delete(matrix, i, axis=0))
+
+    # ── Reporting ────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict:
+        """Hit/miss counters of this process and the number of stored entries."""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0]
+            c = dict(self.counters)
+        lookups = c["exact_hits"] + c["semantic_hits"] + c["misses"]
+        c["entries"] = entries
+        c["hit_rate"] = (c["exact_hits"] + c["semantic_hits"]) / lookups if lookups else 0.0
+        return c
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
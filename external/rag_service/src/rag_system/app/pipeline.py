@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+from rag_system.app.answer_cache import AnswerCache
 from rag_system.retrieval.router import RetrievalRouter
 from rag_system.prompting.prompt_builder import PromptBuilder
 from rag_system.llm.gemini_gemma import GemmaClient
@@ -8,19 +10,42 @@ class RAGResult:
     answer: str
     retrieved: list
     mode_used: str
+    cache: Optional[str] = None   # exact | semantic when served from the AnswerCache
 
 class RAGPipeline:
     """
-    Orchestrates: retrieval -> augmentation(prompt) -> generation
+    Orchestrates: retrieval -> augmentation(prompt) -> generation,
+    short-circuited by the answer cache when one is given.
     """
-    def __init__(self, router: RetrievalRouter, prompt_builder: PromptBuilder, llm: GemmaClient, settings):
+    def __init__(self, router: RetrievalRouter, prompt_builder: PromptBuilder, llm: GemmaClient, settings,
+                 cache: Optional[AnswerCache] = None):
         self.router = router
         self.pb = prompt_builder
         self.llm = llm
         self.s = settings
+        self.cache = cache
 
-    def answer(self, query: str, mode: str) -> RAGResult:
-        retrieved = self.router.retrieve(
+    def cache_version(self) -> str:
+        """Cached answers are only reused for the same indexes and LLM."""
+        return f"{self.router.corpus_version()}:{self.s.llm_model}"
+
+    def _cached(self, query: str, mode: str):
+        """
+        (query embedding, cache hit or None); (None, None) without a cache.
+        The embedding is None on an exact hit, which needs none.
+        """
+        if self.cache is None:
+            return None, None
+        version = self.cache_version()
+        hit = self.cache.get_exact(query, mode, version)
+        if hit is not None:
+            return None, hit
+        # The embedding is cached by the router, so retrieval on a miss reuses it.
+        vector = self.router.query_context(query).vector
+        return vector, self.cache.get_similar(mode, version, vector)
+
+    def _retrieve(self, query: str, mode: str) -> list:
+        return self.router.retrieve(
             query=query,
             mode=mode,
             bm25_k=self.s.bm25_k,
@@ -29,10 +54,52 @@ class RAGPipeline:
             rrf_k=self.s.rrf_k,
             max_per_doc=self.s.max_per_doc,
         )
+
+    def _store(self, query: str, mode: str, vector, text: str, retrieved: list) -> None:
+        if self.cache is not None and text.strip():
+            self.cache.put(query, mode, self.cache_version(), vector, text, retrieved, mode)
+
+    def answer(self, query: str, mode: str) -> RAGResult:
+        mode = mode.lower().strip()
+        vector, hit = self._cached(query, mode)
+        if hit is not None:
+            return RAGResult(answer=hit.answer, retrieved=hit.retrieved, mode_used=hit.mode_used, cache=hit.tier)
+
+        retrieved = self._retrieve(query, mode)
         prompt = self.pb.build_prompt(query, retrieved)
         text = self.llm.generate(
             prompt,
             temperature=self.s.temperature,
             max_output_tokens=self.s.max_output_tokens,
         )
+        self._store(query, mode, vector, text, retrieved)
         return RAGResult(answer=text, retrieved=retrieved, mode_used=mode)
+
+    def answer_stream(self, query: str, mode: str) -> Iterator[Tuple[str, object]]:
+        """
+        Like answer(), as a stream of events:
+
+            ("sources", RAGResult with an empty answer)   once, before any text
+            ("token", str)                                 answer text as generated
+
+        The answer is cached only if the stream is consumed to the end.
+        """
+        mode = mode.lower().strip()
+        vector, hit = self._cached(query, mode)
+        if hit is not None:
+            yield "sources", RAGResult(answer="", retrieved=hit.retrieved, mode_used=hit.mode_used, cache=hit.tier)
+            yield "token", hit.answer
+            return
+
+        retrieved = self._retrieve(query, mode)
+        yield "sources", RAGResult(answer="", retrieved=retrieved, mode_used=mode)
+        prompt = self.pb.build_prompt(query, retrieved)
+        parts = []
+        for piece in self.llm.generate_stream(
+            prompt,
+            temperature=self.s.temperature,
+            max_output_tokens=self.s.max_output_tokens,
+        ):
+            parts.append(piece)
+            yield "token", piece
+        self._store(query, mode, vector, "".join(parts), retrieved)
@@ -0,0 +1,423 @@
+"""
+Offline index build: PDFs in pdf_dir -> the artifacts RetrievalRouter loads.
+
+    python -m rag_system.build [--config configs/default.yaml] [--workers N] [--batch-size 256] [--full]
+
+For every enabled chunking strategy this writes a new version directory
+
+    artifacts/<mode>/<version>/chunks/            memory-mapped chunk store (see vectorstore/chunk_store.py);
+                                                  one row per live chunk, with a stable "id" and its "doc"
+    artifacts/<mode>/<version>/bm25/              sparse BM25 postings (see embeddings/sparse.py)
+    artifacts/<mode>/<version>/faiss_hnsw.index   vectors stored under the chunk ids
+    artifacts/<mode>/<version>/vectors.npy        float32 embeddings, one row per chunk row
+    artifacts/<mode>/<version>/manifest.json      per-doc SHA-256 and id range, tombstones, settings, timings
+
+and then points artifacts/<mode>/ACTIVE at it.
+
+By default the build is incremental: PDFs whose SHA-256 matches the manifest
+are left alone, and only new or changed ones are extracted, chunked and
+embedded. Their vectors are appended to the FAISS index under fresh ids; the
+ids of removed or replaced documents are tombstoned (filtered at search time)
+until they exceed COMPACT_RATIO of the index, when the index is rebuilt from
+vectors.npy (the exact embeddings; a quantized index only holds
+approximations of them). The BM25 postings are updated without re-tokenizing
+unchanged chunks. A full build runs when there is no compatible manifest
+(or with --full).
+
+PDF extraction and chunking run in a process pool; all chunk texts are then
+embedded together in large batches. A version directory is complete before
+ACTIVE is atomically replaced to name it (as in ml/registry.py), so a reader
+always finds a whole index, old or new; the previous version is kept for
+readers that resolved ACTIVE just before the swap.
+"""
+import argparse
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag_system.config import Settings, load_settings
+from rag_system.chunking.build_chunks import build_chunks_for_doc
+from rag_system.embeddings.dense import DenseEmbedder
+from rag_system.embeddings.sparse import SparseBM25, build_bm25, open_bm25, update_bm25
+from rag_system.ingestion.pdf_loader import extract_text_from_pdf
+from rag_system.vectorstore.faiss_hnsw import FaissHNSW
+from rag_system.vectorstore.chunk_store import ChunkStore, open_chunks
+from rag_system.vectorstore.persistence import ACTIVE_FILE, active_mode_dir
+
+MODES = ("fixed", "semantic")
+MANIFEST_VERSION = 5   # 4: versioned dirs with vectors.npy; 5: faiss_layout
+VECTORS_FILE = "vectors.npy"
+COMPACT_RATIO = 0.3   # rebuild the FAISS index once this share of its vectors is tombstoned
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _ingest_pdf(job) -> Dict:
+    """
+    Process-pool worker: hash, extract and chunk one PDF.
+    Returns {"path", "sha256", "chunks": {mode: [...]}, "seconds"} or {"path", "error"}.
+    """
+    path, chunk_size, overlap, fixed_enabled, semantic_enabled = job
+    t0 = time.perf_counter()
+    try:
+        text = extract_text_from_pdf(path)
+        chunks = build_chunks_for_doc(path, text, chunk_size, overlap, fixed_enabled, semantic_enabled)
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+    return {
+        "path": path,
+        "sha256": file_sha256(path),
+        "chunks": chunks,
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+def ingest_pdfs(pdf_paths: List[Path], s: Settings, workers: Optional[int] = None) -> List[Dict]:
+    """Extract + chunk PDFs in parallel; results keep the order of pdf_paths."""
+    jobs = [(p, s.chunk_size, s.overlap, s.fixed_enabled, s.semantic_enabled) for p in pdf_paths]
+    if workers == 1 or len(jobs) <= 1:
+        return [_ingest_pdf(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_ingest_pdf, jobs))
+
+
+def _enabled_modes(s: Settings) -> List[str]:
+    return [m for m, enabled in zip(MODES, (s.fixed_enabled, s.semantic_enabled)) if enabled]
+
+
+def _manifest_settings(s: Settings, dim: int) -> Dict:
+    """Settings an index depends on; a change in any of them needs a full build."""
+    return {
+        "version": MANIFEST_VERSION,
+        "embed_model": s.embed_model,
+        "normalize_embeddings": s.normalize_embeddings,
+        "dim": int(dim),
+        "chunk_size": s.chunk_size,
+        "overlap": s.overlap,
+        "faiss_factory": s.faiss_factory,
+    }
+
+
+def read_manifest(mode_dir: Path) -> Optional[Dict]:
+    try:
+        with open(mode_dir / "manifest.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def tombstone_ids(manifest: Dict) -> np.ndarray:
+    """Ids of removed chunks, expanded from the manifest's [start, end) ranges."""
+    ranges = manifest.get("tombstones") or []
+    if not ranges:
+        return np.empty(0, dtype="int64")
+    return np.concatenate([np.arange(a, b, dtype="int64") for a, b in ranges])
+
+
+def _assign_ids(doc: Dict, mode: str, next_id: int) -> Dict:
+    """Give doc's chunks for `mode` consecutive ids from next_id; returns its manifest entry."""
+    name = doc["path"].name
+    rows = doc["chunks"][mode]
+    for i, c in enumerate(rows):
+        c["id"] = next_id + i
+        c["doc"] = name
+    return {"sha256": doc["sha256"], "id_start": next_id, "id_end": next_id + len(rows), "n_chunks": len(rows)}
+
+
+def _split_ingested(results: List[Dict]):
+    docs, skipped = [], {}
+    for r in results:
+        if "error" in r:
+            skipped[r["path"].name] = r["error"]
+            print(f"[build] skipped {r['path'].name}: {r['error']}", flush=True)
+        else:
+            docs.append(r)
+    return docs, skipped
+
+
+def _embed(embedder, s: Settings, texts: List[str], batch_size: int, timings: Dict) -> np.ndarray:
+    if not texts:
+        timings["embed_s"] = 0.0
+        return None
+    t0 = time.perf_counter()
+    embedder = embedder or DenseEmbedder(s.embed_model, normalize=s.normalize_embeddings)
+    vectors = embedder.encode(texts, batch_size=batch_size)
+    timings["embed_s"] = time.perf_counter() - t0
+    print(f"[build] embedded {len(texts)} chunk(s) in {timings['embed_s']:.1f}s", flush=True)
+    return vectors
+
+
+def new_faiss_index(s: Settings, vectors: np.ndarray, ids) -> Tuple[FaissHNSW, str]:
+    """
+    A FAISS index in s.faiss_factory's layout holding vectors under ids, and
+    the layout it was built with. A corpus too small to train that layout
+    (e.g. fewer vectors than IVF lists) gets the default float32 HNSW index
+    instead, layout "".
+    """
+    kwargs = dict(M=s.hnsw_M, ef_construction=s.ef_construction, ef_search=s.ef_search,
+                  nprobe=s.faiss_nprobe, rerank_factor=s.faiss_rerank_factor)
+    faiss_store = FaissHNSW(dim=vectors.shape[1], factory=s.faiss_factory or None, **kwargs)
+    try:
+        faiss_store.add(vectors, ids)
+    except RuntimeError as e:
+        if not s.faiss_factory:
+            raise
+        print(f"[build] cannot train {s.faiss_factory!r} on {len(vectors)} vector(s), "
+              f"using HNSW{s.hnsw_M},Flat: {str(e).splitlines()[0]}", flush=True)
+        faiss_store = FaissHNSW(dim=vectors.shape[1], **kwargs)
+        faiss_store.add(vectors, ids)
+        return faiss_store, ""
+    return faiss_store, s.faiss_factory
+
+
+def write_mode_dir(mode_root: Path, chunks: List[Dict], bm25: SparseBM25, faiss_store: FaissHNSW,
+                   vectors: np.ndarray, manifest: Dict) -> Path:
+    """
+    Write one mode's artifacts into a new version dir under mode_root and
+    point mode_root/ACTIVE at it (temp file + os.replace). The version that
+    was active before is kept; older ones, and the files of an unversioned
+    index, are removed. Returns the new version dir.
+    """
+    mode_root.mkdir(parents=True, exist_ok=True)
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}"
+    staging = Path(tempfile.mkdtemp(prefix=f".{version}-", dir=mode_root))
+    try:
+        ChunkStore.write(staging / "chunks", chunks)
+        bm25.save(staging / "bm25")
+        faiss_store.save(str(staging / "faiss_hnsw.index"))
+        np.save(staging / VECTORS_FILE, np.ascontiguousarray(vectors, dtype="float32"))
+        with open(staging / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, mode_root / version)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    previous = active_mode_dir(mode_root.parent, mode_root.name).name
+    tmp_path = mode_root / f".{ACTIVE_FILE}.tmp"
+    tmp_path.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp_path, mode_root / ACTIVE_FILE)
+
+    # Dot entries are other builds' staging dirs; leave them alone.
+    for p in mode_root.iterdir():
+        if p.name in (version, previous, ACTIVE_FILE) or p.name.startswith("."):
+            continue
+        if p.is_dir():
+            shutil.rmtree(p, ignore_errors=True)
+        else:
+            p.unlink(missing_ok=True)
+    return mode_root / version
+
+
+def build_indexes(s: Settings, workers: Optional[int] = None, batch_size: int = 256,
+                  embedder: Optional[DenseEmbedder] = None) -> Dict[str, Dict]:
+    """
+    Build every enabled mode from s.pdf_dir into s.artifacts_dir.
+    Returns {mode: manifest}.
+    """
+    modes = _enabled_modes(s)
+    pdf_paths = sorted(s.pdf_dir.glob("*.pdf"))
+    if not pdf_paths:
+        raise FileNotFoundError(f"No PDFs found in {s.pdf_dir}")
+    if not modes:
+        raise ValueError("Both chunking strategies are disabled; nothing to build")
+
+    timings = {}
+    t0 = time.perf_counter()
+    docs, skipped = _split_ingested(ingest_pdfs(pdf_paths, s, workers=workers))
+    timings["ingest_s"] = time.perf_counter() - t0
+    print(f"[build] ingested {len(docs)} PDF(s) in {timings['ingest_s']:.1f}s", flush=True)
+
+    chunks = {m: [c for d in docs for c in d["chunks"][m]] for m in modes}
+    if not any(chunks.values()):
+        raise ValueError("No chunks were produced from the PDFs")
+
+    # One encode call for all modes keeps the batches full.
+    vectors = _embed(embedder, s, [c["text"] for m in modes for c in chunks[m]], batch_size, timings)
+
+    manifests = {}
+    offset = 0
+    for mode in modes:
+        mode_chunks = chunks[mode]
+        mode_vecs = np.ascontiguousarray(vectors[offset:offset + len(mode_chunks)])
+        offset += len(mode_chunks)
+        mode_timings = dict(timings)
+
+        doc_entries, next_id = {}, 0
+        for d in docs:
+            doc_entries[d["path"].name] = entry = _assign_ids(d, mode, next_id)
+            next_id = entry["id_end"]
+
+        t0 = time.perf_counter()
+        bm25 = build_bm25(mode_chunks)
+        mode_timings["bm25_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        faiss_store, layout = new_faiss_index(s, mode_vecs, [c["id"] for c in mode_chunks])
+        mode_timings["faiss_s"] = time.perf_counter() - t0
+
+        manifest = {
+            **_manifest_settings(s, mode_vecs.shape[1]),
+            "faiss_layout": layout,
+            "mode": mode,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "n_chunks": len(mode_chunks),
+            "next_id": next_id,
+            "docs": doc_entries,
+            "tombstones": [],
+            "skipped": skipped,
+            "timings": mode_timings,
+        }
+        version_dir = write_mode_dir(s.artifacts_dir / mode, mode_chunks, bm25, faiss_store, mode_vecs, manifest)
+        print(f"[build] {mode}: {len(mode_chunks)} chunk(s) -> {version_dir}", flush=True)
+        manifests[mode] = manifest
+
+    return manifests
+
+
+def update_indexes(s: Settings, workers: Optional[int] = None, batch_size: int = 256,
+                   embedder: Optional[DenseEmbedder] = None) -> Dict[str, Dict]:
+    """
+    Bring every enabled mode in line with s.pdf_dir, re-embedding only new or
+    changed PDFs. Falls back to build_indexes() if any mode has no manifest
+    or was built with different settings. Returns {mode: manifest}.
+    """
+    modes = _enabled_modes(s)
+    manifests = {m: read_manifest(active_mode_dir(s.artifacts_dir, m)) for m in modes}
+    for mode, man in manifests.items():
+        expected = _manifest_settings(s, man.get("dim", 0)) if man else None
+        # Keys added after a manifest was written default to "" (the default layout).
+        if not man or any(man.get(k, "") != v for k, v in expected.items()):
+            print(f"[build] {mode}: no compatible index, doing a full build", flush=True)
+            return build_indexes(s, workers=workers, batch_size=batch_size, embedder=embedder)
+
+    pdf_paths = {p.name: p for p in sorted(s.pdf_dir.glob("*.pdf"))}
+    if not pdf_paths:
+        raise FileNotFoundError(f"No PDFs found in {s.pdf_dir}")
+
+    timings = {}
+    t0 = time.perf_counter()
+    hashes = {name: file_sha256(p) for name, p in pdf_paths.items()}
+    timings["hash_s"] = time.perf_counter() - t0
+
+    # Per mode: indexed docs that are gone or changed, and PDFs to (re)index.
+    stale, fresh = {}, {}
+    for mode, man in manifests.items():
+        stale[mode] = sorted(n for n, d in man["docs"].items() if hashes.get(n) != d["sha256"])
+        fresh[mode] = sorted(n for n, h in hashes.items()
+                             if n not in man["docs"] or man["docs"][n]["sha256"] != h)
+    if not any(stale.values()) and not any(fresh.values()):
+        print("[build] index is up to date", flush=True)
+        return manifests
+
+    t0 = time.perf_counter()
+    needed = sorted(set().union(*fresh.values()))
+    docs, skipped = _split_ingested(ingest_pdfs([pdf_paths[n] for n in needed], s, workers=workers))
+    timings["ingest_s"] = time.perf_counter() - t0
+    print(f"[build] ingested {len(docs)} new or changed PDF(s) in {timings['ingest_s']:.1f}s", flush=True)
+    docs_by_name = {d["path"].name: d for d in docs}
+
+    added = {m: [docs_by_name[n] for n in fresh[m] if n in docs_by_name] for m in modes}
+    vectors = _embed(embedder, s, [c["text"] for m in modes for d in added[m] for c in d["chunks"][m]],
+                     batch_size, timings)
+
+    offset = 0
+    for mode in modes:
+        man, mode_dir = manifests[mode], active_mode_dir(s.artifacts_dir, mode)
+        mode_timings = dict(timings)
+        chunks = open_chunks(mode_dir).rows()
+        stored_vecs = np.load(mode_dir / VECTORS_FILE)
+        bm25 = open_bm25(mode_dir)
+        faiss_store = FaissHNSW.load(str(mode_dir / "faiss_hnsw.index"), ef_search=s.ef_search)
+
+        # Tombstone removed / replaced docs.
+        gone = set(stale[mode])
+        remove_positions = [i for i, c in enumerate(chunks) if c["doc"] in gone]
+        tombstones = list(man["tombstones"]) + [
+            [man["docs"][n]["id_start"], man["docs"][n]["id_end"]] for n in stale[mode]
+        ]
+        doc_entries = {n: d for n, d in man["docs"].items() if n not in gone}
+
+        # Append new / changed docs under fresh ids.
+        next_id = man["next_id"]
+        new_rows = []
+        for d in added[mode]:
+            doc_entries[d["path"].name] = entry = _assign_ids(d, mode, next_id)
+            next_id = entry["id_end"]
+            new_rows.extend(d["chunks"][mode])
+        mode_vecs = vectors[offset:offset + len(new_rows)] if new_rows else stored_vecs[:0]
+        offset += len(new_rows)
+
+        # Chunk rows and their vectors stay aligned: drop the removed, append the new.
+        keep = np.ones(len(chunks), dtype=bool)
+        keep[remove_positions] = False
+        chunks = [c for c in chunks if c["doc"] not in gone] + new_rows
+        live_vecs = np.concatenate([stored_vecs[keep], mode_vecs])
+
+        t0 = time.perf_counter()
+        layout = man["faiss_layout"]
+        n_dead = sum(b - a for a, b in tombstones)
+        if n_dead > COMPACT_RATIO * (faiss_store.index.ntotal + len(new_rows)) or layout != s.faiss_factory:
+            # Compaction, or another try at training a layout the corpus was
+            # too small for, from the stored vectors: nothing is re-embedded.
+            faiss_store, layout = new_faiss_index(s, live_vecs, [c["id"] for c in chunks])
+            tombstones = []
+            print(f"[build] {mode}: rebuilt FAISS index from {len(chunks)} vector(s)", flush=True)
+        elif new_rows:
+            faiss_store.add(mode_vecs, [c["id"] for c in new_rows])
+        mode_timings["faiss_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        bm25 = update_bm25(bm25, remove_positions, new_rows)
+        mode_timings["bm25_s"] = time.perf_counter() - t0
+
+        manifest = {
+            **man,
+            "faiss_layout": layout,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "n_chunks": len(chunks),
+            "next_id": next_id,
+            "docs": doc_entries,
+            "tombstones": tombstones,
+            "skipped": skipped,
+            "timings": mode_timings,
+        }
+        write_mode_dir(s.artifacts_dir / mode, chunks, bm25, faiss_store, live_vecs, manifest)
+        print(f"[build] {mode}: -{len(gone)} +{len(added[mode])} doc(s), {len(chunks)} chunk(s)", flush=True)
+        manifests[mode] = manifest
+
+    return manifests
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Build the RAG retrieval indexes from pdf_dir.")
+    ap.add_argument("--config", default="configs/default.yaml", help="config path relative to the project root")
+    ap.add_argument("--workers", type=int, default=None, help="PDF extraction processes (default: CPU count)")
+    ap.add_argument("--batch-size", type=int, default=256, help="embedding batch size")
+    ap.add_argument("--full", action="store_true", help="rebuild everything instead of updating changed PDFs")
+    args = ap.parse_args(argv)
+
+    s = load_settings(args.config)
+    t0 = time.perf_counter()
+    build = build_indexes if args.full else update_indexes
+    build(s, workers=args.workers, batch_size=args.batch_size)
+    print(f"[build] done in {time.perf_counter() - t0:.1f}s", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,11 +19,18 @@ class Settings:
     # Embeddings
     embed_model: str
     normalize_embeddings: bool
+    query_batch_window_ms: float  # how long a query waits to share a forward pass
+    query_max_batch: int          # queries embedded together at most
 
     # FAISS HNSW
     hnsw_M: int
     ef_construction: int
     ef_search: int
+    faiss_factory: str     # FAISS index_factory layout; "" = HNSW{M},Flat
+    faiss_nprobe: int      # IVF lists probed per query (IVF layouts)
+    faiss_rerank_factor: int  # candidates per result re-ranked exactly (RFlat layouts)
+    faiss_mmap: bool       # memory-map indexes so workers share one copy
+    faiss_preload: bool    # read mapped indexes into the page cache at startup
 
     # Retrieval
     bm25_k: int
@@ -31,8 +38,18 @@ class Settings:
     final_k: int
     rrf_k: int
     max_per_doc: int
+    query_cache_size: int  # recent query embeddings kept per process
     chunking_mode_default: str  # fixed | semantic | both | auto
 
+    # Answer cache
+    answer_cache_enabled: bool
+    answer_cache_ttl_s: float
+    answer_cache_max_entries: int
+    answer_cache_similarity: float  # cosine similarity for a semantic hit
+
+    # Rate limiting
+    rate_limit_backend: str  # memory | sqlite
+
     # LLM
     llm_model: str
     temperature: float
@@ -55,6 +72,8 @@ def load_settings(config_path: str = "configs/default.yaml") -> Settings:
     faiss_cfg = cfg.get("faiss", {})
     retrieval = cfg.get("retrieval", {})
     llm = cfg.get("llm", {})
+    answer_cache = cfg.get("answer_cache", {})
+    rate_limit = cfg.get("rate_limit", {})
 
     return Settings(
         project_root=root,
@@ -69,18 +88,33 @@ def load_settings(config_path: str = "configs/default.yaml") -> Settings:
 
         embed_model=str(embedding.get("model_name", "sentence-transformers/all-MiniLM-L6-v2")),
         normalize_embeddings=bool(embedding.get("normalize", True)),
+        query_batch_window_ms=float(embedding.get("query_batch_window_ms", 2)),
+        query_max_batch=int(embedding.get("query_max_batch", 32)),
 
         hnsw_M=int(faiss_cfg.get("M", 32)),
         ef_construction=int(faiss_cfg.get("ef_construction", 200)),
         ef_search=int(faiss_cfg.get("ef_search", 128)),
+        faiss_factory=str(faiss_cfg.get("factory") or ""),
+        faiss_nprobe=int(faiss_cfg.get("nprobe", 16)),
+        faiss_rerank_factor=int(faiss_cfg.get("rerank_factor", 4)),
+        faiss_mmap=bool(faiss_cfg.get("mmap", True)),
+        faiss_preload=bool(faiss_cfg.get("preload", False)),
 
         bm25_k=int(retrieval.get("bm25_k", 200)),
         dense_k=int(retrieval.get("dense_k", 50)),
         final_k=int(retrieval.get("final_k", 8)),
         rrf_k=int(retrieval.get("rrf_k", 60)),
         max_per_doc=int(retrieval.get("max_per_doc", 2)),
+        query_cache_size=int(retrieval.get("query_cache_size", 1024)),
         chunking_mode_default=str(retrieval.get("chunking_mode_default", "semantic")),
 
+        answer_cache_enabled=bool(answer_cache.get("enabled", True)),
+        answer_cache_ttl_s=float(answer_cache.get("ttl_hours", 168)) * 3600,
+        answer_cache_max_entries=int(answer_cache.get("max_entries", 5000)),
+        answer_cache_similarity=float(answer_cache.get("similarity", 0.95)),
+
+        rate_limit_backend=str(rate_limit.get("backend", "memory")),
+
         llm_model=str(llm.get("model", "gemini-2.5-flash")),
         temperature=float(llm.get("temperature", 0.2)),
         max_output_tokens=int(llm.get("max_output_tokens", 800)),
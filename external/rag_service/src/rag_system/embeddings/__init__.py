@@ -1,2 +1,3 @@
+from .batcher import EmbeddingBatcher
 from .dense import DenseEmbedder
-from .sparse import bm25_tokenize, build_bm25
+from .sparse import SparseBM25, bm25_tokenize, build_bm25, open_bm25, update_bm25
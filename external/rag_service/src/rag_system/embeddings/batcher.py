@@ -0,0 +1,116 @@
+"""
+Micro-batching for query embeddings.
+
+Each request thread used to run its own batch-of-one forward pass, so
+concurrent queries contended for the GIL and the BLAS threads instead of
+sharing a batch. EmbeddingBatcher queues the queries; one worker thread
+takes the first, waits up to window_ms for others (or until max_batch have
+arrived), embeds them in a single encode call and resolves each caller's
+future with its own row.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Drop-in for a DenseEmbedder on the query path: encode_query() is
+    batched across threads, encode() goes straight to the wrapped embedder.
+    """
+
+    def __init__(self, embedder, window_ms: float = 2.0, max_batch: int = 32, timeout_s: float = 30.0):
+        """
+        Args:
+            embedder:  a DenseEmbedder (anything with encode_queries(list) -> (n, dim)).
+            window_ms: how long the first query of a batch waits for company.
+            max_batch: queries embedded together at most.
+            timeout_s: how long encode_query waits for its row before raising TimeoutError.
+        """
+        self.embedder = embedder
+        self.window_s = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.timeout_s = timeout_s
+        self._queue = queue.Queue()
+        self._closed = False
+        # Held while checking _closed and enqueueing, so no query can be
+        # queued behind the stop sentinel and wait forever.
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.embedder.encode(texts, batch_size=batch_size)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """(1, dim) embedding of one query, computed in a batch with concurrent callers."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            self._queue.put((query, future))
+        try:
+            return future.result(timeout=self.timeout_s)
+        except TimeoutError:
+            # Not embedded yet: drop it from its batch. Already running: the row is discarded.
+            future.cancel()
+            raise
+
+    def close(self) -> None:
+        """
+        Stop the worker once the queries already queued are embedded. Any
+        still pending after 5 s (a hung encode) fail with RuntimeError.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(5)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("EmbeddingBatcher is closed"))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window_s
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._embed(batch)
+            if stop:
+                return
+
+    def _embed(self, batch):
+        # Skips queries whose caller gave up; the rest can no longer be cancelled.
+        batch = [(q, f) for q, f in batch if f.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            vectors = self.embedder.encode_queries([q for q, _ in batch])
+        except Exception as exc:
+            for _, f in batch:
+                f.set_exception(exc)
+            return
+        for i, (_, f) in enumerate(batch):
+            f.set_result(vectors[i:i + 1].copy())
@@ -20,3 +20,17 @@ class DenseEmbedder:
             normalize_embeddings=self.normalize
         )
         return np.asarray(vecs, dtype=np.float32)
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """(n, dim) embeddings of a few queries in one forward pass, without the progress bar."""
+        vecs = self.model.encode(
+            queries,
+            batch_size=max(len(queries), 1),
+            show_progress_bar=False,
+            normalize_embeddings=self.normalize
+        )
+        return np.asarray(vecs, dtype=np.float32)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """(1, dim) embedding of one query."""
+        return self.encode_queries([query])
@@ -1,10 +1,235 @@
+"""
+Sparse BM25 retrieval over a term-major CSR matrix (NumPy only).
+
+Row t of the matrix is the postings list of term t: the chunks that contain
+it and a precomputed weight per chunk,
+
+    idf(t) · tf·(k1 + 1) / (tf + k1·(1 − b + b·len/avgdl))
+
+so scoring a query only touches the postings of its terms, and the top-k
+is taken with np.argpartition over the chunks that matched. Scores equal
+rank_bm25.BM25Okapi (same IDF with its epsilon floor); chunks sharing no
+term with the query are not returned.
+
+Persisted as a bm25/ directory of .npy files that the server memory-maps,
+so every worker shares one copy of the postings through the page cache.
+Raw term frequencies and chunk lengths are kept so the index can be
+updated without re-tokenizing unchanged chunks.
+"""
 import re
-from rank_bm25 import BM25Okapi
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
 
 def bm25_tokenize(text: str):
     # simple tokenization: alnum words
     return re.findall(r"[a-zA-Z0-9]+", text.lower())
 
+
+class SparseBM25:
+    """BM25Okapi scores from a term-major CSR matrix."""
+
+    def __init__(self, terms: Sequence[str], indptr: np.ndarray, doc_ids: np.ndarray, tf: np.ndarray,
+                 doc_len: np.ndarray, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25,
+                 idf: np.ndarray = None, weights: np.ndarray = None):
+        """
+        Args:
+            terms:   vocabulary; term i owns postings indptr[i]:indptr[i+1].
+            doc_ids: chunk position of every posting, ascending within a term.
+            tf:      term frequency of every posting.
+            doc_len: token count of every chunk.
+            idf, weights: precomputed by an earlier instance (see load).
+        """
+        self.terms = list(terms)
+        self.vocab = {t: i for i, t in enumerate(self.terms)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.tf = np.asarray(tf, dtype=np.float32)
+        self.doc_len = np.asarray(doc_len, dtype=np.float32)
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        if self.n_docs == 0:
+            raise ValueError("BM25 index would be empty")
+        if idf is not None and weights is not None:
+            self.idf, self.weights = np.asarray(idf), np.asarray(weights)
+        else:
+            self._precompute()
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_len)
+
+    def _precompute(self):
+        # IDF exactly as rank_bm25.BM25Okapi: negative values are floored to
+        # epsilon times the average IDF.
+        df = np.diff(self.indptr).astype(np.float64)
+        n = float(self.n_docs)
+        idf = np.log(n - df + 0.5) - np.log(df + 0.5)
+        average_idf = float(idf.mean()) if idf.size else 0.0
+        idf[idf < 0] = self.epsilon * average_idf
+        self.idf = idf
+
+        avgdl = float(self.doc_len.mean()) or 1.0
+        tf = self.tf.astype(np.float64)
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[self.doc_ids] / avgdl)
+        term_of = np.repeat(np.arange(len(self.terms)), np.diff(self.indptr))
+        self.weights = idf[term_of] * tf * (self.k1 + 1.0) / (tf + norm)
+
+    # ── Construction ─────────────────────────────────────────────────────────
+
+    @classmethod
+    def from_postings(cls, terms, term_ids, doc_ids, tf, doc_len, **params) -> "SparseBM25":
+        """Build from unordered (term id, chunk, tf) triples."""
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        order = np.lexsort((doc_ids, term_ids))                # by term, then chunk
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=indptr[1:])
+        return cls(terms, indptr, doc_ids[order], np.asarray(tf)[order], doc_len, **params)
+
+    @classmethod
+    def from_term_counts(cls, doc_counts: List[Dict[str, int]], **params) -> "SparseBM25":
+        """Build from one {term: count} dict per chunk."""
+        terms = sorted({t for c in doc_counts for t in c})
+        vocab = {t: i for i, t in enumerate(terms)}
+        term_ids, doc_ids, tf = [], [], []
+        for d, counts in enumerate(doc_counts):
+            for t, n in counts.items():
+                term_ids.append(vocab[t])
+                doc_ids.append(d)
+                tf.append(n)
+        doc_len = [sum(c.values()) for c in doc_counts]
+        return cls.from_postings(terms, term_ids, doc_ids, tf, doc_len, **params)
+
+    # ── Scoring ──────────────────────────────────────────────────────────────
+
+    def _matched(self, query_tokens):
+        """(chunk positions, scores) for the chunks containing any query term."""
+        qcounts = Counter(t for t in query_tokens if t in self.vocab)
+        if not qcounts:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        spans = [(self.indptr[self.vocab[t]], self.indptr[self.vocab[t] + 1], n) for t, n in qcounts.items()]
+        docs = np.concatenate([self.doc_ids[a:b] for a, b, _ in spans])
+        weights = np.concatenate([self.weights[a:b] * n for a, b, n in spans])
+        # Sum per chunk over the query terms' postings.
+        order = np.argsort(docs, kind="stable")
+        docs, weights = docs[order], weights[order]
+        starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+        return docs[starts].astype(np.int64), np.add.reduceat(weights, starts)
+
+    def get_scores(self, query_tokens) -> np.ndarray:
+        """Score of every chunk, like BM25Okapi.get_scores."""
+        scores = np.zeros(self.n_docs)
+        docs, s = self._matched(query_tokens)
+        scores[docs] = s
+        return scores
+
+    def top_k(self, query_tokens, k: int):
+        """Best k matching chunks as (positions, scores), highest score first."""
+        docs, scores = self._matched(query_tokens)
+        if len(docs) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[keep], scores[keep]
+        order = np.lexsort((docs, -scores))
+        return docs[order], scores[order]
+
+    # ── Updates and persistence ──────────────────────────────────────────────
+
+    def updated(self, remove_positions, added_chunks) -> "SparseBM25":
+        """
+        A new index without the chunks at remove_positions and with
+        added_chunks appended. Only the added chunks are tokenized.
+        """
+        keep_doc = np.ones(self.n_docs, dtype=bool)
+        keep_doc[np.asarray(list(remove_positions), dtype=np.int64)] = False
+        new_pos = np.cumsum(keep_doc) - 1                      # old position -> new position
+
+        term_of = np.repeat(np.arange(len(self.terms)), np.diff(self.indptr))
+        keep = keep_doc[self.doc_ids]
+        term_ids = [term_of[keep]]
+        doc_ids = [new_pos[self.doc_ids[keep]]]
+        tf = [self.tf[keep]]
+        doc_len = [self.doc_len[keep_doc]]
+
+        terms, vocab = list(self.terms), dict(self.vocab)
+        base = int(keep_doc.sum())
+        for i, c in enumerate(added_chunks):
+            counts = Counter(bm25_tokenize(c["text"]))
+            for t in counts:
+                if t not in vocab:
+                    vocab[t] = len(terms)
+                    terms.append(t)
+            term_ids.append(np.array([vocab[t] for t in counts], dtype=np.int64))
+            doc_ids.append(np.full(len(counts), base + i, dtype=np.int64))
+            tf.append(np.array(list(counts.values()), dtype=np.float32))
+            doc_len.append(np.array([sum(counts.values())], dtype=np.float32))
+
+        # Terms no longer used by any chunk are dropped from the vocabulary.
+        term_ids = np.concatenate(term_ids)
+        used = np.zeros(len(terms), dtype=bool)
+        used[term_ids] = True
+        remap = np.cumsum(used) - 1
+        return SparseBM25.from_postings(
+            [t for t, u in zip(terms, used) if u], remap[term_ids], np.concatenate(doc_ids),
+            np.concatenate(tf), np.concatenate(doc_len), k1=self.k1, b=self.b, epsilon=self.epsilon,
+        )
+
+    _ARRAYS = ("indptr", "doc_ids", "tf", "doc_len", "idf", "weights")
+
+    def save(self, directory: Path) -> None:
+        """Write the index as directory/*.npy (see load)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "terms.npy", np.array(self.terms, dtype=str))
+        np.save(directory / "params.npy", np.array([self.k1, self.b, self.epsilon]))
+        for name in self._ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "SparseBM25":
+        """
+        Load a saved index. Postings are memory-mapped read-only unless mmap
+        is False; only the vocabulary is copied into the process. Also reads
+        the single-file bm25.npz written by earlier builds.
+        """
+        path = Path(path)
+        if path.suffix == ".npz":
+            with np.load(path, allow_pickle=False) as z:
+                k1, b, epsilon = z["params"].tolist()
+                return cls(z["terms"].tolist(), z["indptr"], z["doc_ids"], z["tf"], z["doc_len"],
+                           k1=k1, b=b, epsilon=epsilon)
+
+        mode = "r" if mmap else None
+        k1, b, epsilon = np.load(path / "params.npy").tolist()
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mode) for name in cls._ARRAYS}
+        return cls(np.load(path / "terms.npy").tolist(), k1=k1, b=b, epsilon=epsilon, **arrays)
+
+    @classmethod
+    def from_okapi(cls, okapi) -> "SparseBM25":
+        """Convert a pickled rank_bm25.BM25Okapi (legacy bm25.pkl)."""
+        return cls.from_term_counts(okapi.doc_freqs, k1=okapi.k1, b=okapi.b, epsilon=okapi.epsilon)
+
+
 def build_bm25(chunks):
-    tokenized = [bm25_tokenize(c["text"]) for c in chunks]
-    return BM25Okapi(tokenized)
+    return SparseBM25.from_term_counts([Counter(bm25_tokenize(c["text"])) for c in chunks])
+
+def update_bm25(bm25, remove_positions, added_chunks):
+    """
+    Return bm25 without the chunks at remove_positions and with added_chunks
+    appended. Only the added chunks are tokenized; same scores as build_bm25
+    over the resulting chunk list.
+    """
+    return bm25.updated(remove_positions, added_chunks)
+
+def open_bm25(mode_dir: Path) -> SparseBM25:
+    """The BM25 index of an artifacts/<mode>/<version> dir, in any format a build has written."""
+    mode_dir = Path(mode_dir)
+    if (mode_dir / "bm25").is_dir():
+        return SparseBM25.load(mode_dir / "bm25")
+    if (mode_dir / "bm25.npz").exists():
+        return SparseBM25.load(mode_dir / "bm25.npz")
+    # Index built with rank_bm25: convert the pickled BM25Okapi.
+    import pickle  # noqa: PLC0415
+    with open(mode_dir / "bm25.pkl", "rb") as f:
+        return SparseBM25.from_okapi(pickle.load(f))
@@ -0,0 +1,167 @@
+"""
+Compare FAISS index layouts on a built corpus: recall@k against exact
+search, single-query latency and index size.
+
+    python -m rag_system.index_report [--config configs/default.yaml] [--mode semantic]
+                                      [--factory F ...] [--queries 200 | --queries-file q.txt]
+                                      [--k 10] [--scale 20] [--out report.json]
+
+The vectors are the exact embeddings the build stored next to the active
+index (vectors.npy), so run rag_system.build first; an index built before
+they were stored is read back from faiss_hnsw.index instead (live chunks
+only), which is exact only for the default float32 layout. Every layout is built through FaissHNSW
+with the config's search knobs (ef_search, nprobe, rerank_factor). Queries
+are sampled corpus vectors unless --queries-file gives real questions, one
+per line.
+
+"hot MB" is what must stay in RAM for fast queries: the whole index, except
+the float32 copy an RFlat layout keeps for re-ranking, which is only read
+for the few candidates of each query and can stay on disk when the server
+memory-maps the index. "hot MB at Nx" extrapolates it to a corpus --scale
+times larger.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from rag_system.build import VECTORS_FILE, read_manifest, tombstone_ids
+from rag_system.config import Settings, load_settings
+from rag_system.vectorstore.chunk_store import open_chunks
+from rag_system.vectorstore.faiss_hnsw import FaissHNSW
+from rag_system.vectorstore.persistence import active_mode_dir
+
+
+def default_factories(n: int, dim: int, M: int) -> List[str]:
+    """Flat baseline, HNSW-SQ8 and IVF-PQ with exact re-rank, sized for n vectors."""
+    nlist = max(1, min(4096, int(4 * np.sqrt(n))))
+    pq_m = max(m for m in range(1, dim // 4 + 1) if dim % m == 0) if dim >= 4 else 1
+    return ["", f"HNSW{M}_SQ8", f"IVF{nlist}_HNSW32,PQ{pq_m},RFlat"]
+
+
+def live_vectors(s: Settings, mode: str):
+    """(vectors, ids) of the live chunks in a built mode."""
+    mode_dir = active_mode_dir(s.artifacts_dir, mode)
+    if (mode_dir / VECTORS_FILE).exists():
+        ids = np.fromiter((c["id"] for c in open_chunks(mode_dir).rows()), dtype="int64")
+        return np.ascontiguousarray(np.load(mode_dir / VECTORS_FILE), dtype="float32"), ids
+    store = FaissHNSW.load(str(mode_dir / "faiss_hnsw.index"))
+    vectors, ids = store.vectors_with_ids()
+    manifest = read_manifest(mode_dir)
+    if manifest:
+        live = ~np.isin(ids, tombstone_ids(manifest))
+        vectors, ids = vectors[live], ids[live]
+    return np.ascontiguousarray(vectors, dtype="float32"), ids
+
+
+def measure(s: Settings, factory: str, vectors: np.ndarray, ids: np.ndarray, queries: np.ndarray,
+            truth: np.ndarray, k: int, scale: float) -> Dict:
+    """Build `factory` over vectors and measure it against the exact neighbours in truth."""
+    row = {"factory": factory or f"HNSW{s.hnsw_M},Flat"}
+    t0 = time.perf_counter()
+    store = FaissHNSW(dim=vectors.shape[1], M=s.hnsw_M, ef_construction=s.ef_construction,
+                      ef_search=s.ef_search, factory=factory or None,
+                      nprobe=s.faiss_nprobe, rerank_factor=s.faiss_rerank_factor)
+    try:
+        store.add(vectors, ids)
+    except RuntimeError as e:
+        row["error"] = str(e).splitlines()[0]
+        return row
+    row["build_s"] = time.perf_counter() - t0
+
+    found, latencies = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, hit = store.search(q[None, :], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found.append(hit[0])
+    row[f"recall@{k}"] = float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+    row["p50_ms"] = float(np.percentile(latencies, 50))
+    row["p95_ms"] = float(np.percentile(latencies, 95))
+    size = len(faiss.serialize_index(store.index))
+    refine = store._parts()[0]
+    cold = refine.refine_index.sa_code_size() * refine.refine_index.ntotal if refine is not None else 0
+    row["index_mb"] = size / 2**20
+    row["hot_mb"] = (size - cold) / 2**20
+    row["hot_bytes_per_vector"] = (size - cold) / len(vectors)
+    row["scaled_hot_mb"] = (size - cold) * scale / 2**20
+    return row
+
+
+def compare(s: Settings, mode: str, factories: Optional[List[str]] = None, n_queries: int = 200,
+            query_texts: Optional[List[str]] = None, k: int = 10, scale: float = 20, seed: int = 0) -> Dict:
+    """Measure every layout in factories (default: default_factories) on a built mode."""
+    vectors, ids = live_vectors(s, mode)
+    if factories is None:
+        factories = default_factories(len(vectors), vectors.shape[1], s.hnsw_M)
+        if s.faiss_factory and s.faiss_factory not in factories:
+            factories.append(s.faiss_factory)
+
+    if query_texts:
+        from rag_system.embeddings.dense import DenseEmbedder  # noqa: PLC0415
+        queries = DenseEmbedder(s.embed_model, normalize=s.normalize_embeddings).encode(query_texts)
+    else:
+        rng = np.random.default_rng(seed)
+        queries = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    queries = np.ascontiguousarray(queries, dtype="float32")
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    k = min(k, len(vectors))
+    truth = ids[exact.search(queries, k)[1]]
+
+    rows = [measure(s, f, vectors, ids, queries, truth, k, scale) for f in factories]
+    return {"mode": mode, "n_vectors": len(vectors), "dim": int(vectors.shape[1]),
+            "n_queries": len(queries), "k": k, "scale": scale, "rows": rows}
+
+
+def format_report(report: Dict) -> str:
+    k, scale = report["k"], report["scale"]
+    lines = [
+        f"{report['mode']}: {report['n_vectors']} vectors x {report['dim']} dims, "
+        f"{report['n_queries']} queries, recall against exact search",
+        "",
+        f"| layout | recall@{k} | p50 ms | p95 ms | index MB | hot MB | hot bytes/vector | hot MB at {scale:g}x |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for r in report["rows"]:
+        if "error" in r:
+            lines.append(f"| {r['factory']} | not built: {r['error']} | | | | | | |")
+            continue
+        lines.append(f"| {r['factory']} | {r[f'recall@{k}']:.3f} | {r['p50_ms']:.2f} | {r['p95_ms']:.2f} "
+                     f"| {r['index_mb']:.1f} | {r['hot_mb']:.1f} | {r['hot_bytes_per_vector']:.0f} "
+                     f"| {r['scaled_hot_mb']:.0f} |")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Compare FAISS index layouts on a built corpus.")
+    ap.add_argument("--config", default="configs/default.yaml", help="config path relative to the project root")
+    ap.add_argument("--mode", default="semantic", choices=("fixed", "semantic"))
+    ap.add_argument("--factory", action="append", default=None,
+                    help="index_factory string to compare (repeatable; default: flat, SQ8, IVF-PQ+RFlat)")
+    ap.add_argument("--queries", type=int, default=200, help="corpus vectors sampled as queries")
+    ap.add_argument("--queries-file", default=None, help="text file with one query per line")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--scale", type=float, default=20, help="corpus growth factor for the size projection")
+    ap.add_argument("--out", default=None, help="also write the report as JSON")
+    args = ap.parse_args(argv)
+
+    s = load_settings(args.config)
+    query_texts = None
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            query_texts = [line.strip() for line in f if line.strip()]
+    report = compare(s, args.mode, factories=args.factory, n_queries=args.queries,
+                     query_texts=query_texts, k=args.k, scale=args.scale)
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from typing import Iterator
+
 from google import genai
 from google.genai import types
 
@@ -19,3 +21,17 @@ class GemmaClient:
             ),
         )
         return resp.text or ""
+
+    def generate_stream(self, prompt: str, temperature: float = 0.2, max_output_tokens: int = 800) -> Iterator[str]:
+        """Yield the answer text as the model produces it."""
+        stream = self.client.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                temperature=temperature,
+                max_output_tokens=max_output_tokens
+            ),
+        )
+        for chunk in stream:
+            if chunk.text:
+                yield chunk.text
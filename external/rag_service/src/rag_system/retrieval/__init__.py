@@ -1,2 +1,3 @@
+from .context import QueryContext, QueryEmbeddingCache
 from .hybrid import hybrid_retrieve, rrf_fuse
 from .router import RetrievalRouter
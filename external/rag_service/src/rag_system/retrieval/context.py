@@ -0,0 +1,61 @@
+"""
+Per-request query state shared by every sub-retriever.
+
+A QueryContext carries the query's BM25 tokens and dense vector, computed
+once per request, so mode "both" (two hybrid_retrieve calls) runs one
+sentence-transformer forward pass instead of two. QueryEmbeddingCache keeps
+the vectors of recent queries, keyed by normalized text, so a repeated or
+retried question does not hit the model at all.
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """NFC, trimmed, runs of whitespace collapsed to one space."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", query)).strip()
+
+
+@dataclass(frozen=True)
+class QueryContext:
+    query: str            # normalized query text
+    tokens: List[str]     # BM25 tokens
+    vector: np.ndarray    # (1, dim) float32 query embedding
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of query embeddings, keyed by normalized query text."""
+
+    def __init__(self, embedder, maxsize: int = 1024):
+        self.embedder = embedder
+        self.maxsize = maxsize
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> np.ndarray:
+        """(1, dim) embedding of an already normalized query."""
+        with self._lock:
+            vec = self._vectors.get(query)
+            if vec is not None:
+                self._vectors.move_to_end(query)
+                return vec
+        # Encode outside the lock; two threads racing on one query just both encode it.
+        vec = self.embedder.encode_query(query)
+        vec.setflags(write=False)
+        if self.maxsize > 0:
+            with self._lock:
+                self._vectors[query] = vec
+                self._vectors.move_to_end(query)
+                while len(self._vectors) > self.maxsize:
+                    self._vectors.popitem(last=False)
+        return vec
+
+    def context(self, query: str, tokenize_fn) -> QueryContext:
+        query = normalize_query(query)
+        return QueryContext(query=query, tokens=tokenize_fn(query), vector=self.get(query))
@@ -1,15 +1,24 @@
-import numpy as np
+from rag_system.retrieval.context import QueryContext
+from rag_system.vectorstore.chunk_store import ChunkList
 
-def retrieve_sparse_bm25(bm25, tokenize_fn, query: str, top_k: int):
-    q_tokens = tokenize_fn(query)
-    scores = bm25.get_scores(q_tokens)
-    top_ids = np.argsort(scores)[::-1][:top_k]
-    return [(int(i), float(scores[i])) for i in top_ids]
+def retrieve_sparse_bm25(bm25, tokenize_fn, query: str, top_k: int, q_tokens=None):
+    """Sparse top-k as (chunk position, score); only chunks sharing a query term."""
+    if q_tokens is None:
+        q_tokens = tokenize_fn(query)
+    top_ids, scores = bm25.top_k(q_tokens, top_k)
+    return [(int(i), float(s)) for i, s in zip(top_ids, scores)]
 
-def retrieve_dense_hnsw(embedder, faiss_store, query: str, top_k: int):
-    q_vec = embedder.encode([query])  # (1, dim)
+def retrieve_dense_hnsw(embedder, faiss_store, query: str, top_k: int, id_to_pos=None, q_vec=None):
+    """
+    Dense top-k as (chunk position, score). id_to_pos maps the chunk ids the
+    index returns to positions (-1 if gone), e.g. ChunkStore.positions.
+    q_vec is the query's (1, dim) embedding, if already computed.
+    """
+    if q_vec is None:
+        q_vec = embedder.encode_query(query)  # (1, dim)
     scores, ids = faiss_store.search(q_vec.astype("float32"), top_k)
-    return [(int(i), float(s)) for i, s in zip(ids[0], scores[0])]
+    positions = id_to_pos(ids[0]) if id_to_pos is not None else ids[0]
+    return [(int(i), float(s)) for i, s in zip(positions, scores[0]) if i >= 0]
 
 def rrf_fuse(sparse_ranked, dense_ranked, k: int = 60):
     fused = {}
@@ -39,10 +48,21 @@ def hybrid_retrieve(
     dense_k: int,
     final_k: int,
     rrf_k: int,
-    max_per_doc: int
+    max_per_doc: int,
+    query_ctx: QueryContext = None,
 ):
-    sparse = retrieve_sparse_bm25(bm25, tokenize_fn, query, bm25_k)
-    dense  = retrieve_dense_hnsw(embedder, faiss_store, query, dense_k)
+    """
+    chunks is a ChunkStore (or a plain list of chunk dicts). Candidates are
+    ranked on metadata alone; text is read only for the final_k returned.
+    query_ctx, when given, supplies the query's tokens and embedding so
+    callers retrieving from several indexes compute them once.
+    """
+    if isinstance(chunks, list):
+        chunks = ChunkList(chunks)
+    q_tokens = query_ctx.tokens if query_ctx is not None else None
+    q_vec = query_ctx.vector if query_ctx is not None else None
+    sparse = retrieve_sparse_bm25(bm25, tokenize_fn, query, bm25_k, q_tokens=q_tokens)
+    dense  = retrieve_dense_hnsw(embedder, faiss_store, query, dense_k, id_to_pos=chunks.positions, q_vec=q_vec)
 
     fused_scores = rrf_fuse(sparse, dense, k=rrf_k)
 
@@ -53,7 +73,7 @@ def hybrid_retrieve(
 
     expanded = []
     for idx, fscore in ranked[: max(final_k * 4, 50)]:
-        c = chunks[idx]
+        c = chunks.meta(idx)
         expanded.append({
             "chunk_index": idx,
             "fused_score": float(fscore),
@@ -62,8 +82,9 @@ def hybrid_retrieve(
             "chunk_id": c["chunk_id"],
             "strategy": c.get("strategy"),
             "source": c["source"],
-            "text": c["text"]
         })
 
-    expanded = dedupe_by_source(expanded, max_per_doc=max_per_doc)
-    return expanded[:final_k]
+    results = dedupe_by_source(expanded, max_per_doc=max_per_doc)[:final_k]
+    for r in results:
+        r["text"] = chunks.text(r["chunk_index"])
+    return results
@@ -1,47 +1,75 @@
 from dataclasses import dataclass
 from pathlib import Path
-import pickle
+import hashlib
+import json
 import numpy as np
 
-from rag_system.vectorstore.persistence import load_jsonl
+from rag_system.vectorstore.chunk_store import open_chunks
 from rag_system.vectorstore.faiss_hnsw import FaissHNSW
-from rag_system.embeddings.sparse import bm25_tokenize
+from rag_system.vectorstore.persistence import active_mode_dir
+from rag_system.embeddings.sparse import SparseBM25, bm25_tokenize, open_bm25
 from rag_system.embeddings.dense import DenseEmbedder
+from rag_system.retrieval.context import QueryContext, QueryEmbeddingCache
 from rag_system.retrieval.hybrid import hybrid_retrieve, rrf_fuse
 
 @dataclass
 class RetrievalAssets:
-    chunks: list
-    bm25: object
+    chunks: object      # ChunkStore (memory-mapped) or ChunkList for legacy chunks.jsonl
+    bm25: SparseBM25
     faiss: FaissHNSW
+    mode_dir: Path      # the version directory these were loaded from
 
 class RetrievalRouter:
     """
     Loads retrieval assets for fixed/semantic indexes and routes queries
     based on user-selected mode: fixed | semantic | both | auto
     """
-    def __init__(self, artifacts_root: Path, embedder: DenseEmbedder, ef_search: int):
+    def __init__(self, artifacts_root: Path, embedder: DenseEmbedder, ef_search: int,
+                 mmap: bool = True, preload: bool = False, nprobe: int = 16, rerank_factor: int = 4,
+                 query_cache_size: int = 1024):
         self.root = artifacts_root
         self.embedder = embedder
         self.ef_search = ef_search
+        self.mmap = mmap          # memory-map FAISS indexes (shared between workers)
+        self.preload = preload    # warm each index's pages when its mode is loaded
+        self.nprobe = nprobe
+        self.rerank_factor = rerank_factor
         self._cache = {}  # mode -> RetrievalAssets
+        self._queries = QueryEmbeddingCache(embedder, maxsize=query_cache_size)
+        self._version = None
 
     def _load_mode(self, mode: str) -> RetrievalAssets:
         if mode in self._cache:
             return self._cache[mode]
 
-        mode_dir = self.root / mode
-        chunks = load_jsonl(mode_dir / "chunks.jsonl")
-
-        with open(mode_dir / "bm25.pkl", "rb") as f:
-            bm25 = pickle.load(f)
-
-        faiss_store = FaissHNSW.load(str(mode_dir / "faiss_hnsw.index"), ef_search=self.ef_search)
-
-        assets = RetrievalAssets(chunks=chunks, bm25=bm25, faiss=faiss_store)
+        mode_dir = active_mode_dir(self.root, mode)
+        chunks = open_chunks(mode_dir)
+        bm25 = open_bm25(mode_dir)
+        faiss_store = FaissHNSW.load(str(mode_dir / "faiss_hnsw.index"), ef_search=self.ef_search, mmap=self.mmap,
+                                     nprobe=self.nprobe, rerank_factor=self.rerank_factor)
+        if self.preload:
+            faiss_store.preload()
+
+        # Indexes from rag_system.build list removed docs' chunk ids as tombstones.
+        manifest_path = mode_dir / "manifest.json"
+        if manifest_path.exists():
+            ranges = json.loads(manifest_path.read_text(encoding="utf-8")).get("tombstones") or []
+            if ranges:
+                faiss_store.set_tombstones(
+                    np.concatenate([np.arange(a, b, dtype="int64") for a, b in ranges])
+                )
+
+        assets = RetrievalAssets(chunks=chunks, bm25=bm25, faiss=faiss_store, mode_dir=mode_dir)
         self._cache[mode] = assets
+        self._version = None  # now also covers this mode's index
         return assets
 
+    def load_modes(self, modes=("fixed", "semantic")) -> None:
+        """Load the assets of every built mode now instead of on its first query."""
+        for mode in modes:
+            if (active_mode_dir(self.root, mode) / "faiss_hnsw.index").exists():
+                self._load_mode(mode)
+
     def _auto_mode(self, query: str) -> str:
         """
         Simple heuristic:
@@ -54,10 +82,32 @@ class RetrievalRouter:
             return "fixed"
         return "semantic"
 
+    def corpus_version(self) -> str:
+        """
+        Fingerprint of the indexes this process serves: the manifests of the
+        version directories it has loaded (every built mode is loaded first),
+        not whatever ACTIVE points at now. Every build changes it.
+        """
+        if self._version is None:
+            self.load_modes()
+            h = hashlib.sha256()
+            for mode in sorted(self._cache):
+                manifest_path = self._cache[mode].mode_dir / "manifest.json"
+                if manifest_path.exists():
+                    h.update(mode.encode("utf-8"))
+                    h.update(manifest_path.read_bytes())
+            self._version = h.hexdigest()[:16]
+        return self._version
+
+    def query_context(self, query: str) -> QueryContext:
+        """Tokens and (cached) embedding of a query, shared by all modes."""
+        return self._queries.context(query, bm25_tokenize)
+
     def retrieve(self, query: str, mode: str, bm25_k: int, dense_k: int, final_k: int, rrf_k: int, max_per_doc: int):
         mode = mode.lower().strip()
         if mode == "auto":
             mode = self._auto_mode(query)
+        ctx = self.query_context(query)
 
         if mode in ("fixed", "semantic"):
             a = self._load_mode(mode)
@@ -72,7 +122,8 @@ class RetrievalRouter:
                 dense_k=dense_k,
                 final_k=final_k,
                 rrf_k=rrf_k,
-                max_per_doc=max_per_doc
+                max_per_doc=max_per_doc,
+                query_ctx=ctx,
             )
 
         if mode == "both":
@@ -81,9 +132,9 @@ class RetrievalRouter:
             a_sem = self._load_mode("semantic")
 
             res_fixed = hybrid_retrieve(query, a_fixed.chunks, a_fixed.bm25, bm25_tokenize, self.embedder, a_fixed.faiss,
-                                        bm25_k, dense_k, final_k, rrf_k, max_per_doc)
+                                        bm25_k, dense_k, final_k, rrf_k, max_per_doc, query_ctx=ctx)
             res_sem = hybrid_retrieve(query, a_sem.chunks, a_sem.bm25, bm25_tokenize, self.embedder, a_sem.faiss,
-                                      bm25_k, dense_k, final_k, rrf_k, max_per_doc)
+                                      bm25_k, dense_k, final_k, rrf_k, max_per_doc, query_ctx=ctx)
 
             # Convert to rankings for RRF fusion across modes
             rank_fixed = [(r["chunk_index"], r["fused_score"]) for r in res_fixed]
@@ -1,2 +1,3 @@
 from .faiss_hnsw import FaissHNSW
-from .persistence import save_jsonl, load_jsonl
+from .persistence import save_jsonl, load_jsonl, active_mode_dir
+from .chunk_store import ChunkStore, open_chunks
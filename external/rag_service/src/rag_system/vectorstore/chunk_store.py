@@ -0,0 +1,146 @@
+"""
+Read-only chunk store shared by all server processes through the page cache.
+
+A mode's chunks are kept in artifacts/<mode>/<version>/chunks/ as
+
+    meta.bin + meta.idx.npy   JSON metadata of every chunk (chunk_id, source, ...)
+    text.bin + text.idx.npy   UTF-8 text of every chunk
+    ids.npy                   stable chunk id per position (ascending)
+
+where *.idx.npy holds n + 1 byte offsets into the matching blob. Everything
+is memory-mapped, so a worker's heap does not grow with the corpus: a row's
+metadata or text is decoded only when asked for, and hybrid_retrieve reads
+text only for the results it returns.
+"""
+import json
+import mmap
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from rag_system.vectorstore.persistence import load_jsonl
+
+
+def _write_blob(directory: Path, name: str, items: List[bytes]) -> None:
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in items], out=offsets[1:])
+    with open(directory / f"{name}.bin", "wb") as f:
+        for b in items:
+            f.write(b)
+    np.save(directory / f"{name}.idx.npy", offsets)
+
+
+class _Blob:
+    """Offsets + memory-mapped bytes; item i is blob[offsets[i]:offsets[i+1]]."""
+
+    def __init__(self, directory: Path, name: str):
+        self.offsets = np.load(directory / f"{name}.idx.npy", mmap_mode="r")
+        self._mm = None
+        if self.offsets[-1] > 0:
+            with open(directory / f"{name}.bin", "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __getitem__(self, i: int) -> bytes:
+        a, b = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._mm[a:b] if b > a else b""
+
+
+class ChunkStore:
+    """Memory-mapped chunk rows, indexed by position (the BM25 / retrieval index)."""
+
+    TEXT_FIELD = "text"
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._meta = _Blob(self.directory, "meta")
+        self._text = _Blob(self.directory, "text")
+        ids_path = self.directory / "ids.npy"
+        self.ids = np.load(ids_path, mmap_mode="r") if ids_path.exists() else None
+
+    @staticmethod
+    def write(directory: Path, rows: List[Dict]) -> None:
+        """Write rows (dicts with a "text" field and optional "id") as a store."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        metas, texts = [], []
+        for r in rows:
+            meta = {k: v for k, v in r.items() if k != ChunkStore.TEXT_FIELD}
+            metas.append(json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+            texts.append(r.get(ChunkStore.TEXT_FIELD, "").encode("utf-8"))
+        _write_blob(directory, "meta", metas)
+        _write_blob(directory, "text", texts)
+        if rows and "id" in rows[0]:
+            ids = np.array([r["id"] for r in rows], dtype=np.int64)
+            if np.any(np.diff(ids) <= 0):
+                raise ValueError("chunk ids must be strictly ascending")
+            np.save(directory / "ids.npy", ids)
+
+    def __len__(self) -> int:
+        return len(self._meta.offsets) - 1
+
+    def meta(self, pos: int) -> Dict:
+        return json.loads(self._meta[pos])
+
+    def text(self, pos: int) -> str:
+        return self._text[pos].decode("utf-8")
+
+    def __getitem__(self, pos: int) -> Dict:
+        row = self.meta(pos)
+        row[self.TEXT_FIELD] = self.text(pos)
+        return row
+
+    def rows(self) -> List[Dict]:
+        """Every row, materialized (for the offline build, not for serving)."""
+        return [self[i] for i in range(len(self))]
+
+    def positions(self, ids) -> np.ndarray:
+        """Position of each chunk id, -1 where the id is not in the store."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.ids is None:
+            return np.where((ids >= 0) & (ids < len(self)), ids, -1)
+        if len(self.ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        pos = np.searchsorted(self.ids, ids)
+        pos = np.minimum(pos, len(self.ids) - 1)
+        return np.where(self.ids[pos] == ids, pos, -1)
+
+
+class ChunkList:
+    """ChunkStore interface over in-memory rows (legacy chunks.jsonl)."""
+
+    def __init__(self, rows: List[Dict]):
+        self._rows = rows
+        self.ids = None
+        self._by_id: Optional[Dict[int, int]] = None
+        if rows and "id" in rows[0]:
+            self._by_id = {int(r["id"]): i for i, r in enumerate(rows)}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def meta(self, pos: int) -> Dict:
+        return {k: v for k, v in self._rows[pos].items() if k != ChunkStore.TEXT_FIELD}
+
+    def text(self, pos: int) -> str:
+        return self._rows[pos].get(ChunkStore.TEXT_FIELD, "")
+
+    def __getitem__(self, pos: int) -> Dict:
+        return dict(self._rows[pos])
+
+    def rows(self) -> List[Dict]:
+        return list(self._rows)
+
+    def positions(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        if self._by_id is None:
+            return np.where((ids >= 0) & (ids < len(self)), ids, -1)
+        return np.array([self._by_id.get(int(i), -1) for i in ids], dtype=np.int64)
+
+
+def open_chunks(mode_dir: Path):
+    """ChunkStore for mode_dir/chunks/, or the rows of a legacy chunks.jsonl."""
+    mode_dir = Path(mode_dir)
+    if (mode_dir / "chunks" / "meta.idx.npy").exists():
+        return ChunkStore(mode_dir / "chunks")
+    return ChunkList(load_jsonl(mode_dir / "chunks.jsonl"))
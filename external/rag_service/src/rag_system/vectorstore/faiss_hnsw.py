@@ -1,3 +1,5 @@
+import os
+
 import faiss
 import numpy as np
 
@@ -5,35 +7,171 @@ class FaissHNSW:
     """
     FAISS HNSW index for ANN search.
     Uses inner product metric, which equals cosine similarity if vectors are normalized.
+
+    Vectors are stored under stable chunk ids (IndexIDMap2). HNSW cannot delete,
+    so removed chunks are tombstoned: their vectors stay in the graph but are
+    filtered out of search results until the index is rebuilt.
+
+    By default the graph holds float32 vectors (IndexHNSWFlat). `factory` swaps
+    in any FAISS index_factory layout instead, e.g. a compressed one:
+
+        "HNSW32_SQ8"                  HNSW over 8-bit scalar-quantized vectors
+        "IVF1024_HNSW32,PQ96,RFlat"   IVF-PQ (HNSW coarse quantizer); the best
+                                      rerank_factor * k candidates are re-ranked
+                                      with exact inner products
+
+    Trainable layouts are trained on the first batch of vectors added.
+
+    An index loaded with mmap=True keeps its vectors and graph in the file's
+    pages instead of the process heap, so every server worker shares one
+    physical copy through the page cache. Such an index is read-only.
     """
-    def __init__(self, dim: int, M: int = 32, ef_construction: int = 200, ef_search: int = 128):
+    def __init__(self, dim: int, M: int = 32, ef_construction: int = 200, ef_search: int = 128,
+                 factory: str = None, nprobe: int = 16, rerank_factor: int = 4):
         self.dim = dim
-        self.index = faiss.IndexHNSWFlat(dim, M, faiss.METRIC_INNER_PRODUCT)
-        self.index.hnsw.efConstruction = ef_construction
-        self.index.hnsw.efSearch = ef_search
+        if factory:
+            inner = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.IndexHNSWFlat(dim, M, faiss.METRIC_INNER_PRODUCT)
+        self.index = faiss.IndexIDMap2(inner)
+        self._search_params = None
+        self.path = None
+        self.mmapped = False
+        hnsw = self._parts()[2]
+        if hnsw is not None:
+            hnsw.hnsw.efConstruction = ef_construction
+        self.configure(ef_search, nprobe, rerank_factor)
+
+    def _parts(self):
+        """(refine, ivf, hnsw) layers of the index; None where a layer is absent."""
+        inner = self.index.index if isinstance(self.index, faiss.IndexIDMap2) else self.index
+        refine = ivf = hnsw = None
+        inner = faiss.downcast_index(inner)
+        if isinstance(inner, faiss.IndexRefine):
+            refine = inner
+            inner = faiss.downcast_index(inner.base_index)
+        if isinstance(inner, faiss.IndexIVF):
+            ivf = inner
+            inner = faiss.downcast_index(inner.quantizer)
+        if isinstance(inner, faiss.IndexHNSW):
+            hnsw = inner
+        return refine, ivf, hnsw
+
+    def configure(self, ef_search: int = 128, nprobe: int = 16, rerank_factor: int = 4) -> None:
+        """Set the search-time knobs of whichever layers the index has."""
+        refine, ivf, hnsw = self._parts()
+        if hnsw is not None:
+            hnsw.hnsw.efSearch = ef_search
+        if ivf is not None:
+            ivf.nprobe = nprobe
+        if refine is not None:
+            refine.k_factor = rerank_factor
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray = None):
+        """Add vectors under `ids` (default: the next positions 0..n-1)."""
+        if ids is None:
+            ids = np.arange(self.index.ntotal, self.index.ntotal + len(vectors))
+        ids = np.asarray(ids, dtype="int64")
+        if self.mmapped:
+            # FAISS aborts the process when a memory-mapped index is resized.
+            raise ValueError("index was loaded with mmap=True and is read-only")
+        vectors = vectors.astype("float32")
+        if not self.index.is_trained:
+            # Raises RuntimeError when there are too few vectors for the layout.
+            self.index.train(vectors)
+        if isinstance(self.index, faiss.IndexIDMap2):
+            self.index.add_with_ids(vectors, ids)
+        elif np.array_equal(ids, np.arange(self.index.ntotal, self.index.ntotal + len(vectors))):
+            self.index.add(vectors)   # legacy index: ids are positions
+        else:
+            raise ValueError("this index has no id map; rebuild it with rag_system.build")
 
-    def add(self, vectors: np.ndarray):
-        self.index.add(vectors.astype("float32"))
+    def set_tombstones(self, ids) -> None:
+        """Exclude these ids from every later search."""
+        ids = np.asarray(ids, dtype="int64")
+        if ids.size == 0:
+            self._search_params = None
+            return
+        refine, ivf, hnsw = self._parts()
+        if refine is not None and isinstance(self.index, faiss.IndexIDMap2):
+            # IndexRefine ignores the selector IndexIDMap2 translates to
+            # internal positions, so select on the base index by position.
+            ids = np.flatnonzero(np.isin(faiss.vector_to_array(self.index.id_map), ids)).astype("int64")
+        batch = faiss.IDSelectorBatch(ids)
+        selector = faiss.IDSelectorNot(batch)
+        # Search parameters replace the index's own knobs, so copy them over.
+        if ivf is not None:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+        elif hnsw is not None:
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.hnsw.efSearch)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        if refine is not None:
+            base = params
+            params = faiss.IndexRefineSearchParameters(k_factor=refine.k_factor, base_index_params=base)
+            params._base = base
+        # SWIG does not keep the selectors alive for us.
+        params._selectors = (batch, selector)
+        self._search_params = params
 
     def search(self, query_vec: np.ndarray, top_k: int):
         """
         query_vec shape: (1, dim)
-        Returns (scores, ids)
+        Returns (scores, ids); ids are -1 past the last hit.
         """
+        if self._search_params is not None:
+            return self.index.search(query_vec.astype("float32"), top_k, params=self._search_params)
         return self.index.search(query_vec.astype("float32"), top_k)
 
+    def vectors_with_ids(self):
+        """
+        Every stored vector (tombstoned included) and its id, in insertion
+        order. Vectors of a quantized layout without RFlat are approximate.
+        """
+        inner = self.index.index if isinstance(self.index, faiss.IndexIDMap2) else self.index
+        refine, ivf, _ = self._parts()
+        if refine is None and ivf is not None:
+            ivf.make_direct_map()
+        vectors = faiss.downcast_index(inner).reconstruct_n(0, self.index.ntotal)
+        if isinstance(self.index, faiss.IndexIDMap2):
+            ids = faiss.vector_to_array(self.index.id_map).astype("int64")
+        else:
+            ids = np.arange(self.index.ntotal, dtype="int64")
+        return vectors, ids
+
+    def preload(self) -> None:
+        """
+        Pull a memory-mapped index into the page cache and fault in the
+        entry point of the graph, so the first query does not pay for disk
+        reads. Pages stay shared with the other workers.
+        """
+        if self.path is None:
+            return
+        with open(self.path, "rb") as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            while f.read(16 << 20):
+                pass
+        if self.index.ntotal:
+            self.search(np.zeros((1, self.dim), dtype="float32"), 1)
+
     def save(self, path: str):
         faiss.write_index(self.index, path)
 
     @staticmethod
-    def load(path: str, ef_search: int = 128):
-        idx = faiss.read_index(path)
-        # set efSearch if HNSW
-        try:
-            idx.hnsw.efSearch = ef_search
-        except Exception:
-            pass
+    def load(path: str, ef_search: int = 128, mmap: bool = False, nprobe: int = 16, rerank_factor: int = 4):
+        """
+        Read an index written by save. With mmap=True the vectors and graph
+        are memory-mapped read-only (IO_FLAG_MMAP_IFC) rather than copied;
+        use it for serving, not for indexes that will be added to. The
+        search knobs are not stored in the file, so they are passed here.
+        """
+        flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        idx = faiss.read_index(path, flags)
         obj = FaissHNSW(dim=1)
         obj.index = idx
         obj.dim = idx.d
+        obj.path = path
+        obj.mmapped = mmap
+        obj.configure(ef_search, nprobe, rerank_factor)
         return obj
@@ -15,3 +15,20 @@ def load_jsonl(path: Path) -> List[Dict]:
             out.append(json.loads(line))
     return out
 
+
+# Each mode is built into artifacts/<mode>/<version>/ and published by
+# atomically replacing artifacts/<mode>/ACTIVE, which holds the version name.
+ACTIVE_FILE = "ACTIVE"
+
+def active_mode_dir(artifacts_dir: Path, mode: str) -> Path:
+    """
+    Directory holding the artifacts a reader should use for mode: the
+    version named in <mode>/ACTIVE, or <mode>/ itself for an index built
+    before versioned directories.
+    """
+    mode_root = Path(artifacts_dir) / mode
+    try:
+        version = (mode_root / ACTIVE_FILE).read_text(encoding="utf-8").strip()
+    except OSError:
+        version = ""
+    return mode_root / version if version else mode_root
@@ -0,0 +1,58 @@
+import dataclasses
+import hashlib
+
+import numpy as np
+import pytest
+
+from rag_system.config import load_settings
+
+WORDS = ("autism sensory routine communication therapy speech clinic parent child "
+         "visual schedule transition meltdown regulation sleep play").split()
+
+
+class HashEmbedder:
+    """DenseEmbedder stand-in: a fixed unit vector per text, no model download."""
+
+    dim = 16
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, batch_size: int = 32) -> np.ndarray:
+        self.calls += 1
+        vecs = np.stack([
+            np.random.default_rng(int(hashlib.md5(t.encode("utf-8")).hexdigest()[:8], 16)).standard_normal(self.dim)
+            for t in texts
+        ]).astype("float32")
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+    def encode_queries(self, queries) -> np.ndarray:
+        return self.encode(list(queries))
+
+    def encode_query(self, query: str) -> np.ndarray:
+        return self.encode([query])
+
+
+def write_pdf(path, seed: int, pages: int = 2) -> None:
+    """A PDF of random sentences over WORDS; the same seed gives the same text."""
+    import fitz  # PyMuPDF
+
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = "\n".join(" ".join(rng.choice(WORDS, 12)) for _ in range(40))
+        page.insert_textbox(fitz.Rect(36, 36, 560, 800), f"Introduction {seed}\n{text}", fontsize=8)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc.save(str(path))
+
+
+@pytest.fixture
+def embedder():
+    return HashEmbedder()
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return dataclasses.replace(load_settings(), artifacts_dir=tmp_path / "artifacts",
+                               pdf_dir=tmp_path / "pdfs")
@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rag_system.app import answer_cache
+from rag_system.app.answer_cache import AnswerCache
+
+SOURCES = [{"source": "guide.pdf", "chunk_id": 1}]
+
+
+def unit(seed: int, dim: int = 8) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    return v / np.linalg.norm(v)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(answer_cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "cache.sqlite3"
+
+
+def make_cache(db_path, **kwargs):
+    return AnswerCache(db_path, **{"ttl_seconds": 3600, "max_entries": 100, "similarity": 0.95, **kwargs})
+
+
+def store(cache, query, vector, version="v1", answer=None):
+    cache.put(query, "semantic", version, vector, answer or f"answer to {query}", SOURCES, "semantic")
+
+
+def test_exact_tier_ignores_case_and_trailing_punctuation(db_path, clock):
+    cache = make_cache(db_path)
+    store(cache, "What is stimming?", unit(1))
+
+    for query in ("what is STIMMING", "  What   is stimming?!", "WHAT IS STIMMING."):
+        hit = cache.get_exact(query, "semantic", "v1")
+        assert hit is not None and hit.tier == "exact"
+        assert hit.answer == "answer to What is stimming?"
+    assert cache.get_exact("What is stimming in adults?", "semantic", "v1") is None
+    assert cache.stats()["exact_hits"] == 3
+
+
+def test_semantic_tier_needs_a_close_vector(db_path, clock):
+    cache = make_cache(db_path)
+    v = unit(1)
+    store(cache, "How do I calm a meltdown", v)
+
+    near = v + 0.01 * unit(2)
+    hit = cache.get("Calming a meltdown", "semantic", "v1", near)
+    assert hit.tier == "semantic" and hit.similarity >= 0.95
+    assert cache.get("Calming a meltdown", "semantic", "v1", unit(3)) is None
+    assert cache.get("Calming a meltdown", "semantic", "v1") is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 2)
+
+
+def test_entries_expire_after_ttl(db_path, clock):
+    cache = make_cache(db_path, ttl_seconds=60)
+    store(cache, "sleep tips", unit(1))
+    clock[0] += 59
+    assert cache.get("sleep tips", "semantic", "v1", unit(1)) is not None
+
+    clock[0] += 2
+    assert cache.get("sleep tips", "semantic", "v1", unit(1)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_hit_entry_is_evicted(db_path, clock):
+    cache = make_cache(db_path, max_entries=2)
+    store(cache, "first", unit(1))
+    clock[0] += 1
+    store(cache, "second", unit(2))
+    clock[0] += 1
+    assert cache.get_exact("first", "semantic", "v1") is not None
+    clock[0] += 1
+    store(cache, "third", unit(3))
+
+    assert cache.get_exact("second", "semantic", "v1") is None
+    assert cache.get_exact("first", "semantic", "v1") is not None
+    assert cache.get_exact("third", "semantic", "v1") is not None
+    assert cache.stats()["entries"] == 2
+
+
+def test_other_processes_writes_and_evictions_are_seen(db_path, clock):
+    writer, reader = make_cache(db_path, max_entries=1), make_cache(db_path)
+    v = unit(1)
+    store(writer, "visual schedules", v)
+
+    # The reader picks the row up by rowid before its semantic scan.
+    assert reader.get_similar("semantic", "v1", v).answer == "answer to visual schedules"
+    # A replaced row comes back under a new rowid; the index keeps one copy.
+    store(writer, "visual schedules", v, answer="newer answer")
+    assert reader.get_similar("semantic", "v1", v).answer == "newer answer"
+    assert len(reader._index[("semantic", "v1")][0]) == 1
+
+    # The writer evicts it; the reader drops it instead of serving it.
+    clock[0] += 1
+    store(writer, "something else", unit(2))
+    assert reader.get_similar("semantic", "v1", v) is None
+    key = AnswerCache.key("visual schedules", "semantic", "v1")
+    assert key not in reader._index[("semantic", "v1")][0]
+
+
+def test_answers_are_not_shared_across_versions(db_path, clock):
+    cache = make_cache(db_path)
+    v = unit(1)
+    store(cache, "toilet training", v, version="corpus-a")
+
+    assert cache.get("toilet training", "semantic", "corpus-b", v) is None
+    store(cache, "toilet training", v, version="corpus-b", answer="from the new corpus")
+    assert cache.get("toilet training", "semantic", "corpus-b", v).answer == "from the new corpus"
+    assert cache.get("toilet training", "semantic", "corpus-a", v).answer == "answer to toilet training"
@@ -0,0 +1,111 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rag_system.app.pipeline import RAGPipeline
+from webapp.app.routes import api_chat
+
+from test_pipeline import FakeLLM, FakeRouter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [5000.0]
+    monkeypatch.setattr(api_chat, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def app(settings):
+    app = FastAPI()
+    app.include_router(api_chat.router)
+    app.state.rag_pipeline = RAGPipeline(FakeRouter(), SimpleNamespace(build_prompt=lambda q, r: f"prompt: {q}"),
+                                         FakeLLM(), settings)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    with TestClient(app) as client:
+        yield client
+
+
+def sse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def send(client, message="How do I use a visual schedule?", session_id="s1"):
+    resp = client.post("/api/message", json={"session_id": session_id, "message": message, "mode": "semantic"})
+    assert resp.status_code == 200
+    return resp.json()["request_id"]
+
+
+def open_stream(client, request_id, session_id="s1"):
+    return client.get("/api/stream", params={"session_id": session_id, "request_id": request_id})
+
+
+def test_message_is_streamed_once(client, clock):
+    request_id = send(client)
+    clock[0] += api_chat.PENDING_TTL_SECONDS - 1
+
+    resp = open_stream(client, request_id)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    assert [e for e, _ in sse_events(resp.text)] == ["sources", "token", "token", "token", "done"]
+
+    assert open_stream(client, request_id).status_code == 404
+
+
+def test_expired_request_id_is_404(client, clock):
+    request_id = send(client)
+    clock[0] += api_chat.PENDING_TTL_SECONDS
+
+    resp = open_stream(client, request_id)
+    assert resp.status_code == 404
+    assert resp.json()["detail"] == "Unknown or expired request_id"
+
+
+def test_stream_for_another_session_is_403(client, clock):
+    request_id = send(client, session_id="s1")
+    assert open_stream(client, request_id, session_id="s2").status_code == 403
+
+
+def test_pending_payloads_are_bounded(client, app, clock, monkeypatch):
+    monkeypatch.setattr(api_chat, "PENDING_MAX_ENTRIES", 3)
+    ids = []
+    for i in range(5):
+        ids.append(send(client, f"question {i}"))
+        clock[0] += 1
+    pending = app.state.pending_requests
+    assert list(pending) == ids[2:]
+
+    # Expired payloads are dropped by the next message, not kept until the cap.
+    clock[0] += api_chat.PENDING_TTL_SECONDS
+    latest = send(client, "question 5")
+    assert list(pending) == [latest]
+
+    assert open_stream(client, ids[0]).status_code == 404
+    assert open_stream(client, latest).status_code == 200
+
+
+def test_chat_stream_answers_in_the_same_response(client):
+    resp = client.post("/api/chat/stream",
+                       json={"session_id": "s1", "message": "How do I use a visual schedule?", "mode": "semantic"})
+
+    assert resp.status_code == 200
+    events = sse_events(resp.text)
+    assert [e for e, _ in events] == ["sources", "token", "token", "token", "done"]
+    assert events[0][1] == {
+        "mode_used": "semantic",
+        "cache": None,
+        "sources": [{"source": "guide.pdf", "chunk_id": 3, "strategy": None, "score": None}],
+    }
+    assert "".join(d["text"] for e, d in events if e == "token") == "Try a visual schedule."
+    assert events[-1][1] == {"ok": True, "mode_used": "semantic"}
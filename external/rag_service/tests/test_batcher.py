@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from rag_system.embeddings.batcher import EmbeddingBatcher
+
+from conftest import HashEmbedder
+
+
+class GatedEmbedder(HashEmbedder):
+    """Records every encode_queries batch; blocks in it until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def encode_queries(self, queries):
+        self.batches.append(list(queries))
+        self.entered.set()
+        assert self.release.wait(5)
+        return super().encode_queries(queries)
+
+
+def test_concurrent_callers_get_their_own_rows_from_one_batch():
+    embedder = HashEmbedder()
+    batcher = EmbeddingBatcher(embedder, window_ms=200, max_batch=8)
+    queries = [f"query {i}" for i in range(8)]
+    barrier = threading.Barrier(len(queries))
+
+    def ask(q):
+        barrier.wait()
+        return batcher.encode_query(q)
+
+    with ThreadPoolExecutor(len(queries)) as pool:
+        rows = list(pool.map(ask, queries))
+    batcher.close()
+
+    assert embedder.calls == 1
+    for q, row in zip(queries, rows):
+        assert row.shape == (1, HashEmbedder.dim)
+        np.testing.assert_array_equal(row, embedder.encode([q]))
+
+
+def test_close_embeds_queued_queries_then_refuses_new_ones():
+    embedder = GatedEmbedder()
+    batcher = EmbeddingBatcher(embedder, window_ms=0, max_batch=1)
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(batcher.encode_query, "first")
+        assert embedder.entered.wait(5)
+        queued = pool.submit(batcher.encode_query, "queued")
+        while batcher._queue.empty():
+            pass
+        closing = pool.submit(batcher.close)
+        embedder.release.set()
+        closing.result(5)
+        assert first.result(5).shape == (1, HashEmbedder.dim)
+        assert queued.result(5).shape == (1, HashEmbedder.dim)
+
+    with pytest.raises(RuntimeError):
+        batcher.encode_query("late")
+
+
+def test_close_fails_queries_stuck_behind_a_hung_encode(monkeypatch):
+    embedder = GatedEmbedder()
+    batcher = EmbeddingBatcher(embedder, window_ms=0, max_batch=1)
+    monkeypatch.setattr(batcher._thread, "join", lambda timeout=None: None)
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(batcher.encode_query, "first")
+        assert embedder.entered.wait(5)
+        queued = pool.submit(batcher.encode_query, "queued")
+        while batcher._queue.empty():
+            pass
+        batcher.close()
+        with pytest.raises(RuntimeError):
+            queued.result(5)
+        embedder.release.set()
+        assert first.result(5).shape == (1, HashEmbedder.dim)
+
+
+def test_caller_times_out_and_its_query_is_dropped():
+    embedder = GatedEmbedder()
+    batcher = EmbeddingBatcher(embedder, window_ms=0, max_batch=1, timeout_s=0.2)
+    with ThreadPoolExecutor(1) as pool:
+        first = pool.submit(batcher.encode_query, "first")
+        assert embedder.entered.wait(5)
+        with pytest.raises(TimeoutError):
+            batcher.encode_query("gave up")
+        # The first caller timed out too, but its batch was already running.
+        with pytest.raises(TimeoutError):
+            first.result(5)
+        embedder.release.set()
+    batcher.close()
+
+    assert embedder.batches == [["first"]]
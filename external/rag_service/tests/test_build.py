@@ -0,0 +1,126 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from rag_system import build
+from rag_system.retrieval.router import RetrievalRouter
+from rag_system.vectorstore.chunk_store import open_chunks
+from rag_system.vectorstore.persistence import ACTIVE_FILE, active_mode_dir
+
+from conftest import write_pdf
+
+QUERIES = ["sensory routine", "visual schedule for transition", "speech therapy clinic parent"]
+
+
+def snapshot(s, embedder):
+    """What a server would see for every mode: chunks, stored vectors and retrieval results."""
+    out = {}
+    router = RetrievalRouter(s.artifacts_dir, embedder, ef_search=s.ef_search, mmap=False)
+    for mode in build.MODES:
+        mode_dir = active_mode_dir(s.artifacts_dir, mode)
+        rows = open_chunks(mode_dir).rows()
+        vectors = np.load(mode_dir / build.VECTORS_FILE)
+        assert len(vectors) == len(rows)
+        results = {
+            q: [(r["source"], r["text"], round(r["fused_score"], 6))
+                for r in router.retrieve(q, mode, s.bm25_k, s.dense_k, s.final_k, s.rrf_k, s.max_per_doc)]
+            for q in QUERIES
+        }
+        out[mode] = {
+            "chunks": sorted((c["doc"], c["text"]) for c in rows),
+            "vectors": {(c["doc"], c["text"]): v.tobytes() for c, v in zip(rows, vectors)},
+            "docs": {n: d["sha256"] for n, d in build.read_manifest(mode_dir)["docs"].items()},
+            "results": results,
+        }
+    return out
+
+
+@pytest.mark.parametrize("factory, compact_ratio", [("", 1.0), ("HNSW32_SQ8", 0.0)])
+def test_incremental_update_matches_full_build(settings, embedder, monkeypatch, factory, compact_ratio):
+    s = dataclasses.replace(settings, faiss_factory=factory)
+    monkeypatch.setattr(build, "COMPACT_RATIO", compact_ratio)
+    for seed in (1, 2, 3):
+        write_pdf(s.pdf_dir / f"doc{seed}.pdf", seed)
+    build.build_indexes(s, workers=1, embedder=embedder)
+
+    # Remove one PDF, change one and add one.
+    (s.pdf_dir / "doc1.pdf").unlink()
+    write_pdf(s.pdf_dir / "doc2.pdf", 20)
+    write_pdf(s.pdf_dir / "doc4.pdf", 4)
+    manifests = build.update_indexes(s, workers=1, embedder=embedder)
+    for man in manifests.values():
+        # compact_ratio 0 rebuilds the index from vectors.npy and clears the tombstones.
+        assert bool(man["tombstones"]) == (compact_ratio > 0)
+
+    full = dataclasses.replace(s, artifacts_dir=s.artifacts_dir.parent / "full")
+    build.build_indexes(full, workers=1, embedder=embedder)
+
+    assert snapshot(s, embedder) == snapshot(full, embedder)
+
+
+def test_update_without_changes_reuses_index(settings, embedder):
+    write_pdf(settings.pdf_dir / "doc1.pdf", 1)
+    build.build_indexes(settings, workers=1, embedder=embedder)
+    active = {m: active_mode_dir(settings.artifacts_dir, m) for m in build.MODES}
+    calls = embedder.calls
+
+    build.update_indexes(settings, workers=1, embedder=embedder)
+
+    assert embedder.calls == calls
+    assert {m: active_mode_dir(settings.artifacts_dir, m) for m in build.MODES} == active
+
+
+def test_each_build_publishes_a_new_version(settings, embedder):
+    write_pdf(settings.pdf_dir / "doc1.pdf", 1)
+    mode_root = settings.artifacts_dir / "fixed"
+    # An index from before versioned dirs: its files sit directly in the mode dir.
+    mode_root.mkdir(parents=True)
+    (mode_root / "faiss_hnsw.index").write_bytes(b"legacy")
+    assert active_mode_dir(settings.artifacts_dir, "fixed") == mode_root
+
+    versions = []
+    for _ in range(3):
+        build.build_indexes(settings, workers=1, embedder=embedder)
+        versions.append(active_mode_dir(settings.artifacts_dir, "fixed"))
+        assert (mode_root / ACTIVE_FILE).read_text().strip() == versions[-1].name
+        assert build.read_manifest(versions[-1])["mode"] == "fixed"
+
+    assert len(set(versions)) == 3
+    # The active version and the one before it are kept, for readers that
+    # resolved ACTIVE just before it moved; older ones and legacy files go.
+    assert sorted(p.name for p in mode_root.iterdir()) == sorted([ACTIVE_FILE, versions[1].name, versions[2].name])
+
+
+def test_corpus_version_follows_the_loaded_indexes(settings, embedder):
+    write_pdf(settings.pdf_dir / "doc1.pdf", 1)
+    build.build_indexes(settings, workers=1, embedder=embedder)
+    router = RetrievalRouter(settings.artifacts_dir, embedder, ef_search=settings.ef_search, mmap=False)
+    router.retrieve(QUERIES[0], "fixed", settings.bm25_k, settings.dense_k, settings.final_k,
+                    settings.rrf_k, settings.max_per_doc)
+
+    # A build published before the semantic index's first query: the version
+    # must describe what the process serves, not what ACTIVE points at now.
+    write_pdf(settings.pdf_dir / "doc2.pdf", 2)
+    build.build_indexes(settings, workers=1, embedder=embedder)
+    version = router.corpus_version()
+
+    assert router._cache["fixed"].mode_dir != active_mode_dir(settings.artifacts_dir, "fixed")
+    assert router._cache["semantic"].mode_dir == active_mode_dir(settings.artifacts_dir, "semantic")
+    assert RetrievalRouter(settings.artifacts_dir, embedder, ef_search=settings.ef_search).corpus_version() != version
+    assert router.corpus_version() == version
+
+
+def test_untrainable_layout_is_retried_once_the_corpus_grows(settings, embedder):
+    # Training IVF16 needs at least 16 vectors.
+    s = dataclasses.replace(settings, faiss_factory="IVF16,Flat")
+    write_pdf(s.pdf_dir / "doc1.pdf", 1)
+    man = build.build_indexes(s, workers=1, embedder=embedder)["fixed"]
+    assert man["faiss_factory"] == "IVF16,Flat"
+    assert man["faiss_layout"] == "" and man["n_chunks"] < 16
+
+    write_pdf(s.pdf_dir / "doc2.pdf", 2, pages=4)
+    man = build.update_indexes(s, workers=1, embedder=embedder)["fixed"]
+
+    assert man["n_chunks"] >= 16
+    assert man["faiss_layout"] == "IVF16,Flat"
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rag_system.app.answer_cache import AnswerCache
+from rag_system.app.pipeline import RAGPipeline
+
+SOURCES = [{"source": "guide.pdf", "chunk_id": 3, "text": "Use a visual schedule."}]
+
+
+class FakeRouter:
+    def __init__(self):
+        self.embedded = []
+
+    def corpus_version(self):
+        return "corpus-1"
+
+    def query_context(self, query):
+        self.embedded.append(query)
+        return SimpleNamespace(vector=np.ones((1, 8), dtype="float32"))
+
+    def retrieve(self, **kwargs):
+        return SOURCES
+
+
+class FakeLLM:
+    def __init__(self, pieces=("Try ", "a visual ", "schedule.")):
+        self.pieces = pieces
+        self.prompts = []
+
+    def generate(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return "".join(self.pieces)
+
+    def generate_stream(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        yield from self.pieces
+
+
+@pytest.fixture
+def pipeline(settings, tmp_path):
+    cache = AnswerCache(tmp_path / "cache.sqlite3")
+    yield RAGPipeline(FakeRouter(), SimpleNamespace(build_prompt=lambda q, r: f"prompt: {q}"), FakeLLM(),
+                      settings, cache=cache)
+    cache.close()
+
+
+def test_exact_cache_hit_skips_the_embedding(pipeline):
+    first = pipeline.answer("What is stimming?", "semantic")
+    assert first.cache is None
+    assert pipeline.router.embedded == ["What is stimming?"]
+
+    again = pipeline.answer("what is STIMMING", "semantic")
+    assert again.cache == "exact"
+    assert again.answer == first.answer
+    assert pipeline.router.embedded == ["What is stimming?"]
+    assert len(pipeline.llm.prompts) == 1
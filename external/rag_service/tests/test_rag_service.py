@@ -0,0 +1,111 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from rag_system.app.answer_cache import AnswerCache
+from rag_system.app.pipeline import RAGPipeline
+from webapp.app.services.rag_service import stream_rag_sse
+
+from test_pipeline import FakeLLM, FakeRouter
+
+
+class FakeRequest:
+    def __init__(self):
+        self.gone = False
+
+    async def is_disconnected(self):
+        return self.gone
+
+
+def parse(chunk: bytes):
+    event, data = chunk.decode("utf-8").strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+async def collect(agen, on_event=lambda event, data: None):
+    events = []
+    async for chunk in agen:
+        events.append(parse(chunk))
+        on_event(*events[-1])
+    return events
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = AnswerCache(tmp_path / "cache.sqlite3")
+    yield cache
+    cache.close()
+
+
+def make_pipeline(settings, cache, llm):
+    return RAGPipeline(FakeRouter(), SimpleNamespace(build_prompt=lambda q, r: f"prompt: {q}"), llm,
+                       settings, cache=cache)
+
+
+def test_sources_are_sent_before_generation_starts(settings, cache):
+    sources_seen = threading.Event()
+
+    class WaitsForSources(FakeLLM):
+        def generate_stream(self, prompt, **kwargs):
+            # Deadlocks (and times out) unless `sources` reached the client first.
+            assert sources_seen.wait(5)
+            yield from super().generate_stream(prompt, **kwargs)
+
+    rag = make_pipeline(settings, cache, WaitsForSources())
+    events = asyncio.run(collect(
+        stream_rag_sse(rag, "visual schedules", "semantic", FakeRequest()),
+        lambda event, data: event == "sources" and sources_seen.set(),
+    ))
+
+    assert [e for e, _ in events] == ["sources", "token", "token", "token", "done"]
+    assert events[0][1]["sources"][0]["source"] == "guide.pdf"
+    assert events[0][1]["cache"] is None
+    assert "".join(d["text"] for e, d in events if e == "token") == "Try a visual schedule."
+
+
+def test_cache_hit_streams_the_stored_answer(settings, cache):
+    llm = FakeLLM()
+    rag = make_pipeline(settings, cache, llm)
+    first = asyncio.run(collect(stream_rag_sse(rag, "Visual schedules?", "semantic", FakeRequest())))
+    assert first[-1][0] == "done"
+
+    again = asyncio.run(collect(stream_rag_sse(rag, "visual schedules", "semantic", FakeRequest())))
+
+    assert again == [
+        ("sources", {"mode_used": "semantic", "cache": "exact", "sources": first[0][1]["sources"]}),
+        ("token", {"text": "Try a visual schedule."}),
+        ("done", {"ok": True, "mode_used": "semantic"}),
+    ]
+    assert len(llm.prompts) == 1
+
+
+def test_disconnect_stops_generation_and_caches_nothing(settings, cache):
+    closed = threading.Event()
+
+    class Endless(FakeLLM):
+        def generate_stream(self, prompt, **kwargs):
+            try:
+                while True:
+                    yield "more "
+                    time.sleep(0.01)
+            finally:
+                closed.set()
+
+    request = FakeRequest()
+    rag = make_pipeline(settings, cache, Endless())
+
+    def on_event(event, data):
+        if event == "token":
+            request.gone = True
+
+    events = asyncio.run(collect(stream_rag_sse(rag, "sleep tips", "semantic", request), on_event))
+
+    assert [e for e, _ in events] == ["sources", "token"]
+    # The pool thread closed the LLM stream instead of running it to the end...
+    assert closed.wait(5)
+    # ...so answer_stream never reached _store.
+    assert cache.stats()["entries"] == 0
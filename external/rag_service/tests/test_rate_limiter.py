@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from webapp.app.services.rate_limiter import RateLimiter, RateLimitRule, SQLiteBackend, _KeyedCounters
+
+RULE = RateLimitRule(max_requests=10, window_seconds=60)
+T0 = 6000.0  # start of a window
+
+
+def allowed(counters, key, now, n):
+    return sum(counters.hit(key, now) for _ in range(n))
+
+
+def test_sliding_window_estimate_weights_the_previous_window():
+    c = _KeyedCounters(RULE, max_keys=100, shards=4)
+    assert allowed(c, "a", T0, 12) == 10
+
+    # Half-way into the next window, half of the previous 10 still counts.
+    assert allowed(c, "a", T0 + 90, 10) == 5
+    # Near its end 10/60 of them do: 5 + 0.17 leaves room for 4.83, i.e. 5 more.
+    assert allowed(c, "a", T0 + 119, 10) == 5
+    # In the window after, that window's 10 are the previous ones, weighted 1/2.
+    assert allowed(c, "a", T0 + 150, 10) == 5
+    # Once both windows have ended the key starts afresh.
+    assert allowed(c, "a", T0 + 360, 12) == 10
+    assert c.counters["allowed"] == 35 and c.counters["denied"] == 19
+
+
+def test_keys_are_limited_independently():
+    c = _KeyedCounters(RULE, max_keys=100, shards=4)
+    assert allowed(c, "a", T0, 10) == 10
+    assert not c.hit("a", T0)
+    assert c.hit("b", T0)
+
+
+def test_least_recently_seen_key_is_evicted_at_the_shard_cap():
+    c = _KeyedCounters(RULE, max_keys=3, shards=1)
+    for key in ("a", "b", "c"):
+        allowed(c, key, T0, 10)
+    c.hit("a", T0 + 1)           # "b" is now the least recently seen
+
+    c.hit("d", T0 + 2)
+
+    assert len(c) == 3
+    assert c.counters["evicted"] == 1
+    assert not c.hit("a", T0 + 3)        # still tracked and at its limit
+    assert c.hit("b", T0 + 3)            # evicted: starts from a clean count
+    assert c.counters["evicted"] == 2    # ...at the cost of "c"
+
+
+def test_key_count_stays_bounded_under_many_clients():
+    c = _KeyedCounters(RULE, max_keys=64, shards=8)
+    for i in range(5000):
+        assert c.hit(f"client-{i}", T0 + i * 0.001)
+    assert len(c) <= 64
+    assert c.counters["evicted"] == 5000 - len(c)
+
+
+def test_sweep_drops_keys_whose_windows_have_ended():
+    c = _KeyedCounters(RULE, max_keys=100, shards=4)
+    for i in range(10):
+        c.hit(f"old-{i}", T0)
+    c.hit("recent", T0 + 60)
+
+    # Keys from the previous window still count toward the sliding estimate.
+    assert c.sweep(T0 + 61) == 0
+    assert c.sweep(T0 + 120) == 10
+    assert len(c) == 1
+    assert c.counters["expired"] == 10
+    assert c.sweep(T0 + 180) == 1
+    assert len(c) == 0
+
+
+def test_full_shard_expires_stale_keys_before_evicting():
+    c = _KeyedCounters(RULE, max_keys=2, shards=1)
+    c.hit("a", T0)
+    c.hit("b", T0)
+    c.hit("c", T0 + 120)
+    assert c.counters["expired"] == 2
+    assert c.counters["evicted"] == 0
+    assert len(c) == 1
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    backend = SQLiteBackend(tmp_path / "limits.sqlite3")
+    yield backend
+    run(backend.close())
+
+
+def takes(backend, key, now, n, rule=RULE):
+    async def go():
+        return sum([await backend.hit("session", key, rule, now) for _ in range(n)])
+    return run(go())
+
+
+def test_sqlite_bucket_allows_a_burst_then_denies(sqlite_backend):
+    assert takes(sqlite_backend, "a", T0, 12) == 10
+    assert takes(sqlite_backend, "b", T0, 1) == 1
+    assert sqlite_backend.counters == {"allowed": 11, "denied": 2, "expired": 0}
+
+
+def test_sqlite_bucket_refills_continuously(sqlite_backend):
+    # 10 per 60 s: one token every 6 s, up to the burst size.
+    assert takes(sqlite_backend, "a", T0, 10) == 10
+    assert takes(sqlite_backend, "a", T0 + 5.9, 1) == 0
+    assert takes(sqlite_backend, "a", T0 + 6, 2) == 1
+    assert takes(sqlite_backend, "a", T0 + 30, 10) == 4
+    assert takes(sqlite_backend, "a", T0 + 1000, 12) == 10
+
+
+def test_sqlite_sweep_drops_full_buckets(sqlite_backend):
+    takes(sqlite_backend, "a", T0, 1)
+    takes(sqlite_backend, "b", T0, 4)
+    rows = dict(sqlite_backend._db.execute("SELECT key, full_at FROM rate_limit").fetchall())
+    # Spent tokens come back at 6 s each.
+    assert rows == {"a": pytest.approx(T0 + 6), "b": pytest.approx(T0 + 24)}
+
+    assert run(sqlite_backend.sweep(T0 + 23)) == 1
+    assert run(sqlite_backend.stats()) == {"keys": {"session": 1}, "allowed": 5, "denied": 0, "expired": 1}
+    assert run(sqlite_backend.sweep(T0 + 24)) == 1
+    assert run(sqlite_backend.stats())["keys"] == {}
+    # A swept bucket starts full again.
+    assert takes(sqlite_backend, "b", T0 + 24, 11) == 10
+
+
+def test_sqlite_backends_on_one_file_share_the_limit(tmp_path):
+    path = tmp_path / "limits.sqlite3"
+    workers = [SQLiteBackend(path) for _ in range(2)]
+
+    async def hammer():
+        # Two "worker processes" (separate connections) racing for one key.
+        results = await asyncio.gather(*[
+            workers[i % 2].hit("ip", "10.0.0.1", RULE, T0) for i in range(40)
+        ])
+        for w in workers:
+            await w.close()
+        return results
+
+    results = run(hammer())
+    assert sum(results) == 10
+    assert sum(w.counters["allowed"] for w in workers) == 10
+    assert sum(w.counters["denied"] for w in workers) == 30
+
+
+def test_rate_limiter_checks_session_then_ip(tmp_path):
+    limiter = RateLimiter(RateLimitRule(2, 60), RateLimitRule(3, 60),
+                          backend=SQLiteBackend(tmp_path / "limits.sqlite3"))
+
+    async def go():
+        results = [await limiter.check(f"s{i // 2}", "10.0.0.1") for i in range(5)]
+        stats = await limiter.stats()
+        await limiter.stop()
+        return results, stats
+
+    results, stats = run(go())
+    assert [ok for ok, _ in results] == [True, True, True, False, False]
+    # s1's second request is within its session limit but the IP's third was the last.
+    assert results[3][1].startswith("Rate limit exceeded for IP")
+    assert results[4][1].startswith("Rate limit exceeded for IP")
+    assert stats["backend"] == "SQLiteBackend"
+    assert stats["keys"] == {"session": 3, "ip": 1}
@@ -12,14 +12,16 @@ from webapp.app.routes.admin import router as admin_router
 from webapp.app.settings import WebSettings
 from webapp.app.db import SQLiteConfig, init_db
 from webapp.app.services.log_service import LogService
-from webapp.app.services.rate_limiter import RateLimiter, RateLimitRule
+from webapp.app.services.rate_limiter import MemoryBackend, RateLimiter, RateLimitRule, SQLiteBackend
 
 # Import RAG objects 
 from rag_system.config import load_settings
+from rag_system.embeddings.batcher import EmbeddingBatcher
 from rag_system.embeddings.dense import DenseEmbedder
 from rag_system.retrieval.router import RetrievalRouter
 from rag_system.prompting.prompt_builder import PromptBuilder
 from rag_system.llm.gemini_gemma import GemmaClient
+from rag_system.app.answer_cache import AnswerCache
 from rag_system.app.pipeline import RAGPipeline
 
 
@@ -77,37 +79,77 @@ def create_app() -> FastAPI:
         app.state.log_service = LogService(cfg)
         await app.state.log_service.start()
 
-        # Rate limiter 
+        # Load settings via existing config system
+        settings = load_settings()
+
+        # Rate limiter; the sqlite backend shares its counts between workers.
+        if settings.rate_limit_backend == "sqlite":
+            limiter_backend = SQLiteBackend(db_path)
+        else:
+            limiter_backend = MemoryBackend(max_keys=50_000)                # per scope; LRU beyond
         app.state.rate_limiter = RateLimiter(
             per_session=RateLimitRule(max_requests=12, window_seconds=60),  # 12/min per session
             per_ip=RateLimitRule(max_requests=60, window_seconds=3600),     # 60/hour per IP
+            backend=limiter_backend,
         )
-        
-        # Load settings via existing config system
-        settings = load_settings()
+        await app.state.rate_limiter.start()
 
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("Missing GEMINI_API_KEY in .env")
 
         # Initialize components with correct signatures
-        embedder = DenseEmbedder(settings.embed_model, normalize=settings.normalize_embeddings)
+        # Queries from concurrent requests are embedded together.
+        embedder = EmbeddingBatcher(
+            DenseEmbedder(settings.embed_model, normalize=settings.normalize_embeddings),
+            window_ms=settings.query_batch_window_ms,
+            max_batch=settings.query_max_batch,
+        )
+        app.state.embedder = embedder
         router = RetrievalRouter(
             artifacts_root=settings.artifacts_dir,
             embedder=embedder,
-            ef_search=settings.ef_search
+            ef_search=settings.ef_search,
+            mmap=settings.faiss_mmap,
+            preload=settings.faiss_preload,
+            nprobe=settings.faiss_nprobe,
+            rerank_factor=settings.faiss_rerank_factor,
+            query_cache_size=settings.query_cache_size,
         )
+        if settings.faiss_preload:
+            router.load_modes()
         pb = PromptBuilder(prompts_dir=settings.prompts_dir)
         llm = GemmaClient(api_key=api_key, model=settings.llm_model)
 
+        # Answer cache shares the logging database.
+        answer_cache = None
+        if settings.answer_cache_enabled:
+            answer_cache = AnswerCache(
+                db_path,
+                ttl_seconds=settings.answer_cache_ttl_s,
+                max_entries=settings.answer_cache_max_entries,
+                similarity=settings.answer_cache_similarity,
+            )
+        app.state.answer_cache = answer_cache
+
         app.state.settings = settings
-        app.state.rag_pipeline = RAGPipeline(router=router, prompt_builder=pb, llm=llm, settings=settings)
+        app.state.rag_pipeline = RAGPipeline(router=router, prompt_builder=pb, llm=llm, settings=settings,
+                                             cache=answer_cache)
 
     @app.on_event("shutdown")
     async def shutdown():
         log = getattr(app.state, "log_service", None)
         if log:
             await log.stop()
+        limiter = getattr(app.state, "rate_limiter", None)
+        if limiter:
+            await limiter.stop()
+        embedder = getattr(app.state, "embedder", None)
+        if embedder:
+            embedder.close()
+        answer_cache = getattr(app.state, "answer_cache", None)
+        if answer_cache:
+            answer_cache.close()
 
     return app
 
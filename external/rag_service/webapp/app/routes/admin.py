@@ -72,6 +72,29 @@ async def logs_json(request: Request):
     return {"sessions": sessions, "messages": messages, "requests": requests_data}
 
 
+@router.get("/cache")
+async def cache_stats(request: Request):
+    """Answer cache hit/miss counters of this worker process."""
+    cache = getattr(request.app.state, "answer_cache", None)
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@router.get("/ratelimit")
+async def rate_limit_stats(request: Request):
+    """
+    Rate limiter state: tracked keys per scope and allow/deny/expire(/evict)
+    counters. The counters are this worker's; the keys are too with the
+    memory backend, but with the sqlite backend they are the shared table's,
+    i.e. every worker's on this host.
+    """
+    limiter = getattr(request.app.state, "rate_limiter", None)
+    if limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **await limiter.stats()}
+
+
 def _build_dashboard_html(sessions, messages, requests_data, stats) -> str:
     """Build the HTML dashboard."""
     
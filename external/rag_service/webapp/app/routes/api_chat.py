@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import time
 import uuid
 from typing import Dict, Any
 
@@ -13,6 +14,19 @@ from webapp.app.services.rag_service import stream_rag_sse
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
+# A message accepted by /api/message must be streamed within this long;
+# after that its pending payload is dropped. At most PENDING_MAX_ENTRIES
+# are kept; beyond that the oldest are dropped early.
+PENDING_TTL_SECONDS = 120
+PENDING_MAX_ENTRIES = 10_000
+
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache, no-store, must-revalidate, no-transform",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # Disable nginx buffering
+    "Content-Type": "text/event-stream; charset=utf-8",
+}
+
 
 class ChatRequest(BaseModel):
     session_id: str
@@ -33,14 +47,20 @@ def _ensure_state(app):
         app.state.pending_lock = asyncio.Lock()
 
 
-@router.post("/message", response_model=ChatAccepted)
-async def message(req: ChatRequest, request: Request):
+def _prune_pending(pending: Dict[str, Dict[str, Any]], now: float) -> None:
     """
-    Accept a user message and return a request_id.
-    The actual answer is streamed from /api/stream using SSE.
+    Drop payloads older than PENDING_TTL_SECONDS, and the oldest beyond
+    PENDING_MAX_ENTRIES - 1 to make room (the dict is in creation order).
     """
-    _ensure_state(request.app)
+    while pending:
+        request_id, payload = next(iter(pending.items()))
+        if now - payload["created_at"] < PENDING_TTL_SECONDS and len(pending) < PENDING_MAX_ENTRIES:
+            break
+        del pending[request_id]
+
 
+async def _accept(req: ChatRequest, request: Request) -> str:
+    """Rate-limit and log a new message; returns its request_id."""
     # ---- Rate limiting----
     limiter = getattr(request.app.state, "rate_limiter", None)
     if limiter:
@@ -51,16 +71,6 @@ async def message(req: ChatRequest, request: Request):
 
     request_id = str(uuid.uuid4())
 
-    payload = {
-        "session_id": req.session_id,
-        "query": req.message,
-        "mode": req.mode,
-        "request_id": request_id,
-    }
-
-    async with request.app.state.pending_lock:
-        request.app.state.pending_requests[request_id] = payload
-
     # ---- Logging (non-blocking) ----
     log = getattr(request.app.state, "log_service", None)
     if log:
@@ -70,13 +80,72 @@ async def message(req: ChatRequest, request: Request):
         await log.log_user_message(req.session_id, req.message)
         await log.log_request_started(request_id, req.session_id, req.message, req.mode)
 
+    return request_id
+
+
+def _answer_stream(request: Request, session_id: str, request_id: str, query: str, mode: str) -> StreamingResponse:
+    # Get pipeline and logger from startup
+    rag = request.app.state.rag_pipeline
+    log = getattr(request.app.state, "log_service", None)
+
+    async def event_generator():
+        # stream_rag_sse yields properly formatted SSE bytes
+        async for chunk in stream_rag_sse(
+            rag=rag,
+            query=query,
+            mode=mode,
+            request=request,
+            log_service=log,
+            session_id=session_id,
+            request_id=request_id,
+        ):
+            yield chunk
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    """
+    Accept a message and stream its answer in the same response, with the
+    events of /api/stream. For server-to-server callers; the browser UI,
+    which cannot POST with EventSource, uses /api/message + /api/stream.
+    """
+    request_id = await _accept(req, request)
+    return _answer_stream(request, req.session_id, request_id, req.message, req.mode)
+
+
+@router.post("/message", response_model=ChatAccepted)
+async def message(req: ChatRequest, request: Request):
+    """
+    Accept a user message and return a request_id.
+    The actual answer is streamed from /api/stream using SSE, which must
+    be opened within PENDING_TTL_SECONDS.
+    """
+    _ensure_state(request.app)
+    request_id = await _accept(req, request)
+
+    payload = {
+        "session_id": req.session_id,
+        "query": req.message,
+        "mode": req.mode,
+        "request_id": request_id,
+        "created_at": time.monotonic(),
+    }
+
+    async with request.app.state.pending_lock:
+        pending = request.app.state.pending_requests
+        _prune_pending(pending, payload["created_at"])
+        pending[request_id] = payload
+
     return ChatAccepted(session_id=req.session_id, request_id=request_id)
 
 
 @router.get("/stream")
 async def stream(session_id: str, request_id: str, request: Request):
     """
-    SSE endpoint. Streams token-by-token-ish events:
+    SSE endpoint. Streams the answer as the LLM generates it:
+      event: sources data: {"mode_used":"...","cache":null,"sources":[{"source","chunk_id","strategy","score"}]}
       event: token  data: {"text":"..."}
       event: done   data: {"ok":true}
       event: error  data: {"message":"..."}
@@ -87,36 +156,10 @@ async def stream(session_id: str, request_id: str, request: Request):
     async with request.app.state.pending_lock:
         payload = request.app.state.pending_requests.pop(request_id, None)
 
-    if not payload:
+    if not payload or time.monotonic() - payload["created_at"] >= PENDING_TTL_SECONDS:
         raise HTTPException(status_code=404, detail="Unknown or expired request_id")
 
     if payload["session_id"] != session_id:
         raise HTTPException(status_code=403, detail="session_id mismatch")
 
-    # Get pipeline and logger from startup
-    rag = request.app.state.rag_pipeline
-    log = getattr(request.app.state, "log_service", None)
-
-    async def event_generator():
-        # stream_rag_sse yields properly formatted SSE bytes
-        async for chunk in stream_rag_sse(
-            rag=rag,
-            query=payload["query"],
-            mode=payload["mode"],
-            request=request,
-            log_service=log,
-            session_id=session_id,
-            request_id=request_id,
-        ):
-            yield chunk
-
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache, no-store, must-revalidate, no-transform",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",  # Disable nginx buffering
-            "Content-Type": "text/event-stream; charset=utf-8",
-        },
-    )
+    return _answer_stream(request, session_id, request_id, payload["query"], payload["mode"])
@@ -2,9 +2,10 @@ from __future__ import annotations
 
 import asyncio
 import json
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, Callable, Iterator, Optional
 
 from fastapi import Request
 
@@ -17,18 +18,64 @@ def _sse(event: str, data: dict) -> bytes:
     return payload.encode("utf-8")
 
 
-def _chunk_text_words(text: str, words_per_chunk: int = 1):
-    if not text:
-        return
-    words = text.split(" ")
-    buf = []
-    for w in words:
-        buf.append(w)
-        if len(buf) >= words_per_chunk:
-            yield " ".join(buf) + " "
-            buf = []
-    if buf:
-        yield " ".join(buf) + " "
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+async def _iterate_in_thread(make_iter: Callable[[], Iterator], stop: threading.Event) -> AsyncGenerator:
+    """
+    Drive a blocking iterator on the RAG thread pool and yield its items on
+    the event loop as they arrive. Setting `stop` (or closing this generator)
+    makes the thread close the iterator after its current item.
+    """
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+
+    def run():
+        try:
+            it = make_iter()
+            try:
+                for item in it:
+                    loop.call_soon_threadsafe(items.put_nowait, item)
+                    if stop.is_set():
+                        break
+            finally:
+                close = getattr(it, "close", None)
+                if close:
+                    close()
+        except BaseException as e:
+            loop.call_soon_threadsafe(items.put_nowait, _Failed(e))
+        finally:
+            loop.call_soon_threadsafe(items.put_nowait, _DONE)
+
+    loop.run_in_executor(_executor, run)
+    try:
+        while True:
+            item = await items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+
+
+def _source_meta(retrieved: list) -> list:
+    """Citation metadata of the retrieved chunks (without their text)."""
+    return [
+        {
+            "source": r.get("source"),
+            "chunk_id": r.get("chunk_id"),
+            "strategy": r.get("strategy"),
+            "score": r.get("fused_score"),
+        }
+        for r in retrieved
+    ]
 
 
 async def stream_rag_sse(
@@ -39,25 +86,40 @@ async def stream_rag_sse(
     log_service: Optional[object] = None,
     session_id: Optional[str] = None,
     request_id: Optional[str] = None,
-    delay_s: float = 0.07,
 ) -> AsyncGenerator[bytes, None]:
+    """
+    Stream one answer as SSE: a `sources` event once retrieval is done, a
+    `token` event per chunk the LLM produces, then `done` (or `error`).
+    """
     t0 = time.perf_counter()
-    answer_text = ""
+    answer_parts = []
     mode_used = mode
+    stop = threading.Event()
 
     try:
         if await request.is_disconnected():
             return
 
-        # Run blocking RAG in thread pool to avoid blocking the event loop
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            _executor,
-            lambda: rag.answer(query=query, mode=mode)
-        )
-        answer_text = result.answer or ""
-        mode_used = getattr(result, "mode_used", mode)
-
+        # The blocking pipeline runs in the thread pool; events come back as they happen.
+        events = _iterate_in_thread(lambda: rag.answer_stream(query=query, mode=mode), stop)
+        try:
+            async for event, data in events:
+                if await request.is_disconnected():
+                    return
+                if event == "sources":
+                    mode_used = getattr(data, "mode_used", mode)
+                    yield _sse("sources", {
+                        "mode_used": mode_used,
+                        "cache": getattr(data, "cache", None),
+                        "sources": _source_meta(data.retrieved),
+                    })
+                else:
+                    answer_parts.append(data)
+                    yield _sse("token", {"text": data})
+        finally:
+            await events.aclose()
+
+        answer_text = "".join(answer_parts)
         latency_ms = int((time.perf_counter() - t0) * 1000)
 
         # Log assistant message + request completed (non-blocking)
@@ -65,13 +127,6 @@ async def stream_rag_sse(
             await log_service.log_assistant_message(session_id, answer_text)
             await log_service.log_request_completed(request_id, mode_used, latency_ms)
 
-        # Stream word-by-word
-        for piece in _chunk_text_words(answer_text, words_per_chunk=1):
-            if await request.is_disconnected():
-                return
-            yield _sse("token", {"text": piece})
-            await asyncio.sleep(delay_s)
-
         yield _sse("done", {"ok": True, "mode_used": mode_used})
 
     except Exception as e:
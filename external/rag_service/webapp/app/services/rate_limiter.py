@@ -1,10 +1,14 @@
 from __future__ import annotations
 
-import time
 import asyncio
-from collections import deque
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Deque, Dict, Tuple
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 
 @dataclass(frozen=True)
@@ -13,40 +17,270 @@ class RateLimitRule:
     window_seconds: int
 
 
+class _Counter:
+    """Request counts of the current and the previous fixed window of one key."""
+    __slots__ = ("window", "previous", "current")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.previous = 0
+        self.current = 0
+
+
+class _KeyedCounters:
+    """
+    Sliding-window counters for one rule, one small fixed-size record per key.
+
+    The sliding count is estimated from two fixed windows: the previous
+    window's count weighted by how much of it still overlaps the sliding
+    window, plus the current one's. Keys live in lock-sharded LRU maps of
+    at most max_keys in total; a key whose windows have both ended is
+    expired by sweep(), and past the cap the least recently seen key of
+    the shard is evicted (its client starts from a clean count).
+    """
+
+    def __init__(self, rule: RateLimitRule, max_keys: int, shards: int):
+        self.rule = rule
+        self._shard_cap = max(1, max_keys // shards)
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self.counters = {"allowed": 0, "denied": 0, "expired": 0, "evicted": 0}
+
+    def hit(self, key: str, now: float) -> bool:
+        """Count one request for key; False (and not counted) if over the limit."""
+        window = self.rule.window_seconds
+        index = int(now // window)
+        shard = hash(key) % len(self._shards)
+        entries = self._shards[shard]
+        with self._locks[shard]:
+            c = entries.get(key)
+            if c is None:
+                if len(entries) >= self._shard_cap:
+                    self._expire(entries, index)
+                    while len(entries) >= self._shard_cap:
+                        entries.popitem(last=False)
+                        self.counters["evicted"] += 1
+                c = entries[key] = _Counter(index)
+            else:
+                entries.move_to_end(key)
+                if c.window != index:
+                    c.previous = c.current if c.window == index - 1 else 0
+                    c.current = 0
+                    c.window = index
+
+            overlap = 1.0 - (now - index * window) / window
+            if c.previous * overlap + c.current >= self.rule.max_requests:
+                self.counters["denied"] += 1
+                return False
+            c.current += 1
+            self.counters["allowed"] += 1
+            return True
+
+    def sweep(self, now: float) -> int:
+        """Drop every key whose windows have both ended; returns how many."""
+        index = int(now // self.rule.window_seconds)
+        dropped = 0
+        for entries, lock in zip(self._shards, self._locks):
+            with lock:
+                dropped += self._expire(entries, index)
+        return dropped
+
+    def _expire(self, entries: OrderedDict, index: int) -> int:
+        # Entries are in last-hit order, so the expired ones are all in front.
+        dropped = 0
+        while entries:
+            key, c = next(iter(entries.items()))
+            if c.window >= index - 1:
+                break
+            del entries[key]
+            dropped += 1
+        self.counters["expired"] += dropped
+        return dropped
+
+    def __len__(self) -> int:
+        return sum(len(e) for e in self._shards)
+
+
+class MemoryBackend:
+    """
+    Counters in this process only (the default): each worker enforces the
+    limits on its own, so N workers let through up to N times the limit.
+    """
+
+    def __init__(self, max_keys: int = 50_000, shards: int = 16):
+        self.max_keys = max_keys
+        self.shards = shards
+        self._scopes: Dict[str, _KeyedCounters] = {}
+
+    async def hit(self, scope: str, key: str, rule: RateLimitRule, now: float) -> bool:
+        counters = self._scopes.get(scope)
+        if counters is None:
+            counters = self._scopes[scope] = _KeyedCounters(rule, self.max_keys, self.shards)
+        return counters.hit(key, now)
+
+    async def sweep(self, now: float) -> int:
+        return sum(c.sweep(now) for c in self._scopes.values())
+
+    async def stats(self) -> Dict:
+        return {scope: {"keys": len(c), **c.counters} for scope, c in self._scopes.items()}
+
+    async def close(self) -> None:
+        pass
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit (
+  scope TEXT NOT NULL,          -- session | ip
+  key TEXT NOT NULL,
+  tokens REAL NOT NULL,         -- tokens left after the last allowed request
+  updated_at REAL NOT NULL,     -- unix time of the last allowed request
+  full_at REAL NOT NULL,        -- when the bucket is full again (row can go)
+  PRIMARY KEY (scope, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rate_limit_full_at ON rate_limit(full_at);
+"""
+
+# Refill the bucket for the time since its last request and take one token,
+# in one statement so concurrent processes cannot both spend the last one.
+# No row comes back when the bucket is empty; it is then left untouched.
+_TAKE_TOKEN_SQL = """
+INSERT INTO rate_limit (scope, key, tokens, updated_at, full_at)
+VALUES (:scope, :key, :cap - 1, :now, :now + 1 / :rate)
+ON CONFLICT (scope, key) DO UPDATE SET
+  tokens = MIN(:cap, tokens + MAX(0, :now - updated_at) * :rate) - 1,
+  updated_at = :now,
+  full_at = :now + (:cap + 1 - MIN(:cap, tokens + MAX(0, :now - updated_at) * :rate)) / :rate
+WHERE MIN(:cap, tokens + MAX(0, :now - updated_at) * :rate) >= 1
+RETURNING tokens
+"""
+
+
+class SQLiteBackend:
+    """
+    Token buckets in a SQLite table (WAL mode) shared by every worker
+    process on the host, so the limits hold for the service as a whole.
+
+    A bucket holds max_requests tokens and refills at max_requests per
+    window_seconds. Rows of full buckets carry no state and are deleted
+    by sweep(). Queries run on one background thread per process, so a
+    busy database never blocks the event loop.
+    """
+
+    def __init__(self, db_path: Path, busy_timeout_s: float = 5.0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit-db")
+        # Autocommit: the upsert is its own transaction.
+        self._db = sqlite3.connect(str(self.db_path), timeout=busy_timeout_s,
+                                   isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL;")
+        self._db.execute("PRAGMA synchronous=NORMAL;")
+        self._db.executescript(SQLITE_SCHEMA)
+        self.counters = {"allowed": 0, "denied": 0, "expired": 0}
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def hit(self, scope: str, key: str, rule: RateLimitRule, now: float) -> bool:
+        return await self._run(self._take_token, scope, key, rule, now)
+
+    def _take_token(self, scope: str, key: str, rule: RateLimitRule, now: float) -> bool:
+        params = {"scope": scope, "key": key, "cap": float(rule.max_requests),
+                  "rate": rule.max_requests / rule.window_seconds, "now": now}
+        allowed = self._db.execute(_TAKE_TOKEN_SQL, params).fetchone() is not None
+        self.counters["allowed" if allowed else "denied"] += 1
+        return allowed
+
+    async def sweep(self, now: float) -> int:
+        return await self._run(self._sweep, now)
+
+    def _sweep(self, now: float) -> int:
+        dropped = self._db.execute("DELETE FROM rate_limit WHERE full_at <= ?", (now,)).rowcount
+        self.counters["expired"] += dropped
+        return dropped
+
+    async def stats(self) -> Dict:
+        rows = await self._run(
+            lambda: self._db.execute("SELECT scope, COUNT(*) FROM rate_limit GROUP BY scope").fetchall()
+        )
+        # allow/deny counters are this process's; keys are shared by all workers.
+        return {"keys": dict(rows), **self.counters}
+
+    async def close(self) -> None:
+        await self._run(self._db.close)
+        self._executor.shutdown()
+
+
 class RateLimiter:
     """
-    In-memory sliding-window rate limiter.
-    Good for single-node dev/prod. For multi-node, replace with Redis.
+    Rate limiter per session and per IP: at most max_requests per
+    window_seconds for each.
+
+    The backend holds the counters, and the two enforce the rule differently:
+
+      MemoryBackend (default)  sliding window, per process: at most
+                               max_requests in any window_seconds span
+                               (estimated from two fixed windows).
+      SQLiteBackend            token bucket, shared by the worker processes
+                               through a local SQLite file: a burst of up to
+                               max_requests, then one request every
+                               window_seconds / max_requests as tokens refill.
+                               Over a full window a steady client can thus get
+                               up to twice max_requests through.
+
+    For multi-node, replace with Redis.
+
+    start() runs a background sweeper that drops keys whose windows have
+    ended, so memory follows recent traffic rather than every client ever
+    seen. stats() reports key counts and allow/deny counters.
     """
-    def __init__(self, per_session: RateLimitRule, per_ip: RateLimitRule):
+    def __init__(self, per_session: RateLimitRule, per_ip: RateLimitRule,
+                 backend=None, sweep_interval_seconds: float = 60.0):
         self.per_session = per_session
         self.per_ip = per_ip
-        self._session_hits: Dict[str, Deque[float]] = {}
-        self._ip_hits: Dict[str, Deque[float]] = {}
-        self._lock = asyncio.Lock()
-
-    def _allow(self, dq: Deque[float], rule: RateLimitRule, now: float) -> bool:
-        cutoff = now - rule.window_seconds
-        while dq and dq[0] < cutoff:
-            dq.popleft()
-        if len(dq) >= rule.max_requests:
-            return False
-        dq.append(now)
-        return True
+        self.backend = backend or MemoryBackend()
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._task: Optional[asyncio.Task] = None
 
     async def check(self, session_id: str, ip: str | None) -> Tuple[bool, str]:
         """
         Returns (allowed, reason_if_denied).
         """
         now = time.time()
-        async with self._lock:
-            sdq = self._session_hits.setdefault(session_id, deque())
-            if not self._allow(sdq, self.per_session, now):
-                return False, f"Rate limit exceeded for session: {self.per_session.max_requests}/{self.per_session.window_seconds}s"
+        if not await self.backend.hit("session", session_id, self.per_session, now):
+            return False, f"Rate limit exceeded for session: {self.per_session.max_requests}/{self.per_session.window_seconds}s"
 
-            if ip:
-                idq = self._ip_hits.setdefault(ip, deque())
-                if not self._allow(idq, self.per_ip, now):
-                    return False, f"Rate limit exceeded for IP: {self.per_ip.max_requests}/{self.per_ip.window_seconds}s"
+        if ip and not await self.backend.hit("ip", ip, self.per_ip, now):
+            return False, f"Rate limit exceeded for IP: {self.per_ip.max_requests}/{self.per_ip.window_seconds}s"
 
         return True, ""
+
+    async def sweep(self, now: float | None = None) -> int:
+        return await self.backend.sweep(time.time() if now is None else now)
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._sweeper(), name="rate-limit-sweeper")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.backend.close()
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            try:
+                await self.sweep()
+            except Exception:
+                # e.g. the shared database stayed locked; try again next round.
+                pass
+
+    async def stats(self) -> Dict:
+        return {"backend": type(self.backend).__name__, **await self.backend.stats()}
@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for the AutiBloom web container (see entrypoint.sh).
+
+Workers are threaded: a streamed chatbot answer (chatbot.views.chat_ask)
+holds one thread for the length of the generation, not a whole worker, so
+chat concurrency is workers * threads and the rest of the site stays up.
+"""
+import os
+
+bind = "0.0.0.0:8000"
+workers = 3
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+timeout = 120
+
+
+def post_fork(server, worker):
+    """Load the ML model in each worker before it accepts requests."""
+    from ml.inference import preload
+
+    version = preload()
+    if version:
+        server.log.info("Worker %s preloaded ML model %s", worker.pid, version)
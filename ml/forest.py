@@ -0,0 +1,221 @@
+"""
+ml/forest.py
+============
+NumPy-only evaluator for the screening pipeline (ColumnTransformer + tree
+ensemble).
+
+For a single row, most of sklearn's predict_proba time goes to input
+validation, DataFrame handling, and dispatching 200 per-tree calls. Here
+the fitted pipeline is compiled once, at model load, into:
+
+  * a preprocessor that maps payload dicts straight to the transformed
+    feature matrix (OrdinalEncoder lookups + passthrough columns), and
+  * one set of contiguous node arrays for the whole forest
+    (feature, threshold, left, right, value), evaluated for every row and
+    every tree at once, one tree level per step.
+
+Only the pieces the AutiBloom pipeline uses are supported. Anything else
+raises UnsupportedPipelineError and ml.inference keeps using sklearn.
+"""
+
+import numpy as np
+
+_TREE_LEAF = -1
+
+
+class UnsupportedPipelineError(Exception):
+    """Raised when a fitted pipeline uses a step the compiler cannot flatten."""
+    pass
+
+
+class CompiledPreprocessor:
+    """Flattened ColumnTransformer: payload dicts → transformed matrix."""
+
+    def __init__(self, blocks: list, n_features: int):
+        # blocks: list of (columns, mappings, unknown_value); mappings is
+        # None for passthrough columns, else one {category: code} per column.
+        self.blocks     = blocks
+        self.n_features = n_features
+
+    @classmethod
+    def from_column_transformer(cls, prep):
+        from sklearn.preprocessing import FunctionTransformer, OrdinalEncoder  # noqa: PLC0415
+
+        if getattr(prep, 'sparse_output_', False):
+            raise UnsupportedPipelineError("sparse ColumnTransformer output")
+
+        blocks = []
+        n_features = 0
+        for name, transformer, columns in prep.transformers_:
+            if transformer == 'drop' or len(columns) == 0:
+                continue
+            columns = list(columns)
+            if not all(isinstance(c, str) for c in columns):
+                raise UnsupportedPipelineError(f"{name}: columns must be selected by name")
+
+            if transformer == 'passthrough' or (
+                isinstance(transformer, FunctionTransformer) and transformer.func is None
+            ):
+                blocks.append((columns, None, None))
+            elif isinstance(transformer, OrdinalEncoder):
+                if transformer.handle_unknown == 'use_encoded_value':
+                    unknown_value = transformer.unknown_value
+                else:
+                    unknown_value = None  # unknown category → error, like sklearn
+                mappings = [
+                    {category: code for code, category in enumerate(categories)}
+                    for categories in transformer.categories_
+                ]
+                blocks.append((columns, mappings, unknown_value))
+            else:
+                raise UnsupportedPipelineError(f"{name}: {type(transformer).__name__} is not supported")
+            n_features += len(columns)
+
+        return cls(blocks, n_features)
+
+    def transform(self, payloads: list) -> np.ndarray:
+        """
+        Encode payload dicts into a float64 matrix in transformed column order.
+
+        Raises KeyError / TypeError / ValueError for missing fields, missing
+        or unknown categories without an encoded fallback, or non-numeric
+        passthrough values.
+        """
+        X = np.empty((len(payloads), self.n_features), dtype=np.float64)
+        col = 0
+        for columns, mappings, unknown_value in self.blocks:
+            if mappings is None:
+                for name in columns:
+                    X[:, col] = [payload[name] for payload in payloads]
+                    col += 1
+                continue
+            for name, mapping in zip(columns, mappings):
+                codes = []
+                for payload in payloads:
+                    value = payload[name]
+                    if value is None or value != value:
+                        # sklearn encodes missing values separately; let it handle them.
+                        raise ValueError(f"Missing value for {name}")
+                    code = mapping.get(value, unknown_value)
+                    if code is None:
+                        raise ValueError(f"Unknown category {value!r} for {name}")
+                    codes.append(code)
+                X[:, col] = codes
+                col += 1
+        return X
+
+
+class CompiledForest:
+    """All trees of a fitted forest classifier flattened into shared arrays."""
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes, cover=None):
+        self.feature   = feature      # int32  (n_nodes,)  split feature; 0 at leaves
+        self.threshold = threshold    # float64(n_nodes,)  go left if x <= threshold
+        self.left      = left         # int32  (n_nodes,)  absolute index; self at leaves
+        self.right     = right        # int32  (n_nodes,)
+        self.value     = value        # float64(n_nodes, n_classes) leaf class probabilities
+        self.cover     = cover        # float64(n_nodes,)  weighted training samples (TreeSHAP)
+        self.roots     = roots        # int32  (n_trees,)  root node of each tree
+        self.max_depth = max_depth
+        self.classes   = classes
+        # [right, left] per node so one gather picks the branch from go_left.
+        self._children = np.ascontiguousarray(np.stack([right, left], axis=1))
+
+    @classmethod
+    def from_estimator(cls, clf):
+        estimators = getattr(clf, 'estimators_', None)
+        if not estimators or not all(hasattr(est, 'tree_') for est in estimators):
+            raise UnsupportedPipelineError(f"{type(clf).__name__} is not a fitted tree ensemble")
+        if getattr(clf, 'n_outputs_', 1) != 1:
+            raise UnsupportedPipelineError("multi-output forests are not supported")
+
+        features, thresholds, lefts, rights, values, covers, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for est in estimators:
+            tree = est.tree_
+            n = tree.node_count
+            idx = np.arange(n, dtype=np.int64)
+            is_leaf = tree.children_left == _TREE_LEAF
+
+            # Leaves point at themselves so every row can take the same
+            # number of steps regardless of which tree or branch it is in.
+            lefts.append(np.where(is_leaf, idx, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, idx, tree.children_right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+
+            # Per-tree class probabilities at each node, as
+            # DecisionTreeClassifier.predict_proba normalises them.
+            counts = tree.value[:, 0, :]
+            totals = counts.sum(axis=1, keepdims=True)
+            totals[totals == 0.0] = 1.0
+            values.append(counts / totals)
+            covers.append(tree.weighted_n_node_samples)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        return cls(
+            feature   = np.ascontiguousarray(np.concatenate(features), dtype=np.int32),
+            threshold = np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left      = np.ascontiguousarray(np.concatenate(lefts), dtype=np.int32),
+            right     = np.ascontiguousarray(np.concatenate(rights), dtype=np.int32),
+            value     = np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots     = np.asarray(roots, dtype=np.int32),
+            max_depth = max_depth,
+            classes   = np.asarray(clf.classes_),
+            cover     = np.ascontiguousarray(np.concatenate(covers), dtype=np.float64),
+        )
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node index reached by every row in every tree, shape (n_rows, n_trees)."""
+        # sklearn evaluates splits on float32 inputs; match it bit for bit.
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_base = (np.arange(n_rows) * n_features)[:, None]
+
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            go_left = flat_X[row_base + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = self._children[nodes, go_left.view(np.int8)]
+        return nodes
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Mean of per-tree class probabilities, shape (n_rows, n_classes)."""
+        return self.value[self.apply(X)].sum(axis=1) / self.n_trees
+
+
+class CompiledPipeline:
+    """Compiled 'prep' + forest pair used by ml.inference in place of sklearn."""
+
+    def __init__(self, preprocessor: CompiledPreprocessor, forest: CompiledForest):
+        self.preprocessor = preprocessor
+        self.forest       = forest
+
+    @classmethod
+    def compile(cls, pipeline):
+        """
+        Flatten a fitted Pipeline(prep=ColumnTransformer, clf=forest).
+
+        Raises UnsupportedPipelineError if any step cannot be compiled.
+        """
+        named_steps = getattr(pipeline, 'named_steps', None)
+        if not named_steps or 'prep' not in named_steps or len(pipeline.steps) != 2:
+            raise UnsupportedPipelineError("expected a two-step Pipeline with a 'prep' step")
+        return cls(
+            CompiledPreprocessor.from_column_transformer(named_steps['prep']),
+            CompiledForest.from_estimator(pipeline[-1]),
+        )
+
+    def transform(self, payloads: list) -> np.ndarray:
+        return self.preprocessor.transform(payloads)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.forest.predict_proba(X)
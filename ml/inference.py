@@ -3,12 +3,31 @@ ml/inference.py
 ===============
 Lazy-loading inference engine for the AutiBloom ASD screening model.
 
+Artefacts come from the active version in the model registry
+(ml/registry.py) or, when none is registered, from the flat
+ml/artefacts/ layout. Workers preload them at boot (gunicorn post_fork)
+and hot-swap when a new version is activated:
+
+    python manage.py model_registry register rf-v1.1 --model ... --activate
+
+SHAP values come from the in-repo TreeSHAP (ml/treeshap.py) over the
+compiled forest; the pickled shap explainer is only unpickled for
+pipelines the compiler does not support.
+
+When a precomputed lookup table (see ml/lookup_table.py) matching the
+deployed artefacts is present, run_inference() answers from it in O(1)
+instead of calling predict_proba + TreeSHAP. Build it with:
+
+    python manage.py build_inference_lookup
+
 Usage:
-    from ml.inference import run_inference, ModelNotReadyError
+    from ml.inference import run_inference, run_inference_batch, ModelNotReadyError
 
     try:
         result = run_inference(payload)
         # result = {label, score, shap_values, model_version}
+        results = run_inference_batch(payloads)
+        # one result dict per payload, same order
     except ModelNotReadyError:
         # model artefacts not yet deployed — fall back to stub
         pass
@@ -17,9 +36,13 @@ Usage:
 import json
 import os
 import logging
+import threading
+import time
 import numpy as np
 import pandas as pd
 
+from ml import forest, lookup_table, registry, treeshap
+
 logger = logging.getLogger(__name__)
 
 # ── Artefact paths ────────────────────────────────────────────────────────────
@@ -32,10 +55,14 @@ MODEL_PATH      = os.path.join(ARTEFACTS_DIR, 'model.pkl')
 EXPLAINER_PATH  = os.path.join(ARTEFACTS_DIR, 'shap_explainer.pkl')
 SCHEMA_PATH     = os.path.join(FEATURE_SCHEMA_DIR, 'feature_schema.json')
 
-# ── Module-level singletons (lazy-loaded once) ────────────────────────────────
-_pipeline   = None
-_explainer  = None
-_schema     = None
+# How often (seconds) a worker checks the registry's ACTIVE pointer for a
+# new version. Set ML_MODEL_VERSION to pin a worker to one version (canary).
+RELOAD_CHECK_SECONDS = float(os.environ.get('ML_RELOAD_CHECK_SECONDS', '5'))
+
+# ── Module-level singleton (lazy-loaded, hot-swapped) ─────────────────────────
+_active      = None            # _LoadedModel currently serving requests
+_last_check  = 0.0
+_swap_lock   = threading.Lock()
 
 
 class ModelNotReadyError(Exception):
@@ -43,22 +70,81 @@ class ModelNotReadyError(Exception):
     pass
 
 
+class _LoadedModel:
+    """
+    Everything one model version needs to answer a request.
+
+    Requests grab a reference once and use it throughout, so a hot-swap
+    only replaces the module-level pointer and never changes a model out
+    from under an in-flight request.
+    """
+
+    def __init__(self, version, pipeline, explainer, schema, fingerprint, lookup_dir, source_key):
+        self.version     = version
+        self.pipeline    = pipeline
+        self.compiled    = None        # forest.CompiledPipeline, if supported
+        self.explainer   = explainer   # treeshap.TreeShap or a pickled shap explainer
+        self.schema      = schema
+        self.fingerprint = fingerprint
+        self.lookup_dir  = lookup_dir
+        self.source_key  = source_key
+        self.lookup      = None
+
+
 # ── Loader helpers ────────────────────────────────────────────────────────────
 
-def _load_artefacts():
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _resolve_source() -> dict:
     """
-    Load pipeline, SHAP explainer, and feature schema into module-level
-    singletons. Called once on first inference request.
+    Work out which artefacts this worker should serve.
 
-    Raises ModelNotReadyError if any required artefact is missing.
+    Uses the registry's ACTIVE version (or ML_MODEL_VERSION if set), and
+    falls back to the flat ml/artefacts/ layout when no registry exists.
+    The returned 'key' changes whenever the selected artefacts change.
     """
-    global _pipeline, _explainer, _schema
+    version = os.environ.get('ML_MODEL_VERSION') or registry.active_version()
+    if version:
+        base = registry.version_dir(version)
+        return {
+            'version':        version,
+            'registry':       True,
+            'model_path':     os.path.join(base, registry.MODEL_FILE),
+            'explainer_path': os.path.join(base, registry.EXPLAINER_FILE),
+            'schema_path':    os.path.join(base, registry.SCHEMA_FILE),
+            'lookup_dir':     os.path.join(base, registry.LOOKUP_SUBDIR),
+            'key':            (version, registry.manifest_mtime(version)),
+        }
+
+    return {
+        'version':        None,                    # taken from the schema
+        'registry':       False,
+        'model_path':     MODEL_PATH,
+        'explainer_path': EXPLAINER_PATH,
+        'schema_path':    SCHEMA_PATH,
+        'lookup_dir':     lookup_table.LOOKUP_DIR,
+        'key':            ('legacy', _mtime(MODEL_PATH), _mtime(EXPLAINER_PATH), _mtime(SCHEMA_PATH)),
+    }
+
 
-    if _pipeline is not None:
-        return  # already loaded
+def _load_model(source: dict) -> _LoadedModel:
+    """
+    Load pipeline, SHAP explainer, feature schema and lookup table for one
+    source. Registry versions are checksum-verified against their manifest.
+
+    Raises ModelNotReadyError if any required artefact is missing or corrupt.
+    """
+    model_path, explainer_path, schema_path = (
+        source['model_path'], source['explainer_path'], source['schema_path']
+    )
 
     # Check files exist before importing joblib (avoid import error at startup)
-    missing = [p for p in (MODEL_PATH, SCHEMA_PATH) if not os.path.exists(p)]
+    missing = [p for p in (model_path, schema_path) if not os.path.exists(p)]
     if missing:
         raise ModelNotReadyError(
             f"Model artefacts not found: {missing}. "
@@ -66,31 +152,156 @@ def _load_artefacts():
         )
 
     try:
+        if source['registry']:
+            manifest = registry.verify(source['version'])
+            checksums = manifest['files']
+        else:
+            checksums = {
+                registry.MODEL_FILE:     registry.file_checksum(model_path),
+                registry.EXPLAINER_FILE: registry.file_checksum(explainer_path),
+            }
+
         import joblib  # noqa: PLC0415
 
-        logger.info("Loading ML model from %s", MODEL_PATH)
-        _pipeline = joblib.load(MODEL_PATH)
+        logger.info("Loading ML model from %s", model_path)
+        pipeline = joblib.load(model_path)
 
-        logger.info("Loading feature schema from %s", SCHEMA_PATH)
-        with open(SCHEMA_PATH, 'r') as f:
-            _schema = json.load(f)
+        logger.info("Loading feature schema from %s", schema_path)
+        with open(schema_path, 'r') as f:
+            schema = json.load(f)
 
-        # SHAP explainer is optional — gracefully skip if missing
-        if os.path.exists(EXPLAINER_PATH):
-            logger.info("Loading SHAP explainer from %s", EXPLAINER_PATH)
-            _explainer = joblib.load(EXPLAINER_PATH)
-        else:
-            logger.warning(
-                "SHAP explainer not found at %s. "
-                "SHAP feature importances will not be available.", EXPLAINER_PATH
-            )
+    except Exception as exc:
+        raise ModelNotReadyError(f"Failed to load ML artefacts: {exc}") from exc
 
+    # SHAP is optional — the explainer artefact being deployed turns it on.
+    has_explainer = os.path.exists(explainer_path)
+    if not has_explainer:
+        logger.warning(
+            "SHAP explainer not found at %s. "
+            "SHAP feature importances will not be available.", explainer_path
+        )
+
+    model = _LoadedModel(
+        version     = source['version'] or schema.get('version', 'rf-v1.0'),
+        pipeline    = pipeline,
+        explainer   = None,
+        schema      = schema,
+        fingerprint = {
+            'model_sha256':     checksums.get(registry.MODEL_FILE),
+            'explainer_sha256': checksums.get(registry.EXPLAINER_FILE) if has_explainer else None,
+            'schema_version':   schema.get('version'),
+        },
+        lookup_dir  = source['lookup_dir'],
+        source_key  = source['key'],
+    )
+
+    # Native evaluator is optional — unsupported pipelines use sklearn.
+    try:
+        model.compiled = forest.CompiledPipeline.compile(pipeline)
+        logger.info("Compiled %d-tree forest for native evaluation", model.compiled.forest.n_trees)
+    except forest.UnsupportedPipelineError as exc:
+        logger.info("Native forest evaluator unavailable, using sklearn: %s", exc)
+
+    if has_explainer:
+        model.explainer = _load_explainer(model, explainer_path)
+
+    # Precomputed table is optional — a missing or stale one just means
+    # every request takes the full model path.
+    model.lookup = lookup_table.LookupTable.open(model.lookup_dir, expected=model.fingerprint)
+    if model.lookup is not None:
+        logger.info("Loaded inference lookup table (%d rows)", model.lookup.proba.shape[0])
+
+    return model
+
+
+def _load_explainer(model: _LoadedModel, explainer_path: str):
+    """
+    Return the SHAP explainer for a loaded model: in-repo TreeSHAP over the
+    compiled forest when possible, else the pickled shap explainer (which
+    imports shap and numba, so it is avoided on the normal path).
+
+    Raises ModelNotReadyError if the pickled explainer cannot be loaded.
+    """
+    if model.compiled is not None:
+        try:
+            explainer = treeshap.TreeShap(model.compiled.forest)
+            logger.info("Built in-repo TreeSHAP explainer")
+            return explainer
+        except ValueError as exc:
+            logger.info("In-repo TreeSHAP unavailable, using pickled explainer: %s", exc)
+
+    try:
+        import joblib  # noqa: PLC0415
+
+        logger.info("Loading SHAP explainer from %s", explainer_path)
+        return joblib.load(explainer_path)
     except Exception as exc:
-        # Reset singletons so the next call retries
-        _pipeline = _explainer = _schema = None
         raise ModelNotReadyError(f"Failed to load ML artefacts: {exc}") from exc
 
 
+def _get_model() -> _LoadedModel:
+    """
+    Return the model serving requests, loading it on first use and
+    hot-swapping to a newly activated version at most every
+    RELOAD_CHECK_SECONDS.
+
+    Only one thread checks/loads at a time; while it does, other threads
+    keep serving the current model. A new version that fails to load is
+    logged and ignored, so a bad deploy never takes the old one down.
+
+    Raises ModelNotReadyError if no model can be loaded at all.
+    """
+    global _active, _last_check
+
+    model = _active
+    if model is not None and time.monotonic() - _last_check < RELOAD_CHECK_SECONDS:
+        return model
+
+    # Block only when there is nothing to serve yet.
+    if not _swap_lock.acquire(blocking=model is None):
+        return model
+    try:
+        if _active is not None and time.monotonic() - _last_check < RELOAD_CHECK_SECONDS:
+            return _active  # another thread just checked
+        _last_check = time.monotonic()
+
+        try:
+            source = _resolve_source()
+            if _active is not None and source['key'] == _active.source_key:
+                return _active
+            new_model = _load_model(source)
+        except (ModelNotReadyError, registry.RegistryError, OSError) as exc:
+            if _active is None:
+                if isinstance(exc, ModelNotReadyError):
+                    raise
+                raise ModelNotReadyError(str(exc)) from exc
+            logger.error("Keeping model %s; could not load new artefacts: %s", _active.version, exc)
+            return _active
+
+        if _active is not None:
+            logger.info("Hot-swapped ML model %s -> %s", _active.version, new_model.version)
+        _active = new_model
+        return new_model
+    finally:
+        _swap_lock.release()
+
+
+def preload() -> str | None:
+    """
+    Load the model eagerly (called from gunicorn's post_fork hook) so the
+    first request after a worker boots does not pay the unpickle cost.
+
+    Returns the loaded version, or None if artefacts are not deployed.
+    """
+    try:
+        model = _get_model()
+    except ModelNotReadyError as exc:
+        logger.warning("ML model not preloaded: %s", exc)
+        return None
+    logger.info("Preloaded ML model %s", model.version)
+    return model.version
+
+
 # ── Public API ────────────────────────────────────────────────────────────────
 
 def run_inference(payload: dict) -> dict:
@@ -112,30 +323,92 @@ def run_inference(payload: dict) -> dict:
     Raises:
         ModelNotReadyError: if artefacts are not on disk.
     """
-    _load_artefacts()
+    return run_inference_batch([payload])[0]
+
+
+def run_inference_batch(payloads: list) -> list:
+    """
+    Run prediction + SHAP explanation for many payloads at once.
 
-    feature_order = _schema['features']           # order Django sends
-    label_map     = _schema.get('label_map', {"0": "Low Probability", "1": "High Probability"})
-    model_version = _schema.get('version', 'rf-v1.0')
+    Payloads covered by the lookup table are answered from it; the rest
+    are assembled into one column-oriented frame so the preprocessor,
+    predict_proba and the SHAP explainer each run once for all of them
+    instead of once per row.
 
-    # ── Build input DataFrame in the correct feature order ─────────────────
-    row = {f: payload[f] for f in feature_order}
-    df  = pd.DataFrame([row], columns=feature_order)
+    Args:
+        payloads: list of Feature 3 payload dicts (see run_inference).
+
+    Returns:
+        list of run_inference() result dicts, in the same order as payloads.
+
+    Raises:
+        ModelNotReadyError: if artefacts are not on disk.
+    """
+    model  = _get_model()                         # one version for the whole batch
+    schema = model.schema
+    lookup = model.lookup
+
+    feature_order = schema['features']            # order Django sends
+    label_map     = schema.get('label_map', {"0": "Low Probability", "1": "High Probability"})
+    model_version = model.version
+
+    results = [None] * len(payloads)
+    misses  = []
+
+    # ── Fast path: precomputed table ───────────────────────────────────────
+    for i, payload in enumerate(payloads):
+        hit = lookup.lookup(payload) if lookup is not None else None
+        if hit is None:
+            misses.append(i)
+            continue
+        proba, shap_row = hit
+        shap_values_dict = {}
+        if shap_row is not None:
+            shap_values_dict = _shap_row_to_dict(shap_row, lookup.feature_names)
+        results[i] = _format_result(proba, shap_values_dict, label_map, model_version)
+
+    if not misses:
+        return results
 
     # ── Predict ────────────────────────────────────────────────────────────
-    proba       = _pipeline.predict_proba(df)[0]   # [p_class0, p_class1]
-    label_idx   = int(np.argmax(proba))
-    score       = float(proba[1])                  # probability of ASD = 1
-    label       = label_map.get(str(label_idx), str(label_idx))
+    X_transformed, probas = _predict(model, [payloads[i] for i in misses], feature_order)
 
     # ── SHAP values ────────────────────────────────────────────────────────
-    shap_values_dict = {}
-    if _explainer is not None:
+    shap_dicts = [{} for _ in misses]
+    if model.explainer is not None:
         try:
-            shap_values_dict = _compute_shap(df, feature_order)
+            shap_dicts = _compute_shap(model, X_transformed, feature_order)
         except Exception as exc:
             logger.warning("SHAP computation failed (non-fatal): %s", exc)
 
+    for proba, shap_values_dict, i in zip(probas, shap_dicts, misses):
+        results[i] = _format_result(proba, shap_values_dict, label_map, model_version)
+
+    return results
+
+
+def get_model_version() -> str:
+    """
+    Return the version string of the deployed model, loading artefacts
+    if needed.
+
+    Raises:
+        ModelNotReadyError: if artefacts are not on disk.
+    """
+    return _get_model().version
+
+
+def has_lookup_table() -> bool:
+    """True if the serving model has a matching precomputed table loaded."""
+    return _get_model().lookup is not None
+
+
+def _format_result(proba, shap_values_dict: dict, label_map: dict, model_version: str) -> dict:
+    """Shape a probability row + SHAP dict into the run_inference() contract."""
+    label_idx = int(np.argmax(proba))
+    score     = float(proba[1])                    # probability of ASD = 1
+    label     = label_map.get(str(label_idx), str(label_idx))
+
     return {
         'label':         label,
         'score':         score,
@@ -144,57 +417,156 @@ def run_inference(payload: dict) -> dict:
     }
 
 
+def _predict(model: _LoadedModel, rows: list, feature_order: list):
+    """
+    Transform payload rows and predict class probabilities.
+
+    Uses the compiled NumPy evaluator when the pipeline supports it and
+    sklearn otherwise (or for rows the compiled encoder declines, e.g.
+    missing categories). Returns (X_transformed, probas).
+    """
+    if model.compiled is not None:
+        try:
+            X_transformed = model.compiled.transform(rows)
+            return X_transformed, model.compiled.predict_proba(X_transformed)
+        except (KeyError, TypeError, ValueError):
+            pass  # sklearn reproduces the same result or error
+
+    # Build one input frame, column by column, in feature order
+    df = pd.DataFrame(
+        {f: [row[f] for row in rows] for f in feature_order},
+        columns=feature_order,
+    )
+    X_transformed = model.pipeline.named_steps['prep'].transform(df)
+    return X_transformed, model.pipeline[-1].predict_proba(X_transformed)   # (n, n_classes)
+
+
 # ── Internal SHAP helper ──────────────────────────────────────────────────────
 
-def _compute_shap(df: pd.DataFrame, feature_order: list) -> dict:
+def _compute_shap(model: _LoadedModel, X_transformed, feature_order: list) -> list:
     """
-    Compute per-feature SHAP values for a single row.
+    Compute per-feature SHAP values for every row of an already
+    transformed input matrix.
 
     The SHAP explainer was trained on the *transformed* input (after the
-    ColumnTransformer), so we must transform the row first.
+    ColumnTransformer), so callers pass the output of the 'prep' step.
 
     The Colab notebook stores 'transformed_feature_order' in the schema,
     which is the column order AFTER ColumnTransformer (categoricals first,
     then numericals). We use that to map SHAP indices → feature names.
 
     Returns:
-        {feature_name: shap_float} — contribution of each feature to
-        the positive-class (ASD=1) prediction. Absolute value indicates
-        importance; sign indicates direction.
+        list of {feature_name: shap_float}, one per row — contribution of
+        each feature to the positive-class (ASD=1) prediction. Absolute
+        value indicates importance; sign indicates direction.
     """
-    # Transform the row through the preprocessor step only
-    prep         = _pipeline.named_steps['prep']
-    X_transformed = prep.transform(df)             # shape (1, n_features)
+    shap_rows = _shap_matrix(model.explainer, X_transformed)
+
+    # Map SHAP indices → feature names using transformed_feature_order
+    # Falls back to feature_order if key not present in schema
+    transformed_order = model.schema.get('transformed_feature_order', feature_order)
 
-    # Get SHAP values — handle both shap return shapes:
-    #   Old shap: list of arrays, one per class → raw_shap[1] is class-1 values
-    #   New shap: 3D array (n_samples, n_features, n_classes) → [:, :, 1]
-    raw_shap = _explainer.shap_values(X_transformed)
+    return [_shap_row_to_dict(row, transformed_order) for row in shap_rows]
+
+
+def _shap_matrix(explainer, X_transformed) -> np.ndarray:
+    """
+    Run the explainer and return class-1 SHAP values, shape (n_rows, n_features).
+
+    Handles every explainer return shape:
+      treeshap.TreeShap: 2D array of class-1 values already
+      Old shap: list of arrays, one per class → raw_shap[1] is class-1 values
+      New shap: 3D array (n_samples, n_features, n_classes) → [:, :, 1]
+    """
+    raw_shap = explainer.shap_values(X_transformed)
 
     if isinstance(raw_shap, list):
         # Old shap API: list[class0_array, class1_array]
-        shap_row = np.array(raw_shap[1])[0]        # class-1 values, first row
-    else:
-        # New shap API: ndarray of shape (n_samples, n_features, n_classes)
-        # or (n_samples, n_features) for binary
-        arr = np.array(raw_shap)
-        if arr.ndim == 3:
-            shap_row = arr[0, :, 1]                # class-1, first sample
-        else:
-            shap_row = arr[0]                      # binary output
+        return np.asarray(raw_shap[1])
+
+    # New shap API: ndarray of shape (n_samples, n_features, n_classes)
+    # or (n_samples, n_features) for binary
+    arr = np.asarray(raw_shap)
+    if arr.ndim == 3:
+        return arr[:, :, 1]
+    return arr
 
-    # Map SHAP indices → feature names using transformed_feature_order
-    # Falls back to feature_order if key not present in schema
-    transformed_order = _schema.get('transformed_feature_order', feature_order)
 
+def _shap_row_to_dict(shap_row, feature_names: list) -> dict:
+    """Map one row of SHAP values onto feature names."""
     shap_dict = {}
-    for i, feat_name in enumerate(transformed_order):
+    for i, feat_name in enumerate(feature_names):
         if i < len(shap_row):
             shap_dict[feat_name] = float(shap_row[i])
-
     return shap_dict
 
 
+# ── Lookup table build step ───────────────────────────────────────────────────
+
+def build_lookup_table(out_dir: str = None,
+                       age_min: int = lookup_table.AGE_MIN,
+                       age_max: int = lookup_table.AGE_MAX,
+                       batch_size: int = 8192) -> dict:
+    """
+    Evaluate predict_proba and SHAP over every valid payload and write the
+    result as a memory-mappable lookup table. By default the table is
+    written next to the serving model (its registry version directory, or
+    ml/artefacts/lookup/ for the flat layout) and picked up immediately.
+
+    The full 1–18 age range is ~147k rows; TreeSHAP dominates the build
+    (two to three minutes on one core). Returns the table's meta dict.
+
+    Raises:
+        ModelNotReadyError: if artefacts are not on disk.
+    """
+    model = _get_model()
+    if out_dir is None:
+        out_dir = model.lookup_dir
+
+    feature_order     = model.schema['features']
+    transformed_order = model.schema.get('transformed_feature_order', feature_order)
+    columns           = lookup_table.enumerate_space(age_min, age_max)
+    n_rows            = len(columns['age_years'])
+
+    proba = None
+    shap  = None
+    for start in range(0, n_rows, batch_size):
+        stop = min(start + batch_size, n_rows)
+        df = pd.DataFrame(
+            {f: columns[f][start:stop] for f in feature_order},
+            columns=feature_order,
+        )
+
+        X_transformed = model.pipeline.named_steps['prep'].transform(df)
+        batch_proba   = model.pipeline[-1].predict_proba(X_transformed)
+        if proba is None:
+            proba = np.empty((n_rows, batch_proba.shape[1]), dtype=np.float64)
+        proba[start:stop] = batch_proba
+
+        if model.explainer is not None:
+            batch_shap = _shap_matrix(model.explainer, X_transformed)
+            if shap is None:
+                shap = np.empty((n_rows, batch_shap.shape[1]), dtype=np.float32)
+            shap[start:stop] = batch_shap
+
+        logger.info("Lookup table build: %d / %d rows", stop, n_rows)
+
+    meta = dict(
+        model.fingerprint,
+        age_min=age_min,
+        age_max=age_max,
+        shap_feature_order=list(transformed_order),
+    )
+    lookup_table.write_table(proba, shap, meta, out_dir)
+
+    # Serve from the fresh table right away if it was written to the
+    # location run_inference() reads from.
+    if os.path.abspath(out_dir) == os.path.abspath(model.lookup_dir):
+        model.lookup = lookup_table.LookupTable.open(out_dir, expected=model.fingerprint)
+
+    return lookup_table.read_meta(out_dir)
+
+
 def get_top_shap_features(shap_values: dict, n: int = 5) -> list:
     """
     Return the top-n features sorted by absolute SHAP value (most impactful first).
@@ -0,0 +1,230 @@
+"""
+ml/lookup_table.py
+==================
+Precomputed prediction + SHAP table covering the model's whole input space.
+
+The screening model only ever sees ten binary answers (a1..a10), three
+binary demographics (sex, jaundice, family_asd) and an integer age in
+[1, 18] — 18 * 2**13 = 147,456 distinct rows. Instead of building a
+DataFrame and running TreeSHAP on every request, ``ml.inference`` can
+evaluate the whole space once and answer with an O(1) array lookup.
+
+Layout on disk (``ml/artefacts/lookup/``, or ``lookup/`` inside a registry
+version directory — see ml/registry.py):
+    proba.npy   float64 (n_rows, n_classes)   – predict_proba output
+    shap.npy    float32 (n_rows, n_features)  – class-1 SHAP values,
+                                               transformed_feature_order
+    meta.json   age range, feature names, and checksums of the artefacts
+                the table was built from (used to detect a stale table)
+
+Both arrays are opened with ``mmap_mode='r'`` so every gunicorn worker
+shares one copy through the OS page cache.
+
+Row key (packed integer):
+    bits 0-9   a10..a1   (a1 is the most significant answer bit)
+    bit  10    family_asd ('yes' = 1)
+    bit  11    jaundice   ('yes' = 1)
+    bit  12    sex        ('m'   = 1)
+    bits 13+   age_years - age_min
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR  = os.path.dirname(os.path.abspath(__file__))
+LOOKUP_DIR = os.path.join(_BASE_DIR, 'artefacts', 'lookup')
+
+PROBA_FILE = 'proba.npy'
+SHAP_FILE  = 'shap.npy'
+META_FILE  = 'meta.json'
+
+FORMAT_VERSION = 1
+
+AGE_MIN = 1
+AGE_MAX = 18
+
+ANSWER_KEYS = [f'a{i}' for i in range(1, 11)]
+
+# (value encoded as 0, value encoded as 1) for each binary demographic,
+# listed from the most significant bit down.
+CATEGORY_LEVELS = {
+    'sex':        ('f', 'm'),
+    'jaundice':   ('no', 'yes'),
+    'family_asd': ('no', 'yes'),
+}
+
+_ANSWER_BITS = len(ANSWER_KEYS)
+_ROWS_PER_AGE = 1 << (_ANSWER_BITS + len(CATEGORY_LEVELS))
+
+
+def table_size(age_min: int = AGE_MIN, age_max: int = AGE_MAX) -> int:
+    """Number of rows needed to cover ages [age_min, age_max]."""
+    return (age_max - age_min + 1) * _ROWS_PER_AGE
+
+
+def pack_key(payload: dict, age_min: int = AGE_MIN, age_max: int = AGE_MAX) -> int | None:
+    """
+    Pack a Feature 3 payload into its table row index.
+
+    Returns None when the payload falls outside the precomputed space
+    (unknown category, non-binary answer, age out of range) so the caller
+    can fall back to the full model.
+    """
+    age = payload.get('age_years')
+    if isinstance(age, bool) or not isinstance(age, (int, np.integer)):
+        return None
+    if age < age_min or age > age_max:
+        return None
+
+    key = int(age) - age_min
+    for field, levels in CATEGORY_LEVELS.items():
+        value = payload.get(field)
+        if value not in levels:
+            return None
+        key = (key << 1) | levels.index(value)
+
+    for field in ANSWER_KEYS:
+        value = payload.get(field)
+        if isinstance(value, bool) or value not in (0, 1):
+            return None
+        key = (key << 1) | int(value)
+
+    return key
+
+
+def enumerate_space(age_min: int = AGE_MIN, age_max: int = AGE_MAX) -> dict:
+    """
+    Decode every row key in [0, table_size) into column arrays.
+
+    Returns {feature_name: ndarray} with one entry per payload field, in
+    row-key order, ready to be wrapped in a DataFrame.
+    """
+    keys = np.arange(table_size(age_min, age_max), dtype=np.int64)
+    columns = {}
+
+    for i, field in enumerate(ANSWER_KEYS):
+        shift = _ANSWER_BITS - 1 - i
+        columns[field] = ((keys >> shift) & 1).astype(np.int64)
+
+    shift = _ANSWER_BITS
+    for field, levels in reversed(list(CATEGORY_LEVELS.items())):
+        bit = (keys >> shift) & 1
+        columns[field] = np.where(bit == 1, levels[1], levels[0]).astype(object)
+        shift += 1
+
+    columns['age_years'] = (keys >> shift) + age_min
+    return columns
+
+
+def write_table(proba, shap, meta: dict, out_dir: str = LOOKUP_DIR) -> None:
+    """
+    Persist a built table. Arrays are written under temporary names and
+    moved into place, with meta.json replaced last so readers never pair
+    new arrays with old metadata for longer than one rename.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    meta = dict(meta, format_version=FORMAT_VERSION, n_rows=int(proba.shape[0]))
+
+    pending = []
+    for name, arr in ((PROBA_FILE, proba), (SHAP_FILE, shap)):
+        if arr is None:
+            continue
+        tmp_path = os.path.join(out_dir, f'.{name}.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, arr)
+        pending.append((tmp_path, os.path.join(out_dir, name)))
+
+    shap_path = os.path.join(out_dir, SHAP_FILE)
+    if shap is None and os.path.exists(shap_path):
+        os.remove(shap_path)
+
+    for tmp_path, final_path in pending:
+        os.replace(tmp_path, final_path)
+
+    tmp_meta = os.path.join(out_dir, f'.{META_FILE}.tmp')
+    with open(tmp_meta, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, os.path.join(out_dir, META_FILE))
+
+
+def read_meta(table_dir: str = LOOKUP_DIR) -> dict | None:
+    """Return the table's meta.json contents, or None if no table is built."""
+    path = os.path.join(table_dir, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class LookupTable:
+    """Memory-mapped view over a built table."""
+
+    def __init__(self, proba, shap, meta: dict):
+        self.proba         = proba
+        self.shap          = shap
+        self.meta          = meta
+        self.age_min       = meta['age_min']
+        self.age_max       = meta['age_max']
+        self.feature_names = meta.get('shap_feature_order', [])
+
+    @classmethod
+    def open(cls, table_dir: str = LOOKUP_DIR, expected: dict = None):
+        """
+        Open a table for reading.
+
+        Args:
+            table_dir: directory holding proba.npy / shap.npy / meta.json.
+            expected:  {meta_key: value} that must match (e.g. artefact
+                       checksums). A mismatch means the table was built
+                       from a different model and is ignored.
+
+        Returns:
+            LookupTable, or None if the table is missing, stale, or corrupt.
+        """
+        meta = read_meta(table_dir)
+        if meta is None:
+            return None
+
+        if meta.get('format_version') != FORMAT_VERSION:
+            logger.warning("Ignoring lookup table in %s: unsupported format.", table_dir)
+            return None
+
+        for key, value in (expected or {}).items():
+            if meta.get(key) != value:
+                logger.warning(
+                    "Ignoring stale lookup table in %s (%s changed). "
+                    "Rebuild with `python manage.py build_inference_lookup`.",
+                    table_dir, key,
+                )
+                return None
+
+        try:
+            proba = np.load(os.path.join(table_dir, PROBA_FILE), mmap_mode='r')
+            shap_path = os.path.join(table_dir, SHAP_FILE)
+            shap = np.load(shap_path, mmap_mode='r') if os.path.exists(shap_path) else None
+        except (OSError, ValueError) as exc:
+            logger.warning("Failed to open lookup table in %s: %s", table_dir, exc)
+            return None
+
+        n_rows = meta.get('n_rows')
+        if proba.shape[0] != n_rows or (shap is not None and shap.shape[0] != n_rows):
+            logger.warning("Ignoring lookup table in %s: row count mismatch.", table_dir)
+            return None
+
+        return cls(proba, shap, meta)
+
+    def lookup(self, payload: dict):
+        """
+        Return (proba_row, shap_row) for a payload, or None on a miss.
+        shap_row is None when the table was built without an explainer.
+        """
+        key = pack_key(payload, self.age_min, self.age_max)
+        if key is None:
+            return None
+        shap_row = self.shap[key] if self.shap is not None else None
+        return self.proba[key], shap_row
@@ -0,0 +1,175 @@
+"""
+ml/registry.py
+==============
+Versioned on-disk model registry for the AutiBloom screening model.
+
+Layout (``ml/artefacts/registry/``):
+    ACTIVE                      – name of the version new requests use
+    <version>/manifest.json     – {version, created_at, files: {name: sha256}}
+    <version>/model.pkl
+    <version>/shap_explainer.pkl    (optional)
+    <version>/feature_schema.json
+    <version>/lookup/           – precomputed table (see ml/lookup_table.py)
+
+Versions are immutable once registered; switching models means writing a
+different name to ACTIVE, which ml.inference notices and hot-swaps to.
+When no registry exists, ml.inference falls back to the flat
+``ml/artefacts/model.pkl`` layout.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+
+_BASE_DIR    = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.path.join(_BASE_DIR, 'artefacts', 'registry')
+
+ACTIVE_FILE    = 'ACTIVE'
+MANIFEST_FILE  = 'manifest.json'
+MODEL_FILE     = 'model.pkl'
+EXPLAINER_FILE = 'shap_explainer.pkl'
+SCHEMA_FILE    = 'feature_schema.json'
+LOOKUP_SUBDIR  = 'lookup'
+
+_VERSION_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,49}$')
+
+
+class RegistryError(Exception):
+    """Raised for a missing, malformed, or corrupted registry version."""
+    pass
+
+
+def file_checksum(path: str) -> str | None:
+    """Return the SHA-256 hex digest of a file, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _root(registry_dir):
+    return registry_dir or REGISTRY_DIR
+
+
+def version_dir(version: str, registry_dir: str = None) -> str:
+    return os.path.join(_root(registry_dir), version)
+
+
+def read_manifest(version: str, registry_dir: str = None) -> dict:
+    """Return a version's manifest. Raises RegistryError if it is missing."""
+    path = os.path.join(version_dir(version, registry_dir), MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise RegistryError(f"Model version {version!r} is not registered.")
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def manifest_mtime(version: str, registry_dir: str = None) -> int | None:
+    """Modification time (ns) of a version's manifest, used for change detection."""
+    path = os.path.join(version_dir(version, registry_dir), MANIFEST_FILE)
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(registry_dir: str = None) -> list:
+    """Return manifests for every registered version, oldest first."""
+    root = _root(registry_dir)
+    if not os.path.isdir(root):
+        return []
+    manifests = []
+    for name in os.listdir(root):
+        if os.path.exists(os.path.join(root, name, MANIFEST_FILE)):
+            manifests.append(read_manifest(name, root))
+    return sorted(manifests, key=lambda m: m.get('created_at', ''))
+
+
+def active_version(registry_dir: str = None) -> str | None:
+    """Return the name in ACTIVE, or None if the registry has no active version."""
+    path = os.path.join(_root(registry_dir), ACTIVE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return f.read().strip() or None
+
+
+def verify(version: str, registry_dir: str = None) -> dict:
+    """
+    Check every file listed in a version's manifest against its checksum.
+
+    Returns the manifest. Raises RegistryError on a missing or altered file.
+    """
+    manifest = read_manifest(version, registry_dir)
+    base = version_dir(version, registry_dir)
+    for name, expected in manifest.get('files', {}).items():
+        actual = file_checksum(os.path.join(base, name))
+        if actual is None:
+            raise RegistryError(f"{version}/{name} is missing.")
+        if actual != expected:
+            raise RegistryError(f"{version}/{name} does not match its manifest checksum.")
+    return manifest
+
+
+def register(version: str, model_path: str, schema_path: str,
+             explainer_path: str = None, registry_dir: str = None) -> dict:
+    """
+    Copy a trained model's artefacts into a new registry version.
+
+    Files are staged in a temporary directory and renamed into place, so a
+    half-copied version is never visible. Returns the new manifest.
+    """
+    if not _VERSION_RE.match(version or ''):
+        raise RegistryError(
+            f"Invalid version name {version!r}: use letters, digits, '.', '_' or '-' (max 50)."
+        )
+
+    root = _root(registry_dir)
+    final_dir = version_dir(version, root)
+    if os.path.exists(final_dir):
+        raise RegistryError(f"Model version {version!r} is already registered.")
+
+    sources = {MODEL_FILE: model_path, SCHEMA_FILE: schema_path}
+    if explainer_path:
+        sources[EXPLAINER_FILE] = explainer_path
+    for name, src in sources.items():
+        if not os.path.exists(src):
+            raise RegistryError(f"Cannot register {version!r}: {src} not found.")
+
+    os.makedirs(root, exist_ok=True)
+    staging = os.path.join(root, f'.{version}.staging')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    files = {}
+    for name, src in sources.items():
+        dest = os.path.join(staging, name)
+        shutil.copyfile(src, dest)
+        files[name] = file_checksum(dest)
+
+    manifest = {
+        'version':    version,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'files':      files,
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    os.rename(staging, final_dir)
+    return manifest
+
+
+def activate(version: str, registry_dir: str = None) -> None:
+    """Point ACTIVE at a verified version (atomic rename)."""
+    verify(version, registry_dir)
+    root = _root(registry_dir)
+    tmp_path = os.path.join(root, f'.{ACTIVE_FILE}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, os.path.join(root, ACTIVE_FILE))
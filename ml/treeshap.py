@@ -0,0 +1,181 @@
+"""
+ml/treeshap.py
+==============
+Exact path-dependent TreeSHAP over a compiled forest (see ml/forest.py),
+without importing the ``shap`` package.
+
+Gives the same values as ``shap.TreeExplainer(model)`` with its default
+feature_perturbation='tree_path_dependent'. Each root-to-leaf path is a
+small Shapley game over the m distinct features it splits on:
+
+  * feature j has an interval (lo, hi] that x_j must fall in to follow the
+    path, and a zero fraction z_j — the share of training cover that
+    follows the path when x_j is unknown (product of child/parent cover
+    ratios on edges that split on j);
+  * for a row, o_j = 1 if x_j is inside the interval, else 0, and O is the
+    set of features with o_j = 1;
+  * the leaf (value v) contributes to feature i
+
+        φ_i = v · (o_i − z_i) / z_i · G(O \\ {i})
+        G(A) = Σ_{S ⊆ A} |S|!(m−1−|S|)!/m! · Π_{j ∉ S} z_j
+
+G depends only on the tree, so it is tabulated once at load for every
+subset of every path (Σ 2^m entries — a few MB for a 200-tree forest).
+A row then costs one table gather per (leaf, feature on its path), done
+for all trees at once in NumPy.
+"""
+
+from math import factorial
+
+import numpy as np
+
+
+class TreeShap:
+    """Path-dependent TreeSHAP for one output class of a CompiledForest."""
+
+    def __init__(self, forest, class_index: int = 1, chunk_rows: int = 8):
+        """
+        Args:
+            forest:      ml.forest.CompiledForest with per-node cover.
+            class_index: column of forest.value to explain (1 = ASD).
+            chunk_rows:  rows evaluated together; small chunks stay in cache.
+
+        Raises ValueError if the forest has no cover or a zero-cover node.
+        """
+        if forest.cover is None:
+            raise ValueError("TreeShap needs a CompiledForest with node cover")
+        if np.any(forest.cover <= 0.0):
+            raise ValueError("TreeShap does not support zero-cover nodes")
+        self.chunk_rows = chunk_rows
+        self._build(forest, class_index)
+
+    # ── Load-time precomputation ─────────────────────────────────────────────
+
+    @staticmethod
+    def _collect_paths(forest, class_index):
+        """Return (paths, expected_value); paths = [({feature: (lo, hi, z)}, v)]."""
+        cover = forest.cover
+        paths = []
+        expected = 0.0
+
+        for root in forest.roots:
+            root = int(root)
+            stack = [(root, {})]
+            while stack:
+                node, slots = stack.pop()
+                left, right = int(forest.left[node]), int(forest.right[node])
+                if left == node:                              # leaf
+                    value = forest.value[node, class_index] / forest.n_trees
+                    paths.append((slots, value))
+                    expected += value * cover[node] / cover[root]
+                    continue
+
+                feature   = int(forest.feature[node])
+                threshold = float(forest.threshold[node])
+                for child, is_left in ((left, True), (right, False)):
+                    lo, hi, z = slots.get(feature, (-np.inf, np.inf, 1.0))
+                    if is_left:
+                        hi = min(hi, threshold)
+                    else:
+                        lo = max(lo, threshold)
+                    child_slots = dict(slots)
+                    child_slots[feature] = (lo, hi, z * cover[child] / cover[node])
+                    stack.append((child, child_slots))
+
+        return paths, expected
+
+    def _build(self, forest, class_index):
+        paths, self.expected_value = self._collect_paths(forest, class_index)
+
+        # One entry per (path, feature on that path), stored path by path.
+        lengths = np.array([len(slots) for slots, _ in paths], dtype=np.int64)
+        starts  = np.zeros(len(paths), dtype=np.int64)
+        starts[1:] = np.cumsum(lengths)[:-1]
+        n_entries = int(lengths.sum())
+
+        feature = np.empty(n_entries, dtype=np.int64)
+        lo      = np.empty(n_entries)
+        hi      = np.empty(n_entries)
+        z       = np.empty(n_entries)
+        slot    = np.empty(n_entries, dtype=np.int64)
+        for start, (slots, _) in zip(starts, paths):
+            for s, (feat, (f_lo, f_hi, f_z)) in enumerate(slots.items()):
+                e = start + s
+                feature[e], lo[e], hi[e], z[e], slot[e] = feat, f_lo, f_hi, f_z, s
+        path_of = np.repeat(np.arange(len(paths)), lengths)
+        values  = np.array([value for _, value in paths], dtype=np.float64)[path_of]
+
+        # Subset tables, one block of 2**m entries per path.
+        offsets = np.zeros(len(paths), dtype=np.int64)
+        offsets[1:] = np.cumsum(1 << lengths)[:-1]
+        table = np.empty(int((1 << lengths).sum()))
+        for m in np.unique(lengths):
+            rows = np.flatnonzero(lengths == m)
+            z_paths = z[starts[rows, None] + np.arange(m)]
+            table[offsets[rows, None] + np.arange(1 << m)] = self._subset_table(z_paths, int(m))
+
+        # Paths with no splits (single-leaf trees) carry no attribution.
+        has_entries = lengths > 0
+        self._reduce_at  = starts[has_entries]
+        self._path_index = np.cumsum(has_entries)[path_of] - 1     # entry → reduced path
+        self._feature  = feature
+        self._lo       = lo
+        self._hi       = hi
+        self._slot_bit = 1 << slot
+        self._base     = offsets[path_of]
+        self._table    = table
+        # φ_i / G(O \ {i}) for o_i = 1 and o_i = 0.
+        self._coef_in  = values * (1.0 - z) / z
+        self._coef_out = -values
+
+    @staticmethod
+    def _subset_table(z: np.ndarray, m: int) -> np.ndarray:
+        """G(A) for every subset A (bitmask) of m path features, shape (n_paths, 2**m)."""
+        masks = np.arange(1 << m)
+        bits  = (masks[:, None] >> np.arange(m)) & 1               # (2**m, m)
+        size  = bits.sum(axis=1)
+        weight = np.array([
+            factorial(k) * factorial(m - 1 - k) / factorial(m) if k < m else 0.0
+            for k in size
+        ])
+
+        # g(S) = w(|S|) · Π_{j ∉ S} z_j, then G(A) = Σ_{S ⊆ A} g(S).
+        table = weight * np.prod(np.where(bits[None, :, :] == 1, 1.0, z[:, None, :]), axis=2)
+        for b in range(m):
+            view = table.reshape(len(z), -1, 2, 1 << b)
+            view[:, :, 1, :] += view[:, :, 0, :]
+        return table
+
+    # ── Per-row evaluation ───────────────────────────────────────────────────
+
+    def shap_values(self, X: np.ndarray) -> np.ndarray:
+        """
+        SHAP values for every row, shape (n_rows, n_features). Each row sums
+        to the model output minus expected_value.
+        """
+        # Split decisions use float32 inputs, as sklearn trees do.
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_rows, n_features = X.shape
+
+        phi = np.zeros((n_rows, n_features))
+        if self._feature.size == 0:
+            return phi
+        for start in range(0, n_rows, self.chunk_rows):
+            stop = min(start + self.chunk_rows, n_rows)
+            contrib = self._entry_contributions(X[start:stop])
+            bins = self._feature + n_features * np.arange(stop - start)[:, None]
+            phi[start:stop] = np.bincount(
+                bins.ravel(), weights=contrib.ravel(), minlength=(stop - start) * n_features,
+            ).reshape(stop - start, n_features)
+        return phi
+
+    def _entry_contributions(self, X: np.ndarray) -> np.ndarray:
+        """Contribution of every (path, feature) entry for each row, shape (rows, entries)."""
+        x = X[:, self._feature]
+        inside = (x > self._lo) & (x <= self._hi)
+
+        # O for every path as a bitmask, then G(O \ {i}) for each entry.
+        pattern = np.add.reduceat(inside * self._slot_bit, self._reduce_at, axis=1)
+        index = self._base + (pattern[:, self._path_index] & ~self._slot_bit)
+
+        return np.where(inside, self._coef_in, self._coef_out) * self._table[index]
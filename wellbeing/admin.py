@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChildProfile, CaregiverChild, WellbeingQuestion, WeeklyWellbeingEntry, WeeklyWellbeingAnswer, PredictionResult
+from .models import ChildProfile, CaregiverChild, WellbeingQuestion, WeeklyWellbeingEntry, WeeklyWellbeingAnswer, PredictionResult, EntryReportCache, NarrativeJob
 
 # Register your models here.
 
@@ -69,3 +69,16 @@ class PredictionResultAdmin(admin.ModelAdmin):
     list_filter = ('model_version', 'created_at')
     search_fields = ('caregiver__username', 'child__name')
 
+
+@admin.register(EntryReportCache)
+class EntryReportCacheAdmin(admin.ModelAdmin):
+    list_display = ('entry', 'model_version', 'prompt_template_hash', 'prediction_label', 'updated_at')
+    list_filter = ('model_version', 'prompt_template_hash')
+    search_fields = ('entry__child__name',)
+
+
+@admin.register(NarrativeJob)
+class NarrativeJobAdmin(admin.ModelAdmin):
+    list_display = ('report', 'status', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status',)
+    readonly_fields = ('last_error',)
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml import lookup_table
+from ml.inference import ModelNotReadyError, build_lookup_table, get_model_version, has_lookup_table
+
+
+class Command(BaseCommand):
+    help = 'Precomputes predictions + SHAP values for every valid payload of the serving model'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Rebuild even if the existing table matches the deployed model.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=8192,
+            help='Rows per predict_proba / SHAP batch (default: 8192).',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            version = get_model_version()
+            if has_lookup_table() and not options['force']:
+                self.stdout.write(f"Lookup table is already current for model {version}. Use --force to rebuild.")
+                return
+
+            self.stdout.write(f"Building lookup table for model {version} ({lookup_table.table_size()} rows)...")
+            started = time.monotonic()
+            meta = build_lookup_table(batch_size=options['batch_size'])
+        except ModelNotReadyError as exc:
+            raise CommandError(str(exc)) from exc
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Wrote {meta['n_rows']} rows in {elapsed:.1f}s"))
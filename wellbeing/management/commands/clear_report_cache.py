@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from wellbeing.services.report import invalidate_entry_reports
+
+
+class Command(BaseCommand):
+    help = 'Deletes cached entry reports (prediction, explanation, narrative and SOAP note)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Delete every cached report, not only those for an old model version or prompt template.',
+        )
+        parser.add_argument(
+            '--entry', type=int, action='append', dest='entries',
+            help='Only clear reports for this entry id (repeatable).',
+        )
+
+    def handle(self, *args, **options):
+        deleted = invalidate_entry_reports(
+            entry_ids=options['entries'],
+            stale_only=not options['all'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} cached report(s)."))
@@ -0,0 +1,66 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml import registry
+from ml.inference import EXPLAINER_PATH, MODEL_PATH, SCHEMA_PATH
+
+
+class Command(BaseCommand):
+    help = 'Lists, registers and activates versions in the ML model registry (ml/artefacts/registry/)'
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='action', required=True)
+
+        sub.add_parser('list', help='Show registered versions and which one is active.')
+
+        reg = sub.add_parser('register', help='Copy trained artefacts into a new version.')
+        reg.add_argument('version', help='Version name, e.g. rf-v1.1')
+        reg.add_argument('--model', default=MODEL_PATH, help='Path to model.pkl (default: ml/artefacts/model.pkl)')
+        reg.add_argument('--explainer', default=EXPLAINER_PATH, help='Path to shap_explainer.pkl (optional)')
+        reg.add_argument('--schema', default=SCHEMA_PATH, help='Path to feature_schema.json')
+        reg.add_argument('--activate', action='store_true', help='Make this version active once registered.')
+
+        act = sub.add_parser('activate', help='Switch serving workers to a registered version.')
+        act.add_argument('version')
+
+    def handle(self, *args, **options):
+        try:
+            if options['action'] == 'list':
+                self._list()
+            elif options['action'] == 'register':
+                self._register(options)
+            else:
+                registry.activate(options['version'])
+                self.stdout.write(self.style.SUCCESS(
+                    f"Activated {options['version']}. Workers pick it up on their next check."
+                ))
+        except registry.RegistryError as exc:
+            raise CommandError(str(exc)) from exc
+
+    def _list(self):
+        active = registry.active_version()
+        versions = registry.list_versions()
+        if not versions:
+            self.stdout.write("No registered versions — serving the flat ml/artefacts/ layout.")
+            return
+        for manifest in versions:
+            marker = '*' if manifest['version'] == active else ' '
+            self.stdout.write(f"{marker} {manifest['version']:<24} {manifest.get('created_at', '')}")
+
+    def _register(self, options):
+        explainer = options['explainer']
+        if explainer == EXPLAINER_PATH and not os.path.exists(explainer):
+            explainer = None  # default explainer is optional
+        manifest = registry.register(
+            options['version'],
+            model_path=options['model'],
+            schema_path=options['schema'],
+            explainer_path=explainer,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Registered {manifest['version']} ({', '.join(sorted(manifest['files']))})"
+        ))
+        if options['activate']:
+            registry.activate(manifest['version'])
+            self.stdout.write(self.style.SUCCESS(f"Activated {manifest['version']}."))
@@ -0,0 +1,203 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_date
+
+from ml.inference import ModelNotReadyError, get_model_version, run_inference_batch
+from wellbeing.models import PredictionResult, WeeklyWellbeingAnswer, WeeklyWellbeingEntry
+from wellbeing.services.explainability import _get_domain_map, build_explanation
+from wellbeing.services.prediction import build_payload_from_entry, validate_payload
+
+
+class Command(BaseCommand):
+    help = 'Re-scores every SUBMITTED wellbeing entry with the deployed model and upserts PredictionResult rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model-version',
+            help='Expected version of the deployed model; aborts if a different model is loaded.',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only re-score entries submitted on or after this date (YYYY-MM-DD).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Entries scored per run_inference_batch call (default: 500).',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Scoring processes; 1 scores in-process (default: CPU count).',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='JSON file recording the last written entry id. An interrupted run '
+                 'started again with the same file resumes where it stopped.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore an existing checkpoint and start from the first entry.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        workers = options['workers']
+        if batch_size < 1 or workers < 1:
+            raise CommandError("--batch-size and --workers must be positive.")
+
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since date: {options['since']!r} (expected YYYY-MM-DD).")
+
+        # Loading the model here also lets forked workers inherit it.
+        try:
+            model_version = get_model_version()
+        except ModelNotReadyError as exc:
+            raise CommandError(str(exc)) from exc
+
+        if options['model_version'] and options['model_version'] != model_version:
+            raise CommandError(
+                f"Deployed model is {model_version!r}, not {options['model_version']!r}."
+            )
+
+        checkpoint_path = options['checkpoint']
+        run_key = {'model_version': model_version, 'since': options['since']}
+        last_id, written = 0, 0
+        if checkpoint_path and not options['restart']:
+            state = self._read_checkpoint(checkpoint_path)
+            if state and all(state.get(k) == v for k, v in run_key.items()):
+                last_id, written = state['last_entry_id'], state['written']
+                self.stdout.write(f"Resuming after entry {last_id} ({written} already written).")
+            elif state:
+                self.stdout.write(self.style.WARNING(
+                    "Checkpoint was written for a different model/--since; starting over."
+                ))
+
+        entries = (
+            WeeklyWellbeingEntry.objects
+            .filter(status='SUBMITTED', id__gt=last_id)
+            .select_related('child')
+            .prefetch_related(Prefetch(
+                'answers',
+                queryset=WeeklyWellbeingAnswer.objects.select_related('question'),
+            ))
+            .order_by('id')
+        )
+        if since:
+            entries = entries.filter(submitted_at__date__gte=since)
+
+        domain_map = _get_domain_map()
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+        self.stdout.write(f"Re-scoring with model {model_version} ({workers} worker(s), batch {batch_size})...")
+        started = time.monotonic()
+        run_written, skipped = 0, 0
+
+        try:
+            wave = []  # one batch per worker, scored together
+            for batch in self._batches(entries, batch_size):
+                wave.append(batch)
+                if len(wave) < workers:
+                    continue
+                done, bad, last_id = self._score_wave(wave, pool, domain_map, last_id)
+                wave = []
+                run_written += done
+                skipped += bad
+                self._report(run_written, skipped, started)
+                if checkpoint_path:
+                    self._write_checkpoint(checkpoint_path, run_key, last_id, written + run_written)
+
+            if wave:
+                done, bad, last_id = self._score_wave(wave, pool, domain_map, last_id)
+                run_written += done
+                skipped += bad
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.monotonic() - started
+        rate = run_written / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-scored {run_written} entries ({skipped} skipped) in {elapsed:.1f}s — {rate:.1f} rows/s"
+        ))
+
+    # ── Helpers ──────────────────────────────────────────────────────────────
+
+    def _batches(self, entries, batch_size):
+        """Yield lists of (entry, payload or None), streaming from the DB."""
+        batch = []
+        for entry in entries.iterator(chunk_size=batch_size):
+            try:
+                payload = build_payload_from_entry(entry, answers=entry.answers.all())
+                validate_payload(payload)
+            except ValidationError:
+                payload = None
+            batch.append((entry, payload))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _score_wave(self, wave, pool, domain_map, last_id):
+        """Score a group of batches (in parallel if a pool is given) and upsert results."""
+        payload_batches = [[p for _, p in batch if p is not None] for batch in wave]
+        if pool is not None:
+            scored = list(pool.map(run_inference_batch, payload_batches))
+        else:
+            scored = [run_inference_batch(payloads) for payloads in payload_batches]
+
+        written, skipped = 0, 0
+        for batch, results in zip(wave, scored):
+            results = iter(results)
+            rows = []
+            for entry, payload in batch:
+                last_id = max(last_id, entry.id)
+                if payload is None:
+                    skipped += 1
+                    continue
+                result = next(results)
+                rows.append(PredictionResult(
+                    caregiver_id=entry.caregiver_id,
+                    child_id=entry.child_id,
+                    entry_id=entry.id,
+                    prediction_label=result['label'],
+                    prediction_score=result['score'],
+                    model_version=result['model_version'],
+                    explanation_json=build_explanation(payload, result['shap_values'], domain_map),
+                ))
+            PredictionResult.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['entry', 'caregiver'],
+                update_fields=['child', 'prediction_label', 'prediction_score', 'model_version', 'explanation_json'],
+            )
+            written += len(rows)
+        return written, skipped, last_id
+
+    def _report(self, written, skipped, started):
+        elapsed = time.monotonic() - started
+        rate = written / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(f"  {written} written, {skipped} skipped — {rate:.1f} rows/s")
+
+    def _read_checkpoint(self, path):
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _write_checkpoint(self, path, run_key, last_id, written):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(run_key, last_entry_id=last_id, written=written), f)
+        os.replace(tmp_path, path)
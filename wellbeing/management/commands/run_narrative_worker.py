@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from wellbeing.services.report import process_narrative_jobs
+
+
+class Command(BaseCommand):
+    help = 'Processes queued narrative / SOAP note generation jobs (Gemini) for entry reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run every job that is currently due, then exit.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help='Seconds to wait between queue checks when idle (default: 2).',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = process_narrative_jobs()
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)."))
+            return
+
+        self.stdout.write(f"Narrative worker started (poll every {options['poll_interval']}s).")
+        try:
+            while True:
+                close_old_connections()
+                processed = process_narrative_jobs()
+                if processed:
+                    self.stdout.write(f"Processed {processed} job(s).")
+                else:
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Narrative worker stopped.")
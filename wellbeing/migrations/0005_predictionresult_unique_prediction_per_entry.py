@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_duplicate_predictions(apps, schema_editor):
+    """Keep only the newest PredictionResult per (entry, caregiver)."""
+    PredictionResult = apps.get_model('wellbeing', 'PredictionResult')
+    seen = set()
+    stale_ids = []
+    for pred in PredictionResult.objects.order_by('-created_at', '-id').only('id', 'entry_id', 'caregiver_id'):
+        key = (pred.entry_id, pred.caregiver_id)
+        if key in seen:
+            stale_ids.append(pred.id)
+        else:
+            seen.add(key)
+    if stale_ids:
+        PredictionResult.objects.filter(id__in=stale_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wellbeing', '0004_childprofile_profile_picture'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_predictions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='predictionresult',
+            constraint=models.UniqueConstraint(fields=('entry', 'caregiver'), name='unique_prediction_per_entry'),
+        ),
+    ]
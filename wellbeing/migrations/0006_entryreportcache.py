@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wellbeing', '0005_predictionresult_unique_prediction_per_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryReportCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(max_length=50)),
+                ('prompt_template_hash', models.CharField(max_length=64)),
+                ('inputs_hash', models.CharField(max_length=64)),
+                ('prediction_label', models.CharField(max_length=255)),
+                ('confidence', models.FloatField()),
+                ('risk_score', models.IntegerField()),
+                ('explanation_json', models.JSONField(default=dict)),
+                ('narrative_text', models.TextField()),
+                ('soap_note', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_cache', to='wellbeing.weeklywellbeingentry')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('entry', 'model_version', 'prompt_template_hash'), name='unique_report_cache_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wellbeing', '0006_entryreportcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entryreportcache',
+            name='trend_summary',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.CreateModel(
+            name='NarrativeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Not picked up before this time (retry backoff)')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('report', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='narrative_job', to='wellbeing.entryreportcache')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='wellbeing_n_status_b5a4ff_idx')],
+            },
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import datetime
 
@@ -233,5 +234,84 @@ class PredictionResult(models.Model):
     narrative_text = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entry', 'caregiver'], name='unique_prediction_per_entry')
+        ]
+
     def __str__(self):
         return f"Prediction for {self.child} (entry {self.entry_id}) — {self.prediction_label}"
+
+
+class EntryReportCache(models.Model):
+    """
+    Stored report content (prediction, explanation, narrative and SOAP
+    note) for a submitted entry, so repeat report views and PDF exports
+    skip inference and the Gemini calls.
+
+    Rows are keyed on the model version and prompt template hash, so a new
+    model or prompt wording never reuses them. inputs_hash covers the
+    payload and trend summary the texts were built from; a mismatch (e.g.
+    the child's profile was edited) means the row is rebuilt.
+
+    While its NarrativeJob is pending the row holds the static fallback
+    narrative and SOAP note; the worker replaces them with Gemini's.
+    """
+    entry = models.ForeignKey(
+        WeeklyWellbeingEntry, on_delete=models.CASCADE, related_name='report_cache'
+    )
+    model_version = models.CharField(max_length=50)
+    prompt_template_hash = models.CharField(max_length=64)
+    inputs_hash = models.CharField(max_length=64)
+    prediction_label = models.CharField(max_length=255)
+    confidence = models.FloatField()
+    risk_score = models.IntegerField()
+    explanation_json = models.JSONField(default=dict)
+    trend_summary = models.JSONField(default=dict)
+    narrative_text = models.TextField()
+    soap_note = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['entry', 'model_version', 'prompt_template_hash'],
+                name='unique_report_cache_key',
+            )
+        ]
+
+    def __str__(self):
+        return f"Report cache for entry {self.entry_id} ({self.model_version})"
+
+
+class NarrativeJob(models.Model):
+    """
+    Queued Gemini generation of the narrative and SOAP note for one
+    EntryReportCache row, processed by `manage.py run_narrative_worker`.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    report = models.OneToOneField(
+        EntryReportCache, on_delete=models.CASCADE, related_name='narrative_job'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not picked up before this time (retry backoff)")
+    started_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"Narrative job for report {self.report_id} ({self.status})"
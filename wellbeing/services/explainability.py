@@ -45,7 +45,7 @@ def _get_domain_map():
     return dict(DEFAULT_DOMAIN_MAP)
 
 
-def build_explanation(payload: dict, shap_values: dict = None) -> dict:
+def build_explanation(payload: dict, shap_values: dict = None, domain_map: dict = None) -> dict:
     """
     Build an explanation dict from a validated prediction payload.
 
@@ -54,6 +54,8 @@ def build_explanation(payload: dict, shap_values: dict = None) -> dict:
         shap_values: optional dict {feature_name: float} from ml.inference.
                      When provided, top_shap_features is populated and the
                      chart in entry_report.html will render real importances.
+        domain_map:  optional a# → domain mapping. Bulk callers fetch it
+                     once via _get_domain_map() instead of once per entry.
 
     Returns:
         JSON-serializable dict with:
@@ -65,7 +67,8 @@ def build_explanation(payload: dict, shap_values: dict = None) -> dict:
         - shap_values:       raw {feature: float} dict (empty if no real model)
         - top_shap_features: list of {feature, value} sorted by |value| desc
     """
-    domain_map = _get_domain_map()
+    if domain_map is None:
+        domain_map = _get_domain_map()
 
     # ── Identify risk flags ─────────────────────────────────────
     answer_keys = [f'a{i}' for i in range(1, 11)]
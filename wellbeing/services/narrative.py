@@ -1,8 +1,14 @@
 import os
 import json
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from google import genai
 from google.genai import types
 
+from autibloom.circuit_breaker import CircuitBreaker
+
 DOMAIN_LABELS = {
     "communication": "Communication",
     "routines": "Routines",
@@ -10,17 +16,74 @@ DOMAIN_LABELS = {
     "sensory_behaviors": "Sensory Behaviors",
 }
 
-def call_gemma_model(prompt: str, fallback_text: str = "") -> str:
+# Tried in order until one returns text.
+GEMINI_MODELS = ["gemini-2.5-flash", "gemini-2.0-flash", "gemini-flash-latest"]
+
+# Overall time budget for one report's texts (narrative + SOAP in parallel).
+REPORT_DEADLINE_SECONDS = float(os.environ.get("GEMINI_REPORT_DEADLINE_SECONDS", "45"))
+
+# A model that fails this many times in a row is skipped for the cooldown,
+# then gets a single trial call while concurrent requests keep skipping it
+# (a failure re-opens it straight away).
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN_SECONDS = 60
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+# Runs the narrative and SOAP prompts side by side; threads start lazily,
+# so this is safe to create before gunicorn forks.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gemini")
+
+
+_breakers = {
+    model: CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN_SECONDS)
+    for model in GEMINI_MODELS
+}
+
+
+def _get_client(api_key: str):
+    """Process-wide genai.Client, so HTTP connections are kept alive and reused."""
+    global _client, _client_key
+    with _client_lock:
+        if _client is None or _client_key != api_key:
+            _client = genai.Client(api_key=api_key)
+            _client_key = api_key
+        return _client
+
+
+def gemini_configured() -> bool:
+    """True if a Gemini API key is set, i.e. call_gemma_model can do more than return its fallback."""
+    return bool(os.environ.get("GEMINI_API_KEY"))
+
+def call_gemma_model(prompt: str, fallback_text: str = "", deadline: float = None) -> str:
+    """
+    Send a prompt to the first healthy model in GEMINI_MODELS.
+
+    Models whose circuit breaker is open are skipped. With a deadline
+    (time.monotonic() value) each HTTP call is capped to the time left,
+    and no new model is tried once it has passed.
+    """
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         return fallback_text or "Unable to generate AI summary because GEMINI_API_KEY is not set."
         
-    client = genai.Client(api_key=api_key)
+    client = _get_client(api_key)
 
     last_err = None
-    for model in ["gemini-2.5-flash", "gemini-2.0-flash", "gemini-flash-latest"]:
+    for model in GEMINI_MODELS:
+        # Check the deadline before taking what may be the breaker's trial slot.
+        if deadline is not None and deadline - time.monotonic() < 1.0:
+            break
+        breaker = _breakers[model]
+        if not breaker.allow():
+            continue
         try:
             cfg_kwargs = dict(temperature=0.2, max_output_tokens=1500)
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 1.0)
+                cfg_kwargs["http_options"] = types.HttpOptions(timeout=int(remaining * 1000))
             # Disable Gemini 2.5 "thinking" so the token budget is spent on visible
             # output, not on internal reasoning that truncates the answer.
             if model.startswith("gemini-2.5"):
@@ -33,31 +96,25 @@ def call_gemma_model(prompt: str, fallback_text: str = "") -> str:
                 contents=prompt,
                 config=types.GenerateContentConfig(**cfg_kwargs),
             )
-            if resp.text:
-                return resp.text
         except Exception as e:
+            breaker.record_failure()
             last_err = e
             continue
+        breaker.record_success()
+        if resp.text:
+            return resp.text
     if last_err is not None:
         print(f"[narrative] All Gemini model calls failed; last error: {last_err}")
 
     return fallback_text or "Unable to generate AI summary at this time."
 
-def build_soap_note(trend_summary: dict, prediction) -> str:
-    """Build an AI-powered SOAP medical note using Gemma-3-27B-IT."""
-    exp = prediction.explanation_json or {}
-    
-    risk_count = exp.get("risk_count", 0)
-    top_domains = exp.get("top_domains", [])
-    
-    trends = trend_summary.get("domain_trends", {})
-    latest_overall = trend_summary.get("latest_overall")
-    
-    trend_data = json.dumps(trends, indent=2)
-    overall = f"{latest_overall:.1f}" if latest_overall else "N/A"
-    domains_str = ", ".join([DOMAIN_LABELS.get(d, d) for d in top_domains]) if top_domains else "None"
-    
-    prompt = f"""You are a professional medical scribe summarizing caregiver-reported tracking data for an autistic child.
+# ── Prompt templates ─────────────────────────────────────────────────────────
+# Kept as module constants so PROMPT_TEMPLATE_HASH changes whenever the
+# wording (or the model list) does, which invalidates cached reports. The
+# fallbacks are hashed too: the job queue finds parts still to generate by
+# comparing a row's texts with them.
+
+SOAP_PROMPT = """You are a professional medical scribe summarizing caregiver-reported tracking data for an autistic child.
 Write a strict SOAP (Subjective, Objective, Assessment, Plan) note based on the caregiver's weekly check-in data and model insights.
 
 STRICT RULES:
@@ -75,7 +132,7 @@ CONTEXT DATA:
 
 Write the SOAP note now:"""
 
-    fallback_text = f"""Subjective: Caregiver reports weekly check-in data for tracking wellbeing. Child's overall caregiver-reported score is {overall} / 4.0. Concern noted in the following domains: {domains_str}.
+SOAP_FALLBACK = """Subjective: Caregiver reports weekly check-in data for tracking wellbeing. Child's overall caregiver-reported score is {overall} / 4.0. Concern noted in the following domains: {domains_str}.
 
 Objective: Screening tool processed the caregiver answers. Out of 10 items flagged for risk patterns, {risk_count} / 10 were positive for potential developmental risk. Weekly trends show: {trend_data}.
 
@@ -85,22 +142,7 @@ Plan: Caregiver is advised to monitor flagged domains closely. Recommend sharing
 
 Disclaimer: AutiBloom's insights are a screening support tool designed to identify patterns, not a clinical diagnosis. Always consult a qualified healthcare or developmental professional for medical advice and evaluation."""
 
-    return call_gemma_model(prompt, fallback_text)
-
-def build_narrative(trend_summary: dict, prediction) -> str:
-    """Build an AI-powered narrative summary using Gemma-3-27B-IT."""
-    exp = prediction.explanation_json or {}
-    risk_count = exp.get("risk_count", 0)
-    top_domains = exp.get("top_domains", [])
-    friendly_summary = exp.get("friendly_summary", "")
-    trends = trend_summary.get("domain_trends", {})
-    latest_overall = trend_summary.get("latest_overall")
-    
-    trend_data = json.dumps(trends, indent=2)
-    overall = f"{latest_overall:.1f}" if latest_overall else "N/A"
-    domains_str = ", ".join([DOMAIN_LABELS.get(d, d) for d in top_domains]) if top_domains else "None"
-
-    prompt = f"""You are a compassionate, professional support assistant for parents of autistic children.
+NARRATIVE_PROMPT = """You are a compassionate, professional support assistant for parents of autistic children.
 Your task is to write a short "Parent Summary" narrative based on the provided weekly tracking data and machine-learning model insights.
 
 STRICT RULES:
@@ -124,11 +166,82 @@ Based strictly on the rules and data above, write the parent summary narrative n
 Disclaimer: AutiBloom's insights are a screening support tool designed to identify patterns, not a clinical diagnosis. Always consult a qualified healthcare or developmental professional for medical advice and evaluation. Add this at the end of the text.
 """
 
-    fallback_text = f"""Parent Summary:
+NARRATIVE_FALLBACK = """Parent Summary:
 We appreciate your dedication to tracking your child's developmental journey. This week, the weekly check-in showed an overall wellbeing score of {overall} out of 4.0, with {risk_count} focus areas flagged by the model. The flagged areas of note are: {domains_str}. Rule-based analysis notes: "{friendly_summary}".
 
 We encourage you to observe how your child navigates routines and communication over the coming days. If you notice persistent high-concern patterns or feel overwhelmed, sharing these weekly tracking summaries with your pediatrician, developmental therapist, or school support team can be a great way to start collaborative care planning.
 
 Disclaimer: AutiBloom's insights are a screening support tool designed to identify patterns, not a clinical diagnosis. Always consult a qualified healthcare or developmental professional for medical advice and evaluation."""
 
-    return call_gemma_model(prompt, fallback_text)
+PROMPT_TEMPLATE_HASH = hashlib.sha256(
+    "\x00".join([SOAP_PROMPT, SOAP_FALLBACK, NARRATIVE_PROMPT, NARRATIVE_FALLBACK] + GEMINI_MODELS).encode("utf-8")
+).hexdigest()[:16]
+
+
+def _prompt_context(trend_summary: dict, prediction) -> dict:
+    """Template fields shared by the SOAP note and the parent narrative."""
+    exp = prediction.explanation_json or {}
+    top_domains = exp.get("top_domains", [])
+    latest_overall = trend_summary.get("latest_overall")
+
+    return {
+        "risk_count": exp.get("risk_count", 0),
+        "friendly_summary": exp.get("friendly_summary", ""),
+        "trend_data": json.dumps(trend_summary.get("domain_trends", {}), indent=2),
+        "overall": f"{latest_overall:.1f}" if latest_overall else "N/A",
+        "domains_str": ", ".join([DOMAIN_LABELS.get(d, d) for d in top_domains]) if top_domains else "None",
+    }
+
+
+def soap_prompt(trend_summary: dict, prediction) -> tuple:
+    """Return (prompt, fallback_text) for the SOAP note."""
+    ctx = _prompt_context(trend_summary, prediction)
+    return SOAP_PROMPT.format(**ctx), SOAP_FALLBACK.format(**ctx)
+
+
+def narrative_prompt(trend_summary: dict, prediction) -> tuple:
+    """Return (prompt, fallback_text) for the parent narrative."""
+    ctx = _prompt_context(trend_summary, prediction)
+    return NARRATIVE_PROMPT.format(**ctx), NARRATIVE_FALLBACK.format(**ctx)
+
+
+def build_soap_note(trend_summary: dict, prediction) -> str:
+    """Build an AI-powered SOAP medical note using Gemma-3-27B-IT."""
+    return call_gemma_model(*soap_prompt(trend_summary, prediction))
+
+
+def build_narrative(trend_summary: dict, prediction) -> str:
+    """Build an AI-powered narrative summary using Gemma-3-27B-IT."""
+    return call_gemma_model(*narrative_prompt(trend_summary, prediction))
+
+
+def build_report_texts(trend_summary: dict, prediction, timeout: float = REPORT_DEADLINE_SECONDS,
+                       parts=("narrative", "soap_note")) -> dict:
+    """
+    Generate the parent narrative and SOAP note concurrently.
+
+    Both prompts share one deadline, so the wait is roughly the slower of
+    the two calls rather than their sum. A part that is not back in time
+    gets its fallback text.
+
+    Returns {part: text} for each requested part ("narrative", "soap_note").
+    """
+    builders = {"narrative": narrative_prompt, "soap_note": soap_prompt}
+    prompts = {part: builders[part](trend_summary, prediction) for part in parts}
+    if not gemini_configured():
+        return {part: fallback for part, (_, fallback) in prompts.items()}
+
+    deadline = time.monotonic() + timeout
+    futures = {
+        part: _executor.submit(call_gemma_model, prompt, fallback, deadline)
+        for part, (prompt, fallback) in prompts.items()
+    }
+    wait(futures.values(), timeout=timeout)
+
+    texts = {}
+    for part, future in futures.items():
+        if future.done() and future.exception() is None:
+            texts[part] = future.result()
+        else:
+            texts[part] = prompts[part][1]
+    return texts
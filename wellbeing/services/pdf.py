@@ -0,0 +1,214 @@
+"""
+PDF rendering for the clinical report export.
+
+Launching Chromium costs far more than printing one report, so each
+process keeps one headless browser with a few reusable pages:
+
+  * the browser lives on its own thread with an asyncio loop (Playwright
+    objects are bound to the loop that created them); render_pdf() hands
+    HTML to it from any request thread and waits for the bytes;
+  * each page has its own browser context and is replaced after
+    PDF_PAGE_MAX_RENDERS renders, or at once if a render fails;
+  * before every render the browser is health-checked and relaunched if
+    it has disconnected.
+
+A page is printed as soon as the template sets ``window.__reportReady``
+(scripts run, fonts loaded, chart drawn) instead of after fixed sleeps.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+PDF_POOL_PAGES = int(os.environ.get("PDF_POOL_PAGES", "2"))
+PDF_PAGE_MAX_RENDERS = int(os.environ.get("PDF_PAGE_MAX_RENDERS", "50"))
+PDF_READY_TIMEOUT_MS = 10000
+PDF_RENDER_TIMEOUT_SECONDS = 60
+
+PDF_OPTIONS = {
+    'format': 'A4',
+    'print_background': True,
+    'margin': {'top': '20mm', 'bottom': '20mm', 'left': '18mm', 'right': '18mm'},
+}
+
+
+async def _launch_chromium():
+    """Start Playwright and a headless Chromium. Returns (playwright, browser)."""
+    from playwright.async_api import async_playwright  # noqa: PLC0415
+
+    playwright = await async_playwright().start()
+    try:
+        browser = await playwright.chromium.launch(headless=True)
+    except Exception:
+        await playwright.stop()
+        raise
+    return playwright, browser
+
+
+class _Slot:
+    """One reusable page, the context that owns it and the browser it came from."""
+
+    def __init__(self):
+        self.browser = None
+        self.context = None
+        self.page    = None
+        self.renders = 0
+
+
+class PdfRenderer:
+    """Long-lived browser with `pages` reusable pages, shared by all request threads."""
+
+    def __init__(self, pages: int = PDF_POOL_PAGES, max_renders: int = PDF_PAGE_MAX_RENDERS,
+                 launch=_launch_chromium):
+        """
+        Args:
+            pages:       renders that may run at once (one page each).
+            max_renders: renders after which a page and its context are replaced.
+            launch:      coroutine function returning (playwright, browser).
+        """
+        self.pages       = pages
+        self.max_renders = max_renders
+        self._launch     = launch
+        self._lock       = threading.Lock()
+        self._loop       = None
+        self._thread     = None
+        self._slots      = None    # asyncio.Queue of _Slot, owned by the loop
+        self._browser_lock = None
+        self._playwright = None
+        self._browser    = None
+
+    # ── Called from request threads ──────────────────────────────────────────
+
+    def render(self, html: str, timeout: float = PDF_RENDER_TIMEOUT_SECONDS) -> bytes:
+        """
+        Print `html` to PDF bytes.
+
+        Raises whatever Playwright raised, or TimeoutError if no page
+        produced a PDF within `timeout` seconds.
+        """
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(self._render(html), self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"PDF rendering took longer than {timeout}s")
+
+    def shutdown(self) -> None:
+        """Close the browser and stop the renderer thread."""
+        with self._lock:
+            if self._thread is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(10)
+            except Exception as exc:
+                logger.warning("PDF renderer did not close cleanly: %s", exc)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(10)
+            self._loop, self._thread = None, None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="pdf-renderer", daemon=True)
+            thread.start()
+            asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+            self._loop, self._thread = loop, thread
+
+    # ── Runs on the renderer loop ────────────────────────────────────────────
+
+    async def _setup(self):
+        self._slots = asyncio.Queue()
+        for _ in range(self.pages):
+            self._slots.put_nowait(_Slot())
+        self._browser_lock = asyncio.Lock()
+
+    async def _render(self, html: str) -> bytes:
+        slot = await self._slots.get()
+        try:
+            pdf_bytes = await self._print(slot, html)
+            slot.renders += 1
+            if slot.renders >= self.max_renders:
+                await self._discard(slot)
+            return pdf_bytes
+        except BaseException:
+            await self._discard(slot)
+            raise
+        finally:
+            self._slots.put_nowait(slot)
+
+    async def _print(self, slot: _Slot, html: str) -> bytes:
+        page = await self._page_for(slot)
+        await page.set_content(html, wait_until='load')
+        try:
+            await page.wait_for_function('window.__reportReady === true', timeout=PDF_READY_TIMEOUT_MS)
+        except Exception as exc:
+            # A CDN script that never loads should not block the export.
+            logger.warning("Report page did not signal ready, printing anyway: %s", exc)
+        return await page.pdf(**PDF_OPTIONS)
+
+    async def _page_for(self, slot: _Slot):
+        """Return the slot's page, relaunching the browser or opening a page as needed."""
+        async with self._browser_lock:
+            if self._browser is None or not self._browser.is_connected():
+                await self._relaunch()
+        if slot.browser is not self._browser or slot.page is None or slot.page.is_closed():
+            await self._discard(slot)
+            slot.context = await self._browser.new_context()
+            slot.page    = await slot.context.new_page()
+            slot.browser = self._browser
+        return slot.page
+
+    async def _relaunch(self):
+        await self._close_browser()
+        self._playwright, self._browser = await self._launch()
+
+    async def _discard(self, slot: _Slot):
+        if slot.context is not None and slot.browser is self._browser:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        slot.browser, slot.context, slot.page, slot.renders = None, None, None, 0
+
+    async def _close_browser(self):
+        browser, playwright = self._browser, self._playwright
+        self._browser, self._playwright = None, None
+        for close in (browser and browser.close, playwright and playwright.stop):
+            if close is None:
+                continue
+            try:
+                await close()
+            except Exception:
+                pass
+
+    async def _close(self):
+        while not self._slots.empty():
+            await self._discard(self._slots.get_nowait())
+        await self._close_browser()
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer() -> PdfRenderer:
+    """The process-wide renderer; the browser starts on the first render."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = PdfRenderer()
+            atexit.register(_renderer.shutdown)
+        return _renderer
+
+
+def render_pdf(html: str) -> bytes:
+    """Print a rendered report template to PDF bytes with the shared browser."""
+    return get_renderer().render(html)
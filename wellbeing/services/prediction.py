@@ -19,10 +19,16 @@ VALID_SEX = {'m', 'f'}
 VALID_YES_NO = {'yes', 'no'}
 
 
-def build_payload_from_entry(entry):
+def build_payload_from_entry(entry, answers=None):
     """
     Build the strict Feature 3 payload dict from a submitted entry.
 
+    Args:
+        entry:   WeeklyWellbeingEntry in SUBMITTED status.
+        answers: optional iterable of the entry's WeeklyWellbeingAnswer rows
+                 (with question loaded). Bulk callers pass prefetched rows
+                 to avoid one answer query per entry.
+
     Returns dict with keys: age_years, sex, jaundice, family_asd, a1..a10
 
     Raises ValidationError if:
@@ -69,7 +75,8 @@ def build_payload_from_entry(entry):
     }
 
     # Map answers by question code
-    answers = entry.answers.select_related('question').all()
+    if answers is None:
+        answers = entry.answers.select_related('question').all()
     answer_map = {ans.question.code.lower(): ans for ans in answers}
     expected_codes = [f'a{i}' for i in range(1, 11)]
     missing_flags = []
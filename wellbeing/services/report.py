@@ -0,0 +1,399 @@
+"""
+Report service for submitted weekly entries.
+
+Builds everything the entry report page and the PDF export show —
+prediction, explanation, parent narrative and SOAP note — and persists it
+in EntryReportCache. A SUBMITTED entry is immutable, so repeat views are
+answered from that row without running inference or calling Gemini.
+
+Gemini is never called inside a request: a new report is stored with the
+static fallback texts and a NarrativeJob row is queued. The worker
+(`python manage.py run_narrative_worker`) fills in the generated texts,
+and the report page polls report_status() until they arrive.
+
+Cache key: (entry, model_version, prompt_template_hash). Deploying a new
+model or changing the prompt wording therefore misses automatically; the
+stored inputs_hash catches the remaining inputs (child profile, trend
+history). Stale rows can be purged with:
+
+    python manage.py clear_report_cache
+"""
+
+import datetime
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ml.inference import ModelNotReadyError, get_model_version, run_inference
+from wellbeing.models import EntryReportCache, NarrativeJob, WeeklyWellbeingEntry
+from .explainability import build_explanation
+from .narrative import (
+    PROMPT_TEMPLATE_HASH, build_report_texts, gemini_configured, narrative_prompt, soap_prompt,
+)
+from .prediction import build_payload_from_entry
+
+# model_version recorded when the trained model is not deployed or the
+# entry cannot be scored, and the risk-count heuristic is shown instead.
+MOCK_MODEL_VERSION = 'mock-demo-v1'
+
+# Narrative job queue tuning (see run_narrative_worker).
+JOB_MAX_ATTEMPTS  = 3
+JOB_RETRY_SECONDS = 30     # first retry delay; doubles per attempt
+JOB_STALE_SECONDS = 300    # a RUNNING job older than this is retaken
+
+# build_report_texts part → EntryReportCache field.
+_TEXT_FIELDS = {'narrative': 'narrative_text', 'soap_note': 'soap_note'}
+
+TREND_DOMAINS = [
+    ('communication_score', 'communication'),
+    ('routines_score', 'routines'),
+    ('emotional_score', 'emotional_responses'),
+    ('sensory_score', 'sensory_behaviors'),
+]
+
+
+class _ReportPrediction:
+    """Minimal prediction object accepted by the narrative prompt builders."""
+
+    def __init__(self, exp, label, version):
+        self.explanation_json = exp
+        self.prediction_label = label
+        self.model_version = version
+
+
+def compute_trend_summary(entry) -> dict:
+    """
+    Compare the entry with up to three earlier submitted weeks.
+
+    Returns {'latest_overall': float|None, 'domain_trends': {domain: 'up'|'down'|'stable'}}.
+    """
+    past_entries = WeeklyWellbeingEntry.objects.filter(
+        child=entry.child, status='SUBMITTED', week_start__lte=entry.week_start
+    ).order_by('-week_start')[:4]
+
+    entries_list = list(past_entries)[::-1]
+    trend_summary = {'latest_overall': entry.overall_score, 'domain_trends': {}}
+    if len(entries_list) >= 2:
+        first = entries_list[0]
+        latest = entries_list[-1]
+        for f_field, d_name in TREND_DOMAINS:
+            v1 = getattr(first, f_field)
+            v2 = getattr(latest, f_field)
+            if v1 is not None and v2 is not None:
+                diff = v2 - v1
+                if diff >= 0.5:
+                    trend_summary['domain_trends'][d_name] = 'up'
+                elif diff <= -0.5:
+                    trend_summary['domain_trends'][d_name] = 'down'
+                else:
+                    trend_summary['domain_trends'][d_name] = 'stable'
+    return trend_summary
+
+
+def _mock_label(risk_score: int) -> str:
+    if risk_score <= 2:
+        return "Low Probability"
+    if risk_score <= 6:
+        return "Moderate Probability"
+    return "High Probability"
+
+
+def _current_model_version() -> str:
+    try:
+        return get_model_version()
+    except ModelNotReadyError:
+        return MOCK_MODEL_VERSION
+
+
+def _inputs_hash(payload, risk_score, trend_summary) -> str:
+    blob = json.dumps(
+        {'payload': payload, 'risk_score': risk_score, 'trend_summary': trend_summary},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def _report_from_row(row, pending: bool = False) -> dict:
+    return {
+        'risk_score':    row.risk_score,
+        'label':         row.prediction_label,
+        'confidence':    row.confidence,
+        'explanation':   row.explanation_json,
+        'narrative':     row.narrative_text,
+        'soap_note':     row.soap_note,
+        'model_version': row.model_version,
+        'texts_pending': pending,
+    }
+
+
+def _job_for(row):
+    try:
+        return row.narrative_job
+    except NarrativeJob.DoesNotExist:
+        return None
+
+
+def _fallback_texts(row) -> dict:
+    """The static narrative and SOAP note for a cached report row, by part."""
+    prediction = _ReportPrediction(row.explanation_json, row.prediction_label, row.model_version)
+    return {
+        'narrative': narrative_prompt(row.trend_summary, prediction)[1],
+        'soap_note': soap_prompt(row.trend_summary, prediction)[1],
+    }
+
+
+def _has_fallback_texts(row) -> bool:
+    return any(getattr(row, _TEXT_FIELDS[part]) == text for part, text in _fallback_texts(row).items())
+
+
+def _cached_row(entry, model_version):
+    return EntryReportCache.objects.filter(
+        entry=entry, model_version=model_version, prompt_template_hash=PROMPT_TEMPLATE_HASH,
+    ).select_related('narrative_job').first()
+
+
+def build_entry_report(entry) -> dict:
+    """
+    Return the report content for a SUBMITTED entry, from the cache when
+    possible. Never calls Gemini: a new report is stored with the static
+    fallback narrative and SOAP note and a NarrativeJob is queued for the
+    worker to replace them (poll report_status() for the result).
+
+    Returns:
+        {risk_score, label, confidence (0–100), explanation, narrative,
+         soap_note, model_version, texts_pending}
+
+    Without GEMINI_API_KEY the report is stored with the fallback texts
+    and nothing is queued; once a key is configured, the next view of such
+    a report queues the job.
+    """
+    try:
+        payload = build_payload_from_entry(entry)
+        risk_score = None
+        model_version = _current_model_version()
+    except ValidationError:
+        payload = None
+        risk_score = entry.answers.filter(binary_flag=1).count()
+        model_version = MOCK_MODEL_VERSION
+
+    trend_summary = compute_trend_summary(entry)
+    inputs_hash = _inputs_hash(payload, risk_score, trend_summary)
+
+    cached = _cached_row(entry, model_version)
+    if cached is not None and cached.inputs_hash == inputs_hash:
+        job = _job_for(cached)
+        if job is not None and job.status == 'FAILED':
+            job = enqueue_report_texts(cached)        # give Gemini another go
+        elif job is None and gemini_configured() and _has_fallback_texts(cached):
+            job = enqueue_report_texts(cached)        # stored before a key was set
+        return _report_from_row(cached, pending=job is not None and job.status != 'DONE')
+
+    # ── Prediction + explainability ────────────────────────────────────────
+    if payload is None:
+        explanation = {}
+        label = _mock_label(risk_score)
+        confidence = (risk_score / 10.0) * 100
+    else:
+        try:
+            result = run_inference(payload)
+            explanation = build_explanation(payload, result.get('shap_values'))
+            risk_score = explanation.get('risk_count', 0)
+            label = result['label']
+            confidence = result['score'] * 100
+            model_version = result['model_version']
+        except ModelNotReadyError:
+            explanation = build_explanation(payload)
+            risk_score = explanation.get('risk_count', 0)
+            label = _mock_label(risk_score)
+            confidence = (risk_score / 10.0) * 100
+            model_version = MOCK_MODEL_VERSION
+
+    # ── Narrative + SOAP: fallback now, Gemini in the background ───────────
+    prediction = _ReportPrediction(explanation, label, model_version)
+    narrative = narrative_prompt(trend_summary, prediction)[1]
+    soap_note = soap_prompt(trend_summary, prediction)[1]
+
+    report = {
+        'risk_score':    risk_score,
+        'label':         label,
+        'confidence':    confidence,
+        'explanation':   explanation,
+        'narrative':     narrative,
+        'soap_note':     soap_note,
+        'model_version': model_version,
+        'texts_pending': False,
+    }
+    row, _ = EntryReportCache.objects.update_or_create(
+        entry=entry,
+        model_version=model_version,
+        prompt_template_hash=PROMPT_TEMPLATE_HASH,
+        defaults={
+            'inputs_hash':      inputs_hash,
+            'prediction_label': label,
+            'confidence':       confidence,
+            'risk_score':       risk_score,
+            'explanation_json': explanation,
+            'trend_summary':    trend_summary,
+            'narrative_text':   narrative,
+            'soap_note':        soap_note,
+        },
+    )
+    if gemini_configured():
+        enqueue_report_texts(row)
+        report['texts_pending'] = True
+    return report
+
+
+def report_status(entry) -> dict:
+    """
+    Progress of an entry's narrative generation, for the report page to poll.
+
+    Returns {'status': 'pending'|'ready'|'failed'|'missing', 'narrative', 'soap_note'};
+    the texts are the fallback ones until status is 'ready'.
+    """
+    row = _cached_row(entry, _current_model_version())
+    if row is None:
+        row = _cached_row(entry, MOCK_MODEL_VERSION)
+    if row is None:
+        return {'status': 'missing', 'narrative': None, 'soap_note': None}
+
+    job = _job_for(row)
+    if job is None or job.status == 'DONE':
+        status = 'ready'
+    elif job.status == 'FAILED':
+        status = 'failed'
+    else:
+        status = 'pending'
+    return {'status': status, 'narrative': row.narrative_text, 'soap_note': row.soap_note}
+
+
+# ── Narrative job queue ───────────────────────────────────────────────────────
+
+def enqueue_report_texts(row) -> NarrativeJob:
+    """Queue (or re-queue) Gemini generation for a cached report row."""
+    job, _ = NarrativeJob.objects.update_or_create(
+        report=row,
+        defaults={
+            'status':     'PENDING',
+            'attempts':   0,
+            'run_after':  timezone.now(),
+            'started_at': None,
+            'last_error': None,
+        },
+    )
+    return job
+
+
+def claim_next_job():
+    """
+    Atomically take the oldest due job, or return None.
+
+    A RUNNING job whose worker has been silent for JOB_STALE_SECONDS is
+    assumed dead and taken over. The claim is a conditional UPDATE, so two
+    workers can never run the same job, on any database backend.
+    """
+    now = timezone.now()
+    due = (
+        Q(status='PENDING', run_after__lte=now)
+        | Q(status='RUNNING', started_at__lt=now - datetime.timedelta(seconds=JOB_STALE_SECONDS))
+    )
+    for job_id in NarrativeJob.objects.filter(due).order_by('run_after').values_list('id', flat=True)[:10]:
+        claimed = NarrativeJob.objects.filter(due, id=job_id).update(
+            status='RUNNING', started_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return NarrativeJob.objects.select_related('report').get(id=job_id)
+    return None
+
+
+def run_narrative_job(job) -> None:
+    """
+    Generate the narrative and SOAP note for a claimed job and store them.
+
+    A text that comes back as the fallback counts as a failed attempt; the
+    job is retried with exponential backoff up to JOB_MAX_ATTEMPTS times,
+    then marked FAILED (the report keeps its fallback text). Writes are
+    conditional, so a report rebuilt from new inputs meanwhile is left alone.
+    A report cached under older prompt templates is never served again, and
+    its texts can no longer be told from their fallbacks, so its job is
+    failed without calling Gemini.
+    """
+    row = job.report
+    if row.prompt_template_hash != PROMPT_TEMPLATE_HASH:
+        NarrativeJob.objects.filter(id=job.id, status='RUNNING', started_at=job.started_at).update(
+            updated_at=timezone.now(), status='FAILED',
+            last_error='Prompt templates changed; the report is rebuilt on its next view',
+        )
+        return
+    prediction = _ReportPrediction(row.explanation_json, row.prediction_label, row.model_version)
+    missing = []
+    try:
+        fallbacks = _fallback_texts(row)
+        # Only parts still at their fallback; others came back on an earlier attempt.
+        parts = [part for part, fallback in fallbacks.items()
+                 if getattr(row, _TEXT_FIELDS[part]) == fallback]
+        texts = build_report_texts(row.trend_summary, prediction, parts=parts) if parts else {}
+        updates = {}
+        for part, text in texts.items():
+            if text == fallbacks[part]:
+                missing.append(_TEXT_FIELDS[part])
+            else:
+                updates[_TEXT_FIELDS[part]] = text
+        if updates:
+            EntryReportCache.objects.filter(id=row.id, inputs_hash=row.inputs_hash).update(
+                updated_at=timezone.now(), **updates
+            )
+    except Exception as exc:
+        missing.append(f"error: {exc}")
+
+    if not missing:
+        changes = {'status': 'DONE', 'last_error': None}
+    elif job.attempts >= JOB_MAX_ATTEMPTS:
+        changes = {'status': 'FAILED', 'last_error': f"Gemini did not return: {', '.join(missing)}"}
+    else:
+        changes = {
+            'status':     'PENDING',
+            'run_after':  timezone.now() + datetime.timedelta(
+                seconds=JOB_RETRY_SECONDS * 2 ** (job.attempts - 1)
+            ),
+            'last_error': f"Gemini did not return: {', '.join(missing)}",
+        }
+    NarrativeJob.objects.filter(id=job.id, status='RUNNING', started_at=job.started_at).update(
+        updated_at=timezone.now(), **changes
+    )
+
+
+def process_narrative_jobs(limit: int = None) -> int:
+    """Run due jobs until none are left (or `limit` ran). Returns how many ran."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_narrative_job(job)
+        processed += 1
+    return processed
+
+
+def invalidate_entry_reports(entry_ids=None, stale_only: bool = False) -> int:
+    """
+    Delete cached reports. Returns the number of rows removed.
+
+    Args:
+        entry_ids:  restrict to these entries (default: all).
+        stale_only: keep rows for the serving model version and current
+                    prompt templates; delete everything else.
+    """
+    qs = EntryReportCache.objects.all()
+    if entry_ids is not None:
+        qs = qs.filter(entry_id__in=entry_ids)
+    if stale_only:
+        qs = qs.exclude(
+            model_version=_current_model_version(),
+            prompt_template_hash=PROMPT_TEMPLATE_HASH,
+        )
+    deleted, _ = qs.delete()
+    return deleted
@@ -694,3 +694,895 @@ class PredictionPipelineTest(TestCase):
         
         # No DB rows were created
         self.assertEqual(PredictionResult.objects.count(), initial_pred_count)
+
+
+class InferenceLookupTableTest(TestCase):
+    """Precomputed prediction + SHAP table must agree with the full model path."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import tempfile
+        from ml import inference
+        cls.table_dir = tempfile.mkdtemp()
+        # One age band keeps the build quick while exercising every other bit.
+        inference.build_lookup_table(out_dir=cls.table_dir, age_min=5, age_max=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        import shutil
+        shutil.rmtree(cls.table_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def _payload(self, **overrides):
+        payload = {'age_years': 5, 'sex': 'f', 'jaundice': 'yes', 'family_asd': 'no'}
+        payload.update({f'a{i}': i % 2 for i in range(1, 11)})
+        payload.update(overrides)
+        return payload
+
+    def test_pack_key_round_trips_enumerated_space(self):
+        from ml import lookup_table
+        columns = lookup_table.enumerate_space(5, 5)
+        for key in (0, 1, 1023, 1024, 4321, 8191):
+            row = {field: values[key] for field, values in columns.items()}
+            row['age_years'] = int(row['age_years'])
+            row.update({f'a{i}': int(row[f'a{i}']) for i in range(1, 11)})
+            self.assertEqual(lookup_table.pack_key(row, 5, 5), key)
+
+    def test_pack_key_rejects_payloads_outside_space(self):
+        from ml import lookup_table
+        self.assertIsNone(lookup_table.pack_key(self._payload(age_years=19)))
+        self.assertIsNone(lookup_table.pack_key(self._payload(age_years=5.0)))
+        self.assertIsNone(lookup_table.pack_key(self._payload(sex='x')))
+        self.assertIsNone(lookup_table.pack_key(self._payload(a3=2)))
+
+    def test_lookup_matches_full_model(self):
+        from ml import inference, lookup_table
+        model = inference._get_model()
+        table = lookup_table.LookupTable.open(self.table_dir, expected=model.fingerprint)
+        self.assertIsNotNone(table)
+
+        saved = model.lookup
+        try:
+            for overrides in ({}, {'sex': 'm', 'a1': 1}, {'family_asd': 'yes', 'a10': 1}):
+                payload = self._payload(**overrides)
+                model.lookup = None
+                slow = inference.run_inference(payload)
+                model.lookup = table
+                fast = inference.run_inference(payload)
+
+                self.assertEqual(fast['label'], slow['label'])
+                self.assertAlmostEqual(fast['score'], slow['score'], places=12)
+                self.assertEqual(fast['shap_values'].keys(), slow['shap_values'].keys())
+                for feature, value in slow['shap_values'].items():
+                    self.assertAlmostEqual(fast['shap_values'][feature], value, places=5)
+        finally:
+            model.lookup = saved
+
+    def test_stale_table_is_ignored(self):
+        from ml import lookup_table
+        table = lookup_table.LookupTable.open(self.table_dir, expected={'model_sha256': 'not-the-model'})
+        self.assertIsNone(table)
+
+    def test_batch_mixes_table_hits_and_model_rows_in_order(self):
+        from ml import inference, lookup_table
+        model = inference._get_model()
+        table = lookup_table.LookupTable.open(self.table_dir, expected=model.fingerprint)
+        payloads = [self._payload(), self._payload(age_years=7), self._payload(sex='m')]
+
+        saved = model.lookup
+        try:
+            model.lookup = None
+            expected = [inference.run_inference(p) for p in payloads]
+            model.lookup = table
+            results = inference.run_inference_batch(payloads)
+        finally:
+            model.lookup = saved
+
+        self.assertEqual(len(results), len(payloads))
+        for got, want in zip(results, expected):
+            self.assertEqual(got['label'], want['label'])
+            self.assertAlmostEqual(got['score'], want['score'], places=12)
+
+
+class InferenceBatchTest(TestCase):
+    """run_inference_batch must return the same per-row dicts as run_inference."""
+
+    def test_batch_matches_single_row_inference(self):
+        from ml import inference
+        payloads = []
+        for age in (2, 9, 17):
+            for sex in ('m', 'f'):
+                payload = {'age_years': age, 'sex': sex, 'jaundice': 'no', 'family_asd': 'yes'}
+                payload.update({f'a{i}': (i + age) % 2 for i in range(1, 11)})
+                payloads.append(payload)
+
+        model = inference._get_model()
+        saved = model.lookup
+        try:
+            model.lookup = None  # exercise the model path, not the table
+            results = inference.run_inference_batch(payloads)
+            singles = [inference.run_inference(p) for p in payloads]
+        finally:
+            model.lookup = saved
+
+        self.assertEqual(len(results), len(payloads))
+        for got, want in zip(results, singles):
+            self.assertEqual(got['label'], want['label'])
+            self.assertEqual(got['model_version'], want['model_version'])
+            self.assertAlmostEqual(got['score'], want['score'], places=12)
+            self.assertEqual(got['shap_values'].keys(), want['shap_values'].keys())
+            for feature, value in want['shap_values'].items():
+                self.assertAlmostEqual(got['shap_values'][feature], value, places=9)
+
+    def test_empty_batch(self):
+        from ml import inference
+        self.assertEqual(inference.run_inference_batch([]), [])
+
+
+class RepredictCommandTest(TestCase):
+    """Tests for the bulk `manage.py repredict` command."""
+
+    def setUp(self):
+        self.caregiver = User.objects.create_user(username='repredict_cg', password='pw', role='CAREGIVER')
+        self.child = ChildProfile.objects.create(
+            name='RepredictKid', date_of_birth=datetime.date(2019, 4, 10),
+            sex='f', jaundice='no', family_asd='yes'
+        )
+        CaregiverChild.objects.create(caregiver=self.caregiver, child=self.child)
+        questions = [
+            WellbeingQuestion.objects.create(code=f'A{i}', domain='routines', text=f'Q{i}', order=i)
+            for i in range(1, 11)
+        ]
+
+        self.entries = []
+        for week in range(3):
+            week_start = datetime.date(2025, 6, 2) + datetime.timedelta(weeks=week)
+            entry = WeeklyWellbeingEntry.objects.create(
+                caregiver=self.caregiver, child=self.child,
+                week_start=week_start, week_end=week_start + datetime.timedelta(days=6),
+                status='SUBMITTED', submitted_at=timezone.now(),
+            )
+            for q in questions:
+                WeeklyWellbeingAnswer.objects.create(entry=entry, question=q, slider_score=week)
+            self.entries.append(entry)
+
+        # A DRAFT entry must never be scored
+        WeeklyWellbeingEntry.objects.create(
+            caregiver=self.caregiver, child=self.child,
+            week_start=datetime.date(2025, 5, 26), week_end=datetime.date(2025, 6, 1),
+        )
+
+    def _run(self, **options):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('repredict', workers=1, stdout=out, **options)
+        return out.getvalue()
+
+    def test_scores_every_submitted_entry(self):
+        from .models import PredictionResult
+        output = self._run(batch_size=2)
+        self.assertIn('rows/s', output)
+        preds = PredictionResult.objects.order_by('entry_id')
+        self.assertEqual([p.entry_id for p in preds], [e.id for e in self.entries])
+        for pred in preds:
+            self.assertIn(pred.prediction_label, ['Low Probability', 'High Probability'])
+            self.assertIn('rf-v1', pred.model_version)
+            self.assertIn('risk_flags', pred.explanation_json)
+
+    def test_rerun_updates_existing_rows(self):
+        from .models import PredictionResult
+        stale = PredictionResult.objects.create(
+            caregiver=self.caregiver, child=self.child, entry=self.entries[0],
+            prediction_label='Model not trained yet', model_version='stub-v1',
+        )
+        self._run()
+        self._run()
+        self.assertEqual(PredictionResult.objects.count(), len(self.entries))
+        stale.refresh_from_db()
+        self.assertNotEqual(stale.model_version, 'stub-v1')
+
+    def test_resumes_from_checkpoint(self):
+        import json, os, tempfile
+        from ml.inference import get_model_version
+        from .models import PredictionResult
+        fd, checkpoint = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        with open(checkpoint, 'w') as f:
+            json.dump({
+                'model_version': get_model_version(), 'since': None,
+                'last_entry_id': self.entries[0].id, 'written': 1,
+            }, f)
+
+        output = self._run(checkpoint=checkpoint)
+        self.assertIn('Resuming after entry', output)
+        self.assertEqual(
+            set(PredictionResult.objects.values_list('entry_id', flat=True)),
+            {e.id for e in self.entries[1:]},
+        )
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_rejects_unexpected_model_version(self):
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            self._run(model_version='rf-v999')
+
+
+class ModelRegistryTest(TestCase):
+    """Versioned registry: activation, hot-swap, and checksum protection."""
+
+    def setUp(self):
+        import tempfile
+        from unittest.mock import patch
+        from ml import inference
+
+        self.registry_dir = tempfile.mkdtemp()
+        patcher = patch('ml.registry.REGISTRY_DIR', self.registry_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Start from a cold worker that re-checks ACTIVE on every request.
+        self._saved = (inference._active, inference.RELOAD_CHECK_SECONDS)
+        inference._active = None
+        inference.RELOAD_CHECK_SECONDS = 0
+
+        self.payload = {'age_years': 6, 'sex': 'm', 'jaundice': 'no', 'family_asd': 'no'}
+        self.payload.update({f'a{i}': 1 for i in range(1, 11)})
+
+    def tearDown(self):
+        import shutil
+        from ml import inference
+        inference._active, inference.RELOAD_CHECK_SECONDS = self._saved
+        shutil.rmtree(self.registry_dir, ignore_errors=True)
+
+    def _register(self, version):
+        from ml import inference, registry
+        return registry.register(
+            version, inference.MODEL_PATH, inference.SCHEMA_PATH, inference.EXPLAINER_PATH
+        )
+
+    def test_serves_active_version(self):
+        from ml import inference, registry
+        manifest = self._register('rf-v1.1')
+        self.assertEqual(set(manifest['files']), {'model.pkl', 'shap_explainer.pkl', 'feature_schema.json'})
+        registry.activate('rf-v1.1')
+
+        self.assertEqual(inference.run_inference(self.payload)['model_version'], 'rf-v1.1')
+
+    def test_hot_swap_keeps_old_model_for_in_flight_requests(self):
+        from ml import inference, registry
+        self._register('rf-a')
+        self._register('rf-b')
+        registry.activate('rf-a')
+        old_model = inference._get_model()
+
+        registry.activate('rf-b')
+        self.assertEqual(inference.run_inference(self.payload)['model_version'], 'rf-b')
+        # A request that grabbed the old model before the swap can still finish.
+        self.assertEqual(old_model.version, 'rf-a')
+        self.assertIsNotNone(old_model.pipeline)
+
+    def test_corrupted_version_is_rejected(self):
+        import os
+        from ml import inference, registry
+        self._register('rf-good')
+        self._register('rf-bad')
+        registry.activate('rf-good')
+        inference.run_inference(self.payload)
+
+        with open(os.path.join(self.registry_dir, 'rf-bad', 'feature_schema.json'), 'a') as f:
+            f.write(' ')
+        with self.assertRaises(registry.RegistryError):
+            registry.activate('rf-bad')
+
+        # Even if ACTIVE is pointed at it by hand, workers keep the good model.
+        with open(os.path.join(self.registry_dir, 'ACTIVE'), 'w') as f:
+            f.write('rf-bad\n')
+        self.assertEqual(inference.run_inference(self.payload)['model_version'], 'rf-good')
+
+    def test_duplicate_version_rejected(self):
+        from ml import registry
+        self._register('rf-dup')
+        with self.assertRaises(registry.RegistryError):
+            self._register('rf-dup')
+
+    def test_prediction_result_records_registry_version(self):
+        from ml import registry
+        from .models import PredictionResult
+        self._register('rf-canary')
+        registry.activate('rf-canary')
+
+        caregiver = User.objects.create_user(username='registry_cg', password='pw', role='CAREGIVER')
+        child = ChildProfile.objects.create(
+            name='RegistryKid', date_of_birth=datetime.date(2019, 1, 1),
+            sex='m', jaundice='no', family_asd='no'
+        )
+        CaregiverChild.objects.create(caregiver=caregiver, child=child)
+        entry = WeeklyWellbeingEntry.objects.create(
+            caregiver=caregiver, child=child,
+            week_start=datetime.date(2025, 6, 2), week_end=datetime.date(2025, 6, 8),
+            status='SUBMITTED', submitted_at=timezone.now(),
+        )
+        for i in range(1, 11):
+            q = WellbeingQuestion.objects.create(code=f'A{i}', domain='routines', text=f'Q{i}', order=i)
+            WeeklyWellbeingAnswer.objects.create(entry=entry, question=q, slider_score=3)
+
+        self.client.login(username='registry_cg', password='pw')
+        resp = self.client.post(reverse('wellbeing_predict_entry', args=[entry.id]))
+        self.assertEqual(resp.json()['model_version'], 'rf-canary')
+        self.assertEqual(PredictionResult.objects.get(entry=entry).model_version, 'rf-canary')
+
+
+class CompiledForestTest(TestCase):
+    """The NumPy forest evaluator must match sklearn's predict_proba."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import pandas as pd
+        from ml import inference, lookup_table
+        model = inference._get_model()
+        cls.pipeline = model.pipeline
+        cls.compiled = model.compiled
+        cls.feature_order = model.schema['features']
+
+        # Every 29th row of the full input space: all ages, all bit patterns.
+        columns = lookup_table.enumerate_space()
+        cls.df = pd.DataFrame(
+            {f: columns[f][::29] for f in cls.feature_order}, columns=cls.feature_order
+        )
+        cls.rows = cls.df.to_dict('records')
+
+    def test_pipeline_compiles(self):
+        self.assertIsNotNone(self.compiled)
+        self.assertEqual(self.compiled.forest.n_trees, len(self.pipeline[-1].estimators_))
+
+    def test_transform_matches_column_transformer(self):
+        import numpy as np
+        expected = self.pipeline.named_steps['prep'].transform(self.df)
+        np.testing.assert_array_equal(self.compiled.transform(self.rows), expected)
+
+    def test_predict_proba_parity_with_sklearn(self):
+        import numpy as np
+        expected = self.pipeline.predict_proba(self.df)
+        got = self.compiled.predict_proba(self.compiled.transform(self.rows))
+        np.testing.assert_allclose(got, expected, rtol=0, atol=1e-9)
+
+    def test_unknown_category_uses_encoded_value(self):
+        import numpy as np
+        import pandas as pd
+        row = dict(self.rows[0], sex='x')
+        expected = self.pipeline.predict_proba(pd.DataFrame([row], columns=self.feature_order))
+        got = self.compiled.predict_proba(self.compiled.transform([row]))
+        np.testing.assert_allclose(got, expected, rtol=0, atol=1e-9)
+
+    def test_unsupported_pipeline_is_rejected(self):
+        from sklearn.pipeline import Pipeline
+        from sklearn.linear_model import LogisticRegression
+        from ml import forest
+        pipe = Pipeline([('prep', self.pipeline.named_steps['prep']), ('clf', LogisticRegression())])
+        with self.assertRaises(forest.UnsupportedPipelineError):
+            forest.CompiledPipeline.compile(pipe)
+
+
+class TreeShapTest(TestCase):
+    """In-repo TreeSHAP must match the pickled shap.TreeExplainer."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import joblib
+        from ml import inference, lookup_table
+        model = inference._get_model()
+        cls.model = model
+        cls.compiled = model.compiled
+
+        # Every 97th row of the full input space.
+        columns = lookup_table.enumerate_space()
+        rows = [
+            {f: columns[f][i] for f in model.schema['features']}
+            for i in range(0, len(columns['age_years']), 97)
+        ]
+        cls.X = cls.compiled.transform(rows)
+        cls.reference = joblib.load(inference.EXPLAINER_PATH)
+
+    def test_serving_model_uses_in_repo_treeshap(self):
+        from ml import treeshap
+        self.assertIsInstance(self.model.explainer, treeshap.TreeShap)
+
+    def test_parity_with_shap_explainer(self):
+        import numpy as np
+        from ml.inference import _shap_matrix
+        expected = _shap_matrix(self.reference, self.X)
+        got = self.model.explainer.shap_values(self.X)
+        np.testing.assert_allclose(got, expected, rtol=0, atol=1e-9)
+        self.assertAlmostEqual(
+            self.model.explainer.expected_value,
+            float(np.asarray(self.reference.expected_value)[1]),
+            places=9,
+        )
+
+    def test_values_sum_to_prediction(self):
+        import numpy as np
+        explainer = self.model.explainer
+        total = explainer.shap_values(self.X).sum(axis=1) + explainer.expected_value
+        np.testing.assert_allclose(total, self.compiled.predict_proba(self.X)[:, 1], rtol=0, atol=1e-9)
+
+    def test_zero_cover_forest_is_rejected(self):
+        import copy
+        from ml import treeshap
+        forest = copy.copy(self.compiled.forest)
+        forest.cover = forest.cover.copy()
+        forest.cover[0] = 0.0
+        with self.assertRaises(ValueError):
+            treeshap.TreeShap(forest)
+
+
+class EntryReportCacheTest(TestCase):
+    """Report content is cached per (entry, model, prompts); Gemini texts come from the job queue."""
+
+    def setUp(self):
+        from unittest.mock import patch
+        self.caregiver = User.objects.create_user(username='cache_cg', password='pw', role='CAREGIVER')
+        self.child = ChildProfile.objects.create(
+            name='CacheKid', date_of_birth=datetime.date(2019, 4, 2),
+            sex='f', jaundice='no', family_asd='yes'
+        )
+        CaregiverChild.objects.create(caregiver=self.caregiver, child=self.child)
+        for i in range(1, 11):
+            WellbeingQuestion.objects.create(code=f'A{i}', domain='communication', text=f'Q{i}', order=i)
+
+        self.entry = WeeklyWellbeingEntry.objects.create(
+            caregiver=self.caregiver, child=self.child,
+            week_start=datetime.date(2025, 6, 2), week_end=datetime.date(2025, 6, 8),
+            status='SUBMITTED', submitted_at=timezone.now(),
+        )
+        for q in WellbeingQuestion.objects.all():
+            WeeklyWellbeingAnswer.objects.create(
+                entry=self.entry, question=q, slider_score=1, binary_flag=int(q.order % 2)
+            )
+
+        self.gemini_calls = []
+
+        def fake_gemini(prompt, fallback_text="", deadline=None):
+            # Both texts are requested concurrently, so number them per kind.
+            kind = 'soap' if 'medical scribe' in prompt else 'narrative'
+            self.gemini_calls.append(kind)
+            return f"generated {kind} #{self.gemini_calls.count(kind)}"
+
+        for target, kwargs in (
+            ('wellbeing.services.narrative.call_gemma_model', {'side_effect': fake_gemini}),
+            ('wellbeing.services.narrative.gemini_configured', {'return_value': True}),
+            ('wellbeing.services.report.gemini_configured', {'return_value': True}),
+        ):
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client = Client()
+        self.client.login(username='cache_cg', password='pw')
+
+    def _view(self):
+        resp = self.client.get(reverse('wellbeing_entry_report', args=[self.entry.id]))
+        self.assertEqual(resp.status_code, 200)
+        return resp
+
+    def _status(self):
+        return self.client.get(reverse('wellbeing_entry_report_status', args=[self.entry.id])).json()
+
+    def test_first_view_renders_fallback_and_queues_job(self):
+        from wellbeing.models import NarrativeJob
+        resp = self._view()
+        self.assertEqual(self.gemini_calls, [])
+        self.assertTrue(resp.context['texts_pending'])
+        self.assertIn('Disclaimer: AutiBloom', resp.context['narrative'])
+        self.assertEqual(NarrativeJob.objects.get(report__entry=self.entry).status, 'PENDING')
+        self.assertEqual(self._status()['status'], 'pending')
+
+    def test_worker_fills_texts_and_repeat_view_is_cached(self):
+        from unittest.mock import patch
+        from wellbeing.services.report import process_narrative_jobs
+        first = self._view()
+        self.assertEqual(process_narrative_jobs(), 1)
+        self.assertEqual(len(self.gemini_calls), 2)
+
+        status = self._status()
+        self.assertEqual(status['status'], 'ready')
+        self.assertEqual(status['narrative'], 'generated narrative #1')
+        self.assertEqual(status['soap_note'], 'generated soap #1')
+
+        with patch('wellbeing.services.report.run_inference') as run:
+            second = self._view()
+        run.assert_not_called()
+        self.assertFalse(second.context['texts_pending'])
+        self.assertEqual(second.context['narrative'], 'generated narrative #1')
+        for key in ('mock_label', 'mock_confidence', 'risk_score', 'explanation'):
+            self.assertEqual(second.context[key], first.context[key])
+        self.assertEqual(process_narrative_jobs(), 0)
+
+    def test_job_is_claimed_once(self):
+        from wellbeing.services.report import claim_next_job
+        self._view()
+        self.assertIsNotNone(claim_next_job())
+        self.assertIsNone(claim_next_job())
+
+    def test_failed_generation_retries_then_fails(self):
+        from unittest.mock import patch
+        from wellbeing.models import NarrativeJob
+        from wellbeing.services import report
+        self._view()
+        job = NarrativeJob.objects.get(report__entry=self.entry)
+        with patch('wellbeing.services.narrative.call_gemma_model', side_effect=lambda p, f, d: f):
+            for attempt in range(1, report.JOB_MAX_ATTEMPTS + 1):
+                NarrativeJob.objects.filter(id=job.id).update(run_after=timezone.now())
+                self.assertEqual(report.process_narrative_jobs(), 1)
+                job.refresh_from_db()
+                self.assertEqual(job.attempts, attempt)
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(self._status()['status'], 'failed')
+
+        # Viewing the report again gives Gemini another chance.
+        self.assertTrue(self._view().context['texts_pending'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('PENDING', 0))
+
+    def test_without_gemini_key_report_is_cached_without_job(self):
+        from unittest.mock import patch
+        from wellbeing.models import EntryReportCache, NarrativeJob
+        with patch('wellbeing.services.report.gemini_configured', return_value=False):
+            resp = self._view()
+            self.assertFalse(resp.context['texts_pending'])
+            self.assertIn('Disclaimer: AutiBloom', resp.context['narrative'])
+            self.assertEqual(EntryReportCache.objects.filter(entry=self.entry).count(), 1)
+            self.assertFalse(NarrativeJob.objects.exists())
+
+            with patch('wellbeing.services.report.run_inference') as run:
+                again = self._view()
+            run.assert_not_called()
+            self.assertFalse(again.context['texts_pending'])
+            self.assertFalse(NarrativeJob.objects.exists())
+
+        # A key configured later: the stored fallback texts get generated.
+        self.assertTrue(self._view().context['texts_pending'])
+        self.assertEqual(NarrativeJob.objects.get(report__entry=self.entry).status, 'PENDING')
+
+    def test_prompt_template_change_misses(self):
+        from unittest.mock import patch
+        from wellbeing.models import EntryReportCache
+        self._view()
+        with patch('wellbeing.services.report.PROMPT_TEMPLATE_HASH', 'changed'):
+            self._view()
+        self.assertEqual(EntryReportCache.objects.filter(entry=self.entry).count(), 2)
+
+    def test_job_for_report_with_old_templates_is_dropped(self):
+        from unittest.mock import patch
+        from wellbeing.models import EntryReportCache, NarrativeJob
+        from wellbeing.services import report
+        self._view()
+        old = EntryReportCache.objects.get(entry=self.entry)
+        # A deploy changes the templates (fallbacks included) while the job is queued.
+        with patch('wellbeing.services.report.PROMPT_TEMPLATE_HASH', 'changed'):
+            self.assertEqual(report.process_narrative_jobs(), 1)
+            self.assertEqual(self.gemini_calls, [])
+            job = NarrativeJob.objects.get(report=old)
+            self.assertEqual(job.status, 'FAILED')
+            old.refresh_from_db()
+            self.assertIn('Disclaimer: AutiBloom', old.narrative_text)
+
+            # The next view builds a report under the new templates and queues it.
+            self.assertTrue(self._view().context['texts_pending'])
+            self.assertEqual(report.process_narrative_jobs(), 1)
+            self.assertEqual(self._status()['narrative'], 'generated narrative #1')
+
+    def test_fallback_templates_are_part_of_the_template_hash(self):
+        import hashlib
+        from wellbeing.services import narrative
+        parts = [narrative.SOAP_PROMPT, narrative.SOAP_FALLBACK,
+                 narrative.NARRATIVE_PROMPT, narrative.NARRATIVE_FALLBACK] + narrative.GEMINI_MODELS
+        self.assertEqual(narrative.PROMPT_TEMPLATE_HASH,
+                         hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:16])
+
+    def test_profile_change_rebuilds(self):
+        from wellbeing.models import EntryReportCache
+        from wellbeing.services.report import process_narrative_jobs
+        self._view()
+        process_narrative_jobs()
+        self.child.family_asd = 'no'
+        self.child.save()
+        resp = self._view()
+        self.assertTrue(resp.context['texts_pending'])
+        self.assertEqual(EntryReportCache.objects.filter(entry=self.entry).count(), 1)
+        self.assertEqual(process_narrative_jobs(), 1)
+        self.assertEqual(self._status()['narrative'], 'generated narrative #2')
+
+    def test_clear_report_cache_command(self):
+        import io
+        from django.core.management import call_command
+        from wellbeing.models import EntryReportCache
+        from wellbeing.services.narrative import PROMPT_TEMPLATE_HASH
+        self._view()
+        current = EntryReportCache.objects.get(entry=self.entry)
+        EntryReportCache.objects.create(
+            entry=self.entry, model_version='old-model', prompt_template_hash=PROMPT_TEMPLATE_HASH,
+            inputs_hash='x', prediction_label='Low Probability', confidence=1.0, risk_score=0,
+            narrative_text='old', soap_note='old',
+        )
+
+        call_command('clear_report_cache', stdout=io.StringIO())
+        self.assertEqual(list(EntryReportCache.objects.values_list('id', flat=True)), [current.id])
+
+        call_command('clear_report_cache', '--all', stdout=io.StringIO())
+        self.assertFalse(EntryReportCache.objects.exists())
+
+    def test_export_pdf_uses_shared_renderer(self):
+        from unittest.mock import patch
+        from wellbeing.services.report import process_narrative_jobs
+        self._view()
+        process_narrative_jobs()
+        with patch('wellbeing.views.render_pdf', return_value=b'%PDF-1.7') as render:
+            resp = self.client.get(reverse('wellbeing_entry_export_pdf', args=[self.entry.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/pdf')
+        self.assertEqual(resp.content, b'%PDF-1.7')
+        self.assertIn('window.__reportReady', render.call_args.args[0])
+        self.assertIn('generated narrative #1', render.call_args.args[0])
+
+    def test_export_pdf_never_bakes_in_pending_texts(self):
+        from unittest.mock import patch
+        from wellbeing.services.report import process_narrative_jobs
+        self.assertContains(self._view(), 'id="exportPdfLink"')
+        with patch('wellbeing.views.render_pdf', return_value=b'%PDF-1.7') as render:
+            resp = self.client.get(reverse('wellbeing_entry_export_pdf', args=[self.entry.id]))
+            render.assert_not_called()
+            # Answered at once; the report page's status polling enables the export.
+            self.assertRedirects(resp, reverse('wellbeing_entry_report', args=[self.entry.id]),
+                                 fetch_redirect_response=False)
+
+            process_narrative_jobs()
+            resp = self.client.get(reverse('wellbeing_entry_export_pdf', args=[self.entry.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('generated narrative #1', render.call_args.args[0])
+
+    def test_export_pdf_for_clinician_is_retried_later(self):
+        from unittest.mock import patch
+        from appointments.models import Appointment
+        clinician = User.objects.create_user(username='cache_cl', password='pw', role='CLINICIAN',
+                                             clinician_verified=True)
+        Appointment.objects.create(caregiver=self.caregiver, child=self.child, clinician=clinician,
+                                   entry=self.entry, status='CONFIRMED', reason_type='CASUAL',
+                                   preferred_time_window='ANY')
+        self._view()
+        viewer = Client()
+        viewer.login(username='cache_cl', password='pw')
+        with patch('wellbeing.views.render_pdf') as render:
+            resp = viewer.get(reverse('wellbeing_entry_export_pdf', args=[self.entry.id]))
+        render.assert_not_called()
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp['Retry-After'], '60')
+
+    def test_worker_command_once(self):
+        import io
+        from django.core.management import call_command
+        self._view()
+        out = io.StringIO()
+        call_command('run_narrative_worker', '--once', stdout=out)
+        self.assertIn('Processed 1 job(s).', out.getvalue())
+        self.assertEqual(self._status()['status'], 'ready')
+
+
+class ReportTextsTest(TestCase):
+    """Shared Gemini client, per-model circuit breaker and concurrent report texts."""
+
+    def setUp(self):
+        from types import SimpleNamespace
+        from unittest.mock import MagicMock, patch
+        from autibloom.circuit_breaker import CircuitBreaker
+        from wellbeing.services import narrative
+        self.narrative = narrative
+        self.genai_client = MagicMock()
+        self.generate = self.genai_client.models.generate_content
+        self.client_factory = MagicMock(return_value=self.genai_client)
+
+        for target, kwargs in (
+            ('wellbeing.services.narrative.genai.Client', {'new': self.client_factory}),
+            ('wellbeing.services.narrative._client', {'new': None}),
+            ('wellbeing.services.narrative._breakers',
+             {'new': {m: CircuitBreaker(narrative.BREAKER_FAILURE_THRESHOLD,
+                                        narrative.BREAKER_COOLDOWN_SECONDS)
+                      for m in narrative.GEMINI_MODELS}}),
+        ):
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict('os.environ', {'GEMINI_API_KEY': 'test-key'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.trend = {'latest_overall': 2.5, 'domain_trends': {'communication': 'up'}}
+        self.prediction = SimpleNamespace(prediction_label='Low Probability', explanation_json={})
+
+    def test_client_is_created_once(self):
+        from types import SimpleNamespace as NS
+        self.generate.return_value = NS(text='ok')
+        for _ in range(3):
+            self.assertEqual(self.narrative.call_gemma_model('prompt'), 'ok')
+        self.client_factory.assert_called_once_with(api_key='test-key')
+
+    def test_failing_model_is_skipped_once_breaker_opens(self):
+        from types import SimpleNamespace as NS
+        first = self.narrative.GEMINI_MODELS[0]
+
+        def generate(model, contents, config):
+            if model == first:
+                raise RuntimeError('503')
+            return NS(text=f'from {model}')
+
+        self.generate.side_effect = generate
+        for _ in range(self.narrative.BREAKER_FAILURE_THRESHOLD + 2):
+            self.assertEqual(self.narrative.call_gemma_model('prompt'),
+                             f'from {self.narrative.GEMINI_MODELS[1]}')
+        tried_first = [c for c in self.generate.call_args_list if c.kwargs['model'] == first]
+        self.assertEqual(len(tried_first), self.narrative.BREAKER_FAILURE_THRESHOLD)
+
+    def test_half_open_breaker_lets_one_trial_through(self):
+        import threading
+        from types import SimpleNamespace as NS
+        from unittest.mock import patch
+        first = self.narrative.GEMINI_MODELS[0]
+        breaker = self.narrative._breakers[first]
+        clock = [1000.0]
+        with patch('autibloom.circuit_breaker.time.monotonic', lambda: clock[0]):
+            for _ in range(self.narrative.BREAKER_FAILURE_THRESHOLD):
+                breaker.record_failure()
+            clock[0] += self.narrative.BREAKER_COOLDOWN_SECONDS
+            self.assertEqual(breaker.state, 'half-open')
+
+            trial_started, release = threading.Event(), threading.Event()
+            self.addCleanup(release.set)
+
+            def generate(model, contents, config):
+                if model == first:
+                    trial_started.set()
+                    release.wait(5)
+                return NS(text=f'from {model}')
+
+            self.generate.side_effect = generate
+            trial = self.narrative._executor.submit(self.narrative.call_gemma_model, 'prompt')
+            self.assertTrue(trial_started.wait(5))
+            # Concurrent calls skip the model while its trial is in flight.
+            for _ in range(3):
+                self.assertEqual(self.narrative.call_gemma_model('prompt'),
+                                 f'from {self.narrative.GEMINI_MODELS[1]}')
+            release.set()
+            self.assertEqual(trial.result(5), f'from {first}')
+            self.assertEqual(breaker.state, 'closed')
+        tried_first = [c for c in self.generate.call_args_list if c.kwargs['model'] == first]
+        self.assertEqual(len(tried_first), 1)
+
+    def test_texts_are_requested_concurrently(self):
+        import time
+        from types import SimpleNamespace as NS
+
+        def slow(model, contents, config):
+            time.sleep(0.3)
+            return NS(text='soap' if 'medical scribe' in contents else 'narrative')
+
+        self.generate.side_effect = slow
+        started = time.monotonic()
+        texts = self.narrative.build_report_texts(self.trend, self.prediction)
+        self.assertLess(time.monotonic() - started, 0.55)
+        self.assertEqual(texts, {'narrative': 'narrative', 'soap_note': 'soap'})
+        # Each call is capped to what is left of the shared deadline.
+        for c in self.generate.call_args_list:
+            self.assertLessEqual(c.kwargs['config'].http_options.timeout,
+                                 self.narrative.REPORT_DEADLINE_SECONDS * 1000)
+
+    def test_deadline_returns_fallback(self):
+        import threading
+        from types import SimpleNamespace as NS
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def generate(model, contents, config):
+            if 'medical scribe' in contents:
+                release.wait(5)
+            return NS(text='generated')
+
+        self.generate.side_effect = generate
+        texts = self.narrative.build_report_texts(self.trend, self.prediction, timeout=1.5)
+        _, soap_fallback = self.narrative.soap_prompt(self.trend, self.prediction)
+        self.assertEqual(texts, {'narrative': 'generated', 'soap_note': soap_fallback})
+
+
+class PdfRendererTest(TestCase):
+    """Browser pool behind entry_export_pdf, driven with fake Playwright objects."""
+
+    def setUp(self):
+        self.launches = 0
+        self.contexts = []
+        test = self
+
+        class FakePage:
+            def __init__(self):
+                self.closed = False
+                self.fail = False
+            def is_closed(self):
+                return self.closed
+            async def set_content(self, html, wait_until):
+                if self.fail:
+                    raise RuntimeError('page crashed')
+            async def wait_for_function(self, expression, timeout):
+                assert expression == 'window.__reportReady === true'
+            async def pdf(self, **options):
+                return b'%PDF-' + str(len(test.contexts)).encode()
+
+        class FakeContext:
+            def __init__(self):
+                self.closed = False
+                test.contexts.append(self)
+            async def new_page(self):
+                self.page = FakePage()
+                return self.page
+            async def close(self):
+                self.closed = True
+
+        class FakeBrowser:
+            def __init__(self):
+                self.connected = True
+            def is_connected(self):
+                return self.connected
+            async def new_context(self):
+                return FakeContext()
+            async def close(self):
+                self.connected = False
+
+        class FakePlaywright:
+            async def stop(self):
+                pass
+
+        async def launch():
+            self.launches += 1
+            self.browser = FakeBrowser()
+            return FakePlaywright(), self.browser
+
+        self.launch = launch
+
+    def _renderer(self, **kwargs):
+        from wellbeing.services.pdf import PdfRenderer
+        renderer = PdfRenderer(launch=self.launch, **kwargs)
+        self.addCleanup(renderer.shutdown)
+        return renderer
+
+    def test_pages_are_reused_and_recycled(self):
+        renderer = self._renderer(pages=1, max_renders=3)
+        for _ in range(5):
+            self.assertTrue(renderer.render('<html></html>').startswith(b'%PDF-'))
+        self.assertEqual(self.launches, 1)
+        self.assertEqual(len(self.contexts), 2)
+        self.assertTrue(self.contexts[0].closed)
+
+    def test_failed_page_is_replaced(self):
+        renderer = self._renderer(pages=1)
+        renderer.render('<html></html>')
+        self.contexts[0].page.fail = True
+        with self.assertRaises(RuntimeError):
+            renderer.render('<html></html>')
+        self.assertTrue(self.contexts[0].closed)
+        self.assertEqual(renderer.render('<html></html>'), b'%PDF-2')
+
+    def test_disconnected_browser_is_relaunched(self):
+        renderer = self._renderer(pages=2)
+        renderer.render('<html></html>')
+        self.browser.connected = False
+        renderer.render('<html></html>')
+        self.assertEqual(self.launches, 2)
+
+    def test_concurrent_renders_share_one_browser(self):
+        from concurrent.futures import ThreadPoolExecutor
+        renderer = self._renderer(pages=2)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(renderer.render, ['<html></html>'] * 8))
+        self.assertEqual(len(results), 8)
+        self.assertEqual(self.launches, 1)
+        self.assertLessEqual(len(self.contexts), 2)
@@ -19,6 +19,7 @@ urlpatterns = [
     path('entries/<int:entry_id>/edit/', views.entry_edit, name='wellbeing_entry_edit'),
     path('entries/<int:entry_id>/submit/', views.entry_submit, name='wellbeing_entry_submit'),
     path('entries/<int:entry_id>/report/', views.entry_report, name='wellbeing_entry_report'),
+    path('entries/<int:entry_id>/report/status/', views.entry_report_status, name='wellbeing_entry_report_status'),
     path('entries/<int:entry_id>/export_pdf/', views.entry_export_pdf, name='wellbeing_entry_export_pdf'),
 
     # Reports
@@ -14,7 +14,9 @@ from .models import ChildProfile, CaregiverChild, WeeklyWellbeingEntry, WeeklyWe
 from .forms import ChildProfileForm, WeeklyAnswerFormSet
 from .services.prediction import build_payload_from_entry, validate_payload
 from .services.explainability import build_explanation
-from .services.narrative import build_narrative, build_soap_note
+from .services.narrative import build_report_texts
+from .services.report import build_entry_report, report_status
+from .services.pdf import render_pdf
 from ml.inference import run_inference, ModelNotReadyError
 
 def is_caregiver(user):
@@ -660,11 +662,10 @@ def generate_narrative(request, prediction_id):
                     else:
                         trend_summary['domain_trends'][domain_name] = 'stable'
 
-    # 3. Build narrative and save
-    narrative = build_narrative(trend_summary, prediction)
-    
-    # 3b. Build SOAP note
-    soap_note = build_soap_note(trend_summary, prediction)
+    # 3. Build narrative and SOAP note (requested concurrently) and save
+    texts = build_report_texts(trend_summary, prediction)
+    narrative = texts['narrative']
+    soap_note = texts['soap_note']
     
     prediction.narrative_text = narrative
     # We will pass soap_note down, but let's actually store it if needed. 
@@ -685,7 +686,10 @@ def generate_narrative(request, prediction_id):
 def entry_report(request, entry_id):
     """
     Feature 3 Demo Mode: Show a weekly report page after submission.
-    Calculates mock prediction, explainability, and narrative on the fly.
+    Prediction, explainability and narrative are built on the first view
+    and served from EntryReportCache afterwards. The page renders at once
+    with fallback texts and polls entry_report_status until the Gemini
+    narrative and SOAP note are ready.
     """
     if request.user.is_superuser:
         entry = get_object_or_404(WeeklyWellbeingEntry, id=entry_id)
@@ -696,88 +700,42 @@ def entry_report(request, entry_id):
         messages.warning(request, "This entry is not submitted yet.")
         return redirect('wellbeing_entry_edit', entry_id=entry.id)
         
-    # 1. Summary, 2. Prediction, & 3. Explainability
-    try:
-        payload = build_payload_from_entry(entry)
-        try:
-            result = run_inference(payload)
-            explanation = build_explanation(payload, result.get('shap_values'))
-            risk_score = explanation.get('risk_count', 0)
-            mock_label = result['label']
-            mock_confidence = result['score'] * 100
-        except ModelNotReadyError:
-            explanation = build_explanation(payload)
-            risk_score = explanation.get('risk_count', 0)
-            # Fallback mock prediction
-            if risk_score <= 2:
-                mock_label = "Low Probability"
-            elif risk_score <= 6:
-                mock_label = "Moderate Probability"
-            else:
-                mock_label = "High Probability"
-            mock_confidence = (risk_score / 10.0) * 100
-    except ValidationError:
-        explanation = {}
-        risk_score = entry.answers.filter(binary_flag=1).count()
-        # Fallback mock prediction
-        if risk_score <= 2:
-            mock_label = "Low Probability"
-        elif risk_score <= 6:
-            mock_label = "Moderate Probability"
-        else:
-            mock_label = "High Probability"
-        mock_confidence = (risk_score / 10.0) * 100
-        
-    # 4. Parent-friendly narrative
-    past_entries = WeeklyWellbeingEntry.objects.filter(
-        child=entry.child, status='SUBMITTED', week_start__lte=entry.week_start
-    ).order_by('-week_start')[:4]
-    
-    entries_list = list(past_entries)[::-1]
-    trend_summary = {'latest_overall': entry.overall_score, 'domain_trends': {}}
-    if len(entries_list) >= 2:
-        first = entries_list[0]
-        latest = entries_list[-1]
-        domains = [
-            ('communication_score', 'communication'),
-            ('routines_score', 'routines'),
-            ('emotional_score', 'emotional_responses'),
-            ('sensory_score', 'sensory_behaviors')
-        ]
-        for f_field, d_name in domains:
-            v1 = getattr(first, f_field)
-            v2 = getattr(latest, f_field)
-            if v1 is not None and v2 is not None:
-                diff = v2 - v1
-                if diff >= 0.5: trend_summary['domain_trends'][d_name] = 'up'
-                elif diff <= -0.5: trend_summary['domain_trends'][d_name] = 'down'
-                else: trend_summary['domain_trends'][d_name] = 'stable'
-                
-    class MockPrediction:
-        def __init__(self, exp, label):
-            self.explanation_json = exp
-            self.prediction_label = label
-            self.model_version = 'mock-demo-v1'
-    
-    mock_pred = MockPrediction(explanation, mock_label)
-    narrative = build_narrative(trend_summary, mock_pred)
-    soap_note = build_soap_note(trend_summary, mock_pred)
+    # Prediction, explainability, narrative and SOAP note — cached per
+    # (entry, model version, prompt templates); see services/report.py.
+    report = build_entry_report(entry)
 
     return render(request, 'wellbeing/entry_report.html', {
         'entry': entry,
-        'risk_score': risk_score,
-        'mock_label': mock_label,
-        'mock_confidence': int(mock_confidence),
-        'explanation': explanation,
-        'narrative': narrative,
-        'soap_note': soap_note
+        'risk_score': report['risk_score'],
+        'mock_label': report['label'],
+        'mock_confidence': int(report['confidence']),
+        'explanation': report['explanation'],
+        'narrative': report['narrative'],
+        'soap_note': report['soap_note'],
+        'texts_pending': report['texts_pending'],
     })
 
 
+@login_required
+@user_passes_test(is_caregiver)
+def entry_report_status(request, entry_id):
+    """
+    JSON polled by the report page while the narrative and SOAP note are
+    generated in the background: {status, narrative, soap_note}.
+    """
+    if request.user.is_superuser:
+        entry = get_object_or_404(WeeklyWellbeingEntry, id=entry_id)
+    else:
+        entry = get_object_or_404(WeeklyWellbeingEntry, id=entry_id, caregiver=request.user)
+
+    return JsonResponse(report_status(entry))
+
+
 @login_required
 def entry_export_pdf(request, entry_id):
     """
-    Generate a professional clinical PDF report using Playwright.
+    Generate a professional clinical PDF report with the shared Playwright
+    renderer (wellbeing.services.pdf).
 
     Access rules:
       - Superuser:          always allowed.
@@ -810,71 +768,20 @@ def entry_export_pdf(request, entry_id):
         return redirect('wellbeing_entry_edit', entry_id=entry.id)
 
     # ── Build the same context as entry_report ──────────────────
-    try:
-        payload = build_payload_from_entry(entry)
-        try:
-            result = run_inference(payload)
-            explanation = build_explanation(payload, result.get('shap_values'))
-            risk_score = explanation.get('risk_count', 0)
-            mock_label = result['label']
-            mock_confidence = int(result['score'] * 100)
-        except ModelNotReadyError:
-            explanation = build_explanation(payload)
-            risk_score = explanation.get('risk_count', 0)
-            if risk_score <= 2:
-                mock_label = "Low Probability"
-            elif risk_score <= 6:
-                mock_label = "Moderate Probability"
-            else:
-                mock_label = "High Probability"
-            mock_confidence = int((risk_score / 10.0) * 100)
-    except ValidationError:
-        explanation = {}
-        risk_score = entry.answers.filter(binary_flag=1).count()
-        if risk_score <= 2:
-            mock_label = "Low Probability"
-        elif risk_score <= 6:
-            mock_label = "Moderate Probability"
-        else:
-            mock_label = "High Probability"
-        mock_confidence = int((risk_score / 10.0) * 100)
-
-    # Narrative + SOAP
-    past_entries = WeeklyWellbeingEntry.objects.filter(
-        child=entry.child, status='SUBMITTED', week_start__lte=entry.week_start
-    ).order_by('-week_start')[:4]
-    entries_list = list(past_entries)[::-1]
-    trend_summary = {'latest_overall': entry.overall_score, 'domain_trends': {}}
-    if len(entries_list) >= 2:
-        first = entries_list[0]
-        latest = entries_list[-1]
-        domains = [
-            ('communication_score', 'communication'),
-            ('routines_score', 'routines'),
-            ('emotional_score', 'emotional_responses'),
-            ('sensory_score', 'sensory_behaviors')
-        ]
-        for f_field, d_name in domains:
-            v1 = getattr(first, f_field)
-            v2 = getattr(latest, f_field)
-            if v1 is not None and v2 is not None:
-                diff = v2 - v1
-                if diff >= 0.5:
-                    trend_summary['domain_trends'][d_name] = 'up'
-                elif diff <= -0.5:
-                    trend_summary['domain_trends'][d_name] = 'down'
-                else:
-                    trend_summary['domain_trends'][d_name] = 'stable'
-
-    class MockPrediction:
-        def __init__(self, exp, label):
-            self.explanation_json = exp
-            self.prediction_label = label
-            self.model_version = 'mock-demo-v1'
-
-    mock_pred = MockPrediction(explanation, mock_label)
-    narrative = build_narrative(trend_summary, mock_pred)
-    soap_note = build_soap_note(trend_summary, mock_pred)
+    # A downloaded PDF is durable, so it never carries the provisional
+    # fallback texts. Rather than hold a worker thread until the job is done,
+    # send the user back to the report page, whose report_status polling
+    # enables the download once the texts are in.
+    report = build_entry_report(entry)
+    if report['texts_pending']:
+        notice = "The report summary is still being generated. Please try the PDF export again in a minute."
+        if user.is_superuser or entry.caregiver_id == user.id:
+            messages.info(request, notice)
+            return redirect('wellbeing_entry_report', entry_id=entry.id)
+        response = HttpResponse(notice, status=503, content_type='text/plain')
+        response['Retry-After'] = '60'
+        return response
+    explanation = report['explanation']
 
     # Build safe flags (indicators NOT flagged)
     risk_flags = explanation.get('risk_flags', [])
@@ -883,54 +790,22 @@ def entry_export_pdf(request, entry_id):
     # ── Render the standalone PDF template to HTML ──────────────
     html_string = render_to_string('wellbeing/entry_report_pdf.html', {
         'entry': entry,
-        'risk_score': risk_score,
-        'mock_label': mock_label,
-        'mock_confidence': mock_confidence,
+        'risk_score': report['risk_score'],
+        'mock_label': report['label'],
+        'mock_confidence': int(report['confidence']),
         'explanation': explanation,
-        'narrative': narrative,
-        'soap_note': soap_note,
+        'narrative': report['narrative'],
+        'soap_note': report['soap_note'],
         'safe_flags': safe_flags,
         'generated_date': timezone.localdate(),
     }, request=request)
 
-    # ── Generate PDF via Playwright ─────────────────────────────
+    # ── Generate PDF with the shared headless browser ───────────
     import logging
     logger = logging.getLogger(__name__)
 
     try:
-        from playwright.sync_api import sync_playwright
-
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-
-            # Load the rendered HTML
-            page.set_content(html_string, wait_until='networkidle')
-
-            # Wait for fonts to load
-            page.wait_for_timeout(1500)
-
-            # If there's a SHAP chart, wait for it to render
-            if explanation.get('top_shap_features'):
-                try:
-                    page.wait_for_function('window.__chartRendered === true', timeout=5000)
-                except Exception:
-                    pass  # Chart may not render, continue anyway
-
-            # Generate PDF
-            pdf_bytes = page.pdf(
-                format='A4',
-                print_background=True,
-                margin={
-                    'top': '20mm',
-                    'bottom': '20mm',
-                    'left': '18mm',
-                    'right': '18mm',
-                },
-            )
-
-            browser.close()
-
+        pdf_bytes = render_pdf(html_string)
     except Exception as e:
         logger.error(f"PDF generation failed: {e}")
         messages.error(request, f"PDF generation failed: {str(e)}. Please use the Print option instead.")